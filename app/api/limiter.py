@@ -0,0 +1,73 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+
+class Overloaded(Exception):
+    """Raised by `ConcurrencyLimiter.slot` when a request cannot be admitted."""
+
+
+class ConcurrencyLimiter:
+    """
+    Cap the number of requests doing expensive work at once, queueing a bounded number of others.
+
+    `slot()` admits up to `limit` requests concurrently. Up to `max_queue`
+    more wait (in arrival order) for a free slot for at most
+    `queue_timeout` seconds (0: no time limit); a request that finds the
+    queue full, or times out waiting, raises `Overloaded` so the caller can answer 429 instead of
+    piling more work onto a saturated model. `stats` counts admitted and
+    rejected requests and tracks the current and peak in-flight counts.
+    """
+
+    def __init__(self, limit: int, max_queue: int = 0, queue_timeout: float = 0.0):
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.in_flight = 0
+        self.stats = {"admitted": 0, "rejected": 0, "peak_in_flight": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Asyncio primitives belong to one event loop; tests and reloads may run several in turn.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._semaphore = loop, asyncio.Semaphore(self.limit - self.in_flight)
+        return self._semaphore
+
+    async def acquire(self) -> None:
+        """Wait for a slot (see the class docstring); pair with `release`, or use `slot()`."""
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise Overloaded(f"{self.in_flight} requests in flight and {self.waiting} queued")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout or None)
+            except asyncio.TimeoutError:
+                self.stats["rejected"] += 1
+                raise Overloaded(f"No free slot within {self.queue_timeout:.0f}s") from None
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._get_semaphore().release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting, **self.stats}
@@ -1,16 +1,40 @@
+import json
 import logging
-from typing import List, Optional
+import os
+import time
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
 
-from app.rag import LangChainRAG
+from app.api.limiter import ConcurrencyLimiter, Overloaded
+from app.api.metrics import LatencyStats
+from app.rag import LangChainRAG, RagHit
 
 app = FastAPI(title="catalogue-chat retriever")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Generations run at once against Ollama; further requests queue (up to RAG_MAX_QUEUE, for at most
+# RAG_QUEUE_TIMEOUT seconds) and are answered 429 beyond that.
+RAG_MAX_CONCURRENCY = int(os.environ.get("RAG_MAX_CONCURRENCY", "4"))
+RAG_MAX_QUEUE = int(os.environ.get("RAG_MAX_QUEUE", "32"))
+RAG_QUEUE_TIMEOUT = float(os.environ.get("RAG_QUEUE_TIMEOUT", "30"))
+
+rag_limiter = ConcurrencyLimiter(RAG_MAX_CONCURRENCY, max_queue=RAG_MAX_QUEUE, queue_timeout=RAG_QUEUE_TIMEOUT)
+
+# Request latencies in seconds, reported by /metrics. Streaming latencies are measured from request arrival.
+latency = {
+    "rag": LatencyStats(),
+    "rag_stream_contexts": LatencyStats(),
+    "rag_stream_first_token": LatencyStats(),
+    "rag_stream_total": LatencyStats(),
+}
+
 
 class Source(BaseModel):
     title: str | None = None
@@ -18,6 +42,8 @@ class Source(BaseModel):
     url: str | None = None
     label: str | None = None
     chunk: int | None = None
+    page_start: int | None = None
+    page_end: int | None = None
 
 
 class Hit(BaseModel):
@@ -29,6 +55,7 @@ class Hit(BaseModel):
 class ChatRequest(BaseModel):
     query: str = Field(..., min_length=2)
     k: int = Field(4, ge=1, le=20, description="Number of context chunks to retrieve")
+    no_cache: bool = Field(False, description="Generate a fresh answer even if one is cached for this query")
 
 
 class ChatResponse(BaseModel):
@@ -46,28 +73,26 @@ except Exception as exc:  # noqa: BLE001 - surface initialization failures clear
     logger.exception("Failed to initialize LangChain RAG pipeline")
 
 
-
-class ChatRequest(BaseModel):
-    query: str = Field(..., min_length=2)
-    k: int = Field(4, ge=1, le=20, description="Number of context chunks to retrieve")
-
-
-class ChatResponse(BaseModel):
-    query: str
-    answer: str
-    contexts: List[Hit]
-
-
-rag_pipeline = LangChainRAG()
-
 @app.get("/healthz")
-def healthz():
+async def healthz():
     return {"ok": True}
 
 
-@app.post("/rag", response_model=ChatResponse)
-def rag_chat(req: ChatRequest):
-    logger.info("rag chat request", extra={"query": req.query, "limit": req.k})
+@app.get("/metrics")
+async def metrics():
+    """Latency summaries (including time to first token of /rag/stream), the concurrency limiter's and caches' state."""
+    body = {
+        "latency_seconds": {name: stats.snapshot() for name, stats in latency.items()},
+        "rag_limiter": rag_limiter.snapshot(),
+    }
+    for name, attr in (("query_embedding_cache", "query_embeddings"), ("answer_cache", "answers")):
+        cache = getattr(rag_pipeline, attr, None)
+        if cache is not None:
+            body[name] = cache.snapshot()
+    return body
+
+
+def _require_pipeline() -> None:
     if rag_pipeline is None:
         logger.error("RAG pipeline unavailable", extra={"error": repr(_rag_init_error)})
         raise HTTPException(
@@ -77,12 +102,16 @@ def rag_chat(req: ChatRequest):
                 "and the pipeline can initialize successfully."
             ),
         )
-    try:
-        answer, hits = rag_pipeline.invoke(req.query, k=req.k)
-    except Exception:
-        logger.exception("LangChain RAG pipeline failed")
-        raise HTTPException(status_code=500, detail="RAG generation failed")
 
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    logger.warning(f"Shedding rag request: {e}")
+    return HTTPException(
+        status_code=429, detail="Too many RAG requests in progress; retry shortly", headers={"Retry-After": "1"}
+    )
+
+
+def _contexts(hits: List[RagHit]) -> List[Hit]:
     contexts: List[Hit] = []
     for h in hits:
         meta = h.metadata or {}
@@ -92,7 +121,116 @@ def rag_chat(req: ChatRequest):
             url=meta.get("url"),
             label=meta.get("label"),
             chunk=meta.get("chunk"),
+            page_start=meta.get("page_start"),
+            page_end=meta.get("page_end"),
         )
         contexts.append(Hit(text=h.text, score=h.score, source=src))
+    return contexts
+
+
+async def _answer(question: str, k: int, use_cache: bool = True) -> Tuple[str, List[RagHit]]:
+    """Run the pipeline without tying up a worker thread when it supports async calls."""
+    if hasattr(rag_pipeline, "ainvoke"):
+        return await rag_pipeline.ainvoke(question, k=k, use_cache=use_cache)
+    return await run_in_threadpool(rag_pipeline.invoke, question, k=k, use_cache=use_cache)
+
+
+@app.post("/rag", response_model=ChatResponse)
+async def rag_chat(req: ChatRequest):
+    logger.info("rag chat request", extra={"query": req.query, "limit": req.k})
+    _require_pipeline()
+    started = time.monotonic()
+    try:
+        async with rag_limiter.slot():
+            answer, hits = await _answer(req.query, req.k, use_cache=not req.no_cache)
+    except Overloaded as e:
+        raise _overloaded(e)
+    except Exception:
+        logger.exception("LangChain RAG pipeline failed")
+        raise HTTPException(status_code=500, detail="RAG generation failed")
+    latency["rag"].observe(time.monotonic() - started)
+
+    return ChatResponse(query=req.query, answer=answer, contexts=_contexts(hits))
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream(question: str, k: int, use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+    """The pipeline's `astream`, or one whole-answer "token" for a pipeline that can only `invoke`."""
+    if hasattr(rag_pipeline, "astream"):
+        async for event in rag_pipeline.astream(question, k=k, use_cache=use_cache):
+            yield event
+        return
+    answer, hits = await _answer(question, k, use_cache)
+    yield "contexts", hits
+    yield "token", answer
+
+
+def _once(fn: Callable[[], None]) -> Callable[[], None]:
+    called = False
+
+    def wrapper() -> None:
+        nonlocal called
+        if not called:
+            called = True
+            fn()
+
+    return wrapper
+
+
+@app.post("/rag/stream")
+async def rag_stream(req: ChatRequest):
+    """
+    `/rag` as Server-Sent Events: `contexts` (the retrieved hits), then one `token` event per piece of the
+    answer as the model produces it, then `done` with the full answer and timings (or `error`).
+    """
+    logger.info("rag stream request", extra={"query": req.query, "limit": req.k})
+    _require_pipeline()
+    started = time.monotonic()
+    # Admission is decided before the response starts, so overload is still a plain 429.
+    try:
+        await rag_limiter.acquire()
+    except Overloaded as e:
+        raise _overloaded(e)
+    # Released when the stream ends, or by the background task if the client left before it began.
+    release = _once(rag_limiter.release)
+
+    async def events() -> AsyncIterator[str]:
+        parts: List[str] = []
+        first_token: Optional[float] = None
+        try:
+            async for kind, payload in _stream(req.query, req.k, use_cache=not req.no_cache):
+                if kind == "contexts":
+                    latency["rag_stream_contexts"].observe(time.monotonic() - started)
+                    yield _sse("contexts", {"query": req.query, "contexts": [c.model_dump() for c in _contexts(payload)]})
+                else:
+                    if first_token is None:
+                        first_token = time.monotonic() - started
+                        latency["rag_stream_first_token"].observe(first_token)
+                    parts.append(payload)
+                    yield _sse("token", {"text": payload})
+        except Exception:
+            logger.exception("LangChain RAG stream failed")
+            yield _sse("error", {"detail": "RAG generation failed"})
+            return
+        finally:
+            release()
+        total = time.monotonic() - started
+        latency["rag_stream_total"].observe(total)
+        yield _sse(
+            "done",
+            {
+                "answer": "".join(parts),
+                "time_to_first_token": round(first_token, 4) if first_token is not None else None,
+                "total_time": round(total, 4),
+            },
+        )
 
-    return ChatResponse(query=req.query, answer=answer, contexts=contexts)
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),
+    )
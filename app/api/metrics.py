@@ -0,0 +1,42 @@
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+
+class LatencyStats:
+    """
+    Rolling latency samples for one measurement, summarized as count, mean and percentiles.
+
+    Percentiles (nearest rank) and the mean cover the last `window` samples,
+    so they follow recent behaviour; `count` is the total since startup.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+
+        def rank(q: float) -> float:
+            return round(samples[max(0, math.ceil(q * len(samples)) - 1)], 4)
+
+        return {
+            "count": count,
+            "mean": round(sum(samples) / len(samples), 4),
+            "p50": rank(0.5),
+            "p90": rank(0.9),
+            "p99": rank(0.99),
+            "max": round(samples[-1], 4),
+        }
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    sha256: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class FileCache:
+    """
+    Content-addressed store for downloaded files plus a per-URL manifest.
+
+    File bodies live once under `objects/<sha[:2]>/<sha>` no matter how many
+    URLs or record versions point at them; the per-record path ingest reads
+    (`RAW_DIR/<rec_id>/<fname>`) is a hard link to the blob (a copy where
+    links are unsupported). The manifest (SQLite) remembers each URL's ETag,
+    Last-Modified, size and sha256 so later runs can send conditional
+    requests, or with `revalidate=False` skip the network entirely.
+    """
+
+    def __init__(self, root: Path, revalidate: bool = True):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.revalidate = revalidate
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "manifest.sqlite3"), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL,"
+            " etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.stats = {"downloaded": 0, "not_modified": 0, "reused": 0, "deduplicated": 0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.objects / sha256[:2] / sha256
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Manifest entry for `url`, or None if unknown or its blob has gone missing."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, sha256, size, etag, last_modified FROM files WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(*row)
+        return entry if self.blob_path(entry.sha256).exists() else None
+
+    def link(self, sha256: str, out_path: Path) -> None:
+        """Expose blob `sha256` at `out_path` (hard link, falling back to a copy)."""
+        blob = self.blob_path(sha256)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        if out_path.exists():
+            try:
+                if os.path.samefile(blob, out_path):
+                    return
+            except FileNotFoundError:
+                pass
+            out_path.unlink()
+        try:
+            os.link(blob, out_path)
+        except OSError:
+            shutil.copyfile(blob, out_path)
+
+    def reuse(self, entry: CacheEntry, out_path: Path, not_modified: bool = False) -> None:
+        """Serve a cached file: skipped download or a 304 from the server."""
+        self.link(entry.sha256, out_path)
+        self._count("not_modified" if not_modified else "reused")
+
+    def add(
+        self,
+        url: str,
+        tmp_path: Path,
+        sha256: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        out_path: Path,
+    ) -> None:
+        """Move a finished download into the object store, record it, and link it at `out_path`."""
+        blob = self.blob_path(sha256)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        if blob.exists():
+            # Same bytes already stored for another URL or record version.
+            tmp_path.unlink(missing_ok=True)
+            self._count("deduplicated")
+        else:
+            tmp_path.replace(blob)
+        size = blob.stat().st_size
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (url, sha256, size, etag, last_modified, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, sha256, size, etag, last_modified, time.time()),
+            )
+            self._db.commit()
+            self.stats["downloaded"] += 1
+        self.link(sha256, out_path)
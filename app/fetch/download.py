@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+from .cache import FileCache
+
+logger = logging.getLogger(__name__)
+
+
+def safe_filename(s: str) -> str:
+    s = re.sub(r"[^a-zA-Z0-9._-]+", "_", s).strip("_")
+    return s[:180] if s else "item"
+
+
+def host_allowed(url: str, allowed_domains: Iterable[str]) -> bool:
+    """True if `url`'s host is one of `allowed_domains` or a subdomain of one."""
+    host = (urlparse(url).hostname or "").lower()
+    return any(host == d.lower() or host.endswith("." + d.lower()) for d in allowed_domains)
+
+
+def download_file(
+    url: str,
+    out_path: Path,
+    max_mb: int = 80,
+    session: Optional[requests.Session] = None,
+    cache: Optional[FileCache] = None,
+) -> bool:
+    """
+    Stream `url` to `out_path`, giving up (and leaving no file behind) past `max_mb`.
+
+    With a `cache`, a URL seen before is revalidated with a conditional request
+    (or not requested at all when the cache does not revalidate) and new bodies
+    are stored once by content hash.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    entry = cache.lookup(url) if cache is not None else None
+    headers: Dict[str, str] = {}
+    if entry is not None:
+        if not cache.revalidate:
+            cache.reuse(entry, out_path)
+            return True
+        headers = entry.conditional_headers()
+
+    # Write to a sibling .part file so an aborted download never looks complete.
+    tmp_path = out_path.with_name(out_path.name + ".part")
+    digest = hashlib.sha256()
+    too_large = False
+    try:
+        with (session or requests).get(url, stream=True, timeout=60, headers=headers) as r:
+            if r.status_code == 304 and entry is not None:
+                cache.reuse(entry, out_path, not_modified=True)
+                return True
+            r.raise_for_status()
+            etag = r.headers.get("ETag")
+            last_modified = r.headers.get("Last-Modified")
+            total = 0
+            with open(tmp_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1024 * 256):
+                    if not chunk:
+                        continue
+                    total += len(chunk)
+                    if total > max_mb * 1024 * 1024:
+                        logger.warning(f"File download exceeded max size of {max_mb}MB. Stopping download.")
+                        too_large = True
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if too_large:
+        tmp_path.unlink(missing_ok=True)
+        return False
+    if cache is not None:
+        cache.add(url, tmp_path, digest.hexdigest(), etag, last_modified, out_path)
+    else:
+        tmp_path.replace(out_path)
+    return True
+
+
+def try_get_zenodo_files(record_landing_url: str, session: Optional[requests.Session] = None) -> List[str]:
+    """
+    Zenodo OAI records often include an identifier/landing page URL.
+    This helper scrapes the landing page for downloadable file links (best-effort).
+    """
+    try:
+        # Increased timeout slightly
+        html = (session or requests).get(record_landing_url, timeout=45).text
+    except Exception as e:
+        logger.warning(f"Failed to scrape Zenodo landing page {record_landing_url}: {e}")
+        return []
+    # Zenodo file download links often contain `/records/<id>/files/<name>?download=1`
+    links = sorted(set(re.findall(r'https://zenodo\.org/records/\d+/files/[^"\s<>]+', html)))
+    return [with_download_param(u) for u in links]
+
+
+def with_download_param(url: str) -> str:
+    """Add Zenodo's `download=1` to file links that lack it, to force download."""
+    if "zenodo.org" not in (urlparse(url).hostname or "") or "download=1" in url:
+        return url
+    sep = "&" if "?" in url else "?"
+    return url + f"{sep}download=1"
+
+
+class DownloadPool:
+    """
+    Fetch fulltext files for many records concurrently.
+
+    A bounded thread pool runs landing-page lookups and file downloads. Each
+    host gets one `requests.Session` (keep-alive connections sized to the
+    per-host cap) and a semaphore limiting how many requests hit it at once,
+    so throughput scales with `workers` without hammering a single server.
+    `submit_record` returns a future of the record's downloaded paths without
+    blocking the caller; `stats` and an optional tqdm bar report progress.
+    File URLs come from the harvested metadata when it lists them; scraping
+    the landing page is a fallback, counted in `stats["scraped"]`.
+    Passing a `FileCache` makes repeat downloads conditional requests.
+    """
+
+    def __init__(
+        self,
+        raw_dir: Path,
+        workers: int = 8,
+        per_host: int = 4,
+        max_mb: int = 80,
+        allowed_domains: Iterable[str] = (),
+        progress: bool = True,
+        cache: Optional[FileCache] = None,
+    ):
+        self.raw_dir = Path(raw_dir)
+        self.cache = cache
+        self.per_host = max(1, per_host)
+        self.max_mb = max_mb
+        self.allowed_domains = set(allowed_domains)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="download")
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        # "bytes" counts what ended up on disk, including files served from the cache.
+        self.stats = {
+            "files": 0,
+            "failed": 0,
+            "too_large": 0,
+            "rejected": 0,
+            "bytes": 0,
+            "from_metadata": 0,
+            "scraped": 0,
+        }
+        self._bar = tqdm(desc="Downloading", unit="file", position=1, leave=False) if progress else None
+
+    def __enter__(self) -> "DownloadPool":
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for session in self._sessions.values():
+            session.close()
+        if self._bar is not None:
+            self._bar.close()
+
+    def _host(self, url: str) -> Tuple[str, requests.Session, threading.BoundedSemaphore]:
+        host = (urlparse(url).hostname or "").lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_host)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+                self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return host, session, self._slots[host]
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+            if self._bar is not None and key in ("files", "failed", "too_large", "rejected"):
+                self._bar.update(1)
+                self._bar.set_postfix(mb=f"{self.stats['bytes'] / 1e6:.1f}", failed=self.stats["failed"], refresh=False)
+
+    def fetch(self, url: str, out_path: Path) -> bool:
+        """Download one file, honouring the per-host cap and the domain allowlist (blocking)."""
+        if not host_allowed(url, self.allowed_domains):
+            logger.warning(f"Skipping {url}: host not in allowed_domains")
+            self._count("rejected")
+            return False
+        _host, session, slot = self._host(url)
+        with slot:
+            try:
+                ok = download_file(url, out_path, max_mb=self.max_mb, session=session, cache=self.cache)
+            except Exception as e:
+                logger.error(f"Error downloading file {url}: {e}")
+                self._count("failed")
+                return False
+        if not ok:
+            logger.warning(f"Download failed or was too large for {url}")
+            self._count("too_large")
+            return False
+        self._count("bytes", out_path.stat().st_size)
+        self._count("files")
+        return True
+
+    def resolve_files(self, landing_url: str) -> List[str]:
+        """Find downloadable file URLs on a record landing page (blocking)."""
+        self._count("scraped")
+        _host, session, slot = self._host(landing_url)
+        with slot:
+            return try_get_zenodo_files(landing_url, session=session)
+
+    def submit_record(
+        self,
+        rec_id: str,
+        landing_url: Optional[str],
+        file_urls: Optional[List[str]] = None,
+    ) -> "Future[List[Path]]":
+        """
+        Download a record's files in the background; the future yields local paths.
+
+        `file_urls` (from the harvested metadata) are used as-is; only when the
+        record lists none is its landing page scraped for links.
+        """
+        result: "Future[List[Path]]" = Future()
+        resolved: "Future[List[str]]"
+        if file_urls:
+            self._count("from_metadata")
+            resolved = Future()
+            resolved.set_result([with_download_param(u) for u in file_urls])
+        elif landing_url and host_allowed(landing_url, self.allowed_domains):
+            resolved = self._executor.submit(self.resolve_files, landing_url)
+        else:
+            result.set_result([])
+            return result
+
+        def start_downloads(resolved: "Future[List[str]]") -> None:
+            try:
+                urls = resolved.result()
+            except Exception as e:
+                logger.warning(f"Failed to resolve files for {rec_id}: {e}")
+                urls = []
+            if not urls:
+                result.set_result([])
+                return
+            paths: Dict[int, Path] = {}
+            remaining = [len(urls)]
+
+            def finished(i: int, out_path: Path, fut: "Future[bool]") -> None:
+                ok = not fut.exception() and fut.result()
+                with self._lock:
+                    if ok:
+                        paths[i] = out_path
+                    remaining[0] -= 1
+                    done = remaining[0] == 0
+                if done:
+                    result.set_result([paths[k] for k in sorted(paths)])
+
+            for i, file_url in enumerate(urls):
+                fname = safe_filename(file_url.split("/")[-1].split("?")[0])
+                # Ensure the file path is unique and uses a safe ID
+                out_path = self.raw_dir / safe_filename(rec_id) / fname
+                try:
+                    fut = self._executor.submit(self.fetch, file_url, out_path)
+                except RuntimeError:  # pool shut down while the landing page was resolving
+                    fut = Future()
+                    fut.set_result(False)
+                fut.add_done_callback(lambda f, i=i, p=out_path: finished(i, p, f))
+
+        resolved.add_done_callback(start_downloads)
+        return result
+
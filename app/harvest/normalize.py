@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from lxml import etree
+
+# Namespaces used by the OAI-PMH envelope and the metadata formats we know.
+NS = {
+    "oai": "http://www.openarchives.org/OAI/2.0/",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "oai_dc": "http://www.openarchives.org/OAI/2.0/oai_dc/",
+    "d": "http://datacite.org/schema/kernel-4",
+    "oai_datacite": "http://schema.datacite.org/oai/oai-1.1/",
+}
+
+
+def _xp(path: str) -> etree.XPath:
+    return etree.XPath(path, namespaces=NS)
+
+
+def _first_text(xpath: etree.XPath, el) -> Optional[str]:
+    found = xpath(el)
+    return (found[0].text or "").strip() if found else None
+
+
+def _all_text(xpath: etree.XPath, el) -> List[str]:
+    return [v for v in ((x.text or "").strip() for x in xpath(el)) if v]
+
+
+# Extensions we treat as directly downloadable document files.
+_FILE_EXTENSIONS = (".pdf", ".txt", ".html", ".htm", ".md", ".csv", ".json", ".xml")
+
+
+def _is_file_url(url: str) -> bool:
+    """Heuristic: the URL points at a file rather than a landing page or another record."""
+    if not url.startswith(("http://", "https://")):
+        return False
+    path = urlparse(url).path.lower()
+    return "/files/" in path or path.endswith(_FILE_EXTENSIONS)
+
+
+def _split_urls(urls: List[str]) -> Tuple[List[str], List[str]]:
+    """Partition URLs into (file links, other links), dropping duplicates."""
+    files: List[str] = []
+    others: List[str] = []
+    for url in dict.fromkeys(urls):
+        (files if _is_file_url(url) else others).append(url)
+    return files, others
+
+
+# Header paths are anchored at the <record> element.
+_HEADER_ID = _xp("oai:header/oai:identifier")
+_HEADER_DATESTAMP = _xp("oai:header/oai:datestamp")
+_HEADER_DELETED = _xp("boolean(oai:header[@status='deleted'])")
+
+
+class Normalizer(ABC):
+    """
+    Extract ingest fields from one metadata format.
+
+    Subclasses compile their XPath expressions once at class creation and use
+    paths anchored at the record/metadata container instead of `//` scans, so
+    the per-record cost is a handful of child-axis lookups. `locate` returns the
+    metadata container when the record carries this format, else None.
+    """
+
+    prefixes: Tuple[str, ...] = ()
+    _container: etree.XPath
+
+    def locate(self, record_el):
+        found = self._container(record_el)
+        return found[0] if found else None
+
+    @abstractmethod
+    def extract(self, container) -> Dict[str, Any]:
+        """Ingest fields (title, creators, ...) read from the metadata `container`."""
+
+
+class DataCiteNormalizer(Normalizer):
+    """DataCite kernel-4, bare or wrapped in Zenodo's `oai_datacite` payload."""
+
+    prefixes = ("oai_datacite", "datacite")
+    _container = _xp(
+        "oai:metadata/d:resource"
+        " | oai:metadata/oai_datacite:oai_datacite/oai_datacite:payload/d:resource"
+    )
+    _title = _xp("d:titles/d:title | d:title")
+    _creators = _xp("d:creators/d:creator/d:creatorName | d:creator/d:creatorName")
+    _subjects = _xp("d:subjects/d:subject | d:subject")
+    _description = _xp("d:descriptions/d:description | d:description")
+    _date = _xp("d:publicationYear")
+    _url = _xp("d:identifier[@identifierType='URL']")
+    _doi = _xp("d:identifier[@identifierType='DOI']")
+    # URL-typed alternate/related identifiers carry landing pages and, on some
+    # repositories, direct file links.
+    _linked_urls = _xp(
+        "d:alternateIdentifiers/d:alternateIdentifier"
+        "[@alternateIdentifierType='url' or @alternateIdentifierType='URL']"
+        " | d:relatedIdentifiers/d:relatedIdentifier[@relatedIdentifierType='URL']"
+        " | d:relatedIdentifier[@relatedIdentifierType='URL']"
+    )
+
+    def extract(self, container) -> Dict[str, Any]:
+        files, others = _split_urls(_all_text(self._linked_urls, container))
+        return {
+            "doi": _first_text(self._doi, container),
+            "title": _first_text(self._title, container),
+            "creators": "; ".join(_all_text(self._creators, container)),
+            "subjects": "; ".join(_all_text(self._subjects, container)),
+            "description": _first_text(self._description, container),
+            "date": _first_text(self._date, container),
+            "url": _first_text(self._url, container) or next(iter(others), None),
+            "files": files,
+        }
+
+
+class DublinCoreNormalizer(Normalizer):
+    """Simple Dublin Core (`oai_dc`), with or without the `oai_dc:dc` wrapper."""
+
+    prefixes = ("oai_dc",)
+    _container = _xp("oai:metadata/oai_dc:dc | oai:metadata[dc:*]")
+    _title = _xp("dc:title")
+    _creators = _xp("dc:creator")
+    _subjects = _xp("dc:subject")
+    _description = _xp("dc:description")
+    _date = _xp("dc:date")
+    _identifiers = _xp("dc:identifier")
+    _relations = _xp("dc:relation")
+
+    def extract(self, container) -> Dict[str, Any]:
+        # dc:identifier may contain URL
+        ids = _all_text(self._identifiers, container)
+        files, _ = _split_urls(ids + _all_text(self._relations, container))
+        return {
+            "doi": None,
+            "title": _first_text(self._title, container),
+            "creators": "; ".join(_all_text(self._creators, container)),
+            "subjects": "; ".join(_all_text(self._subjects, container)),
+            "description": _first_text(self._description, container),
+            "date": _first_text(self._date, container),
+            "url": next((x for x in ids if x.startswith("http")), None),
+            "files": files,
+        }
+
+
+# Registry of extractors keyed by OAI metadataPrefix. Insertion order doubles
+# as the probing order when a record does not match its declared prefix.
+_NORMALIZERS: Dict[str, Normalizer] = {}
+
+
+def register_normalizer(normalizer: Normalizer) -> Normalizer:
+    """Register `normalizer` for each of its prefixes (e.g. a future marcxml/mods extractor)."""
+    for prefix in normalizer.prefixes:
+        _NORMALIZERS[prefix] = normalizer
+    return normalizer
+
+
+def get_normalizer(metadata_prefix: str) -> Optional[Normalizer]:
+    return _NORMALIZERS.get(metadata_prefix)
+
+
+register_normalizer(DataCiteNormalizer())
+register_normalizer(DublinCoreNormalizer())
+
+
+def _candidates(metadata_prefix: str) -> List[Normalizer]:
+    primary = get_normalizer(metadata_prefix)
+    rest = [n for n in dict.fromkeys(_NORMALIZERS.values()) if n is not primary]
+    return [primary, *rest] if primary is not None else rest
+
+
+def make_normalizer(metadata_prefix: str) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Build a function that maps a `<record>` element to the flat dict ingest expects.
+
+    The extractor registered for `metadata_prefix` is tried first; other
+    registered formats are probed only if the record does not carry it (some
+    endpoints serve DataCite under `oai_dc`, for example).
+    """
+    candidates = _candidates(metadata_prefix)
+
+    def normalize(record_el) -> Dict[str, Any]:
+        oai_id = _first_text(_HEADER_ID, record_el)
+        datestamp = _first_text(_HEADER_DATESTAMP, record_el)
+        deleted = bool(_HEADER_DELETED(record_el))
+        fields: Dict[str, Any] = {
+            "doi": None,
+            "title": None,
+            "creators": "",
+            "subjects": "",
+            "description": None,
+            "date": None,
+            "url": None,
+            "files": [],
+        }
+        # Deleted records carry a header only; there is nothing to extract.
+        for normalizer in () if deleted else candidates:
+            container = normalizer.locate(record_el)
+            if container is not None:
+                fields = normalizer.extract(container)
+                break
+
+        doi = fields.pop("doi")
+        return {
+            "oai_identifier": oai_id,
+            "id": doi or oai_id,
+            **fields,
+            "datestamp": datestamp,
+            "deleted": deleted,
+        }
+
+    return normalize
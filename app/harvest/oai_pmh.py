@@ -1,15 +1,389 @@
 \
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from sickle import Sickle
+from sickle.app import DEFAULT_CLASS_MAP
+from sickle.oaiexceptions import BadResumptionToken, NoRecordsMatch
 from lxml import etree
 
-def _text(el):
-    return (el.text or "").strip()
+from .normalize import make_normalizer
+
+logger = logging.getLogger(__name__)
+
+class _RawRecord:
+    """
+    Minimal stand-in for `sickle.models.Record`.
+
+    Sickle's default record class converts every metadata block into a dict on
+    construction; we only need the parsed `<record>` element, which the
+    normalizer reads directly.
+    """
+
+    def __init__(self, record_element):
+        self.xml = record_element
+
+
+def _record_element(rec):
+    el = getattr(rec, "xml", None)
+    if el is not None:
+        return el
+    return etree.fromstring(rec.raw.encode("utf-8"))
+
+
+def _newer(stamp: Optional[str], current: Optional[str]) -> Optional[str]:
+    # OAI datestamps are ISO 8601 in a single granularity, so string order is time order.
+    if stamp and (current is None or stamp > current):
+        return stamp
+    return current
+
+
+class RecordStream:
+    """
+    Lazily iterate normalized OAI-PMH records via ListRecords.
+
+    Records are yielded as soon as their page arrives; Sickle only requests the
+    next page (following the resumption token) once the current one has been
+    consumed, so memory stays bounded by a single ListRecords page no matter
+    how many records are harvested. `count` and `resumption_token` reflect the
+    progress of the stream while it is being consumed.
+
+    Deleted records are yielded too (with `deleted=True`) so callers can drop
+    them from the index. `latest_datestamp` tracks the newest OAI datestamp
+    seen, and `exhausted` becomes True only when the server reported the end
+    of the list (rather than the stream stopping at `limit`).
+
+    `position` describes the record just yielded: the resumption token that
+    fetched its page, how many records of that page have been read, and the
+    running `count`. Passing a saved position as `resume` continues right
+    after that record. If the server no longer accepts the token (they
+    expire), the list is requested again from the start and the first
+    `count` records are skipped.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        metadata_prefix: str = "oai_dc",
+        set_spec: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: Optional[int] = 100,
+        resume: Optional[Dict[str, Any]] = None,
+    ):
+        self.base_url = base_url
+        self.limit = limit
+        self.resume = resume
+        self.normalize = make_normalizer(metadata_prefix)
+        self.params: Dict[str, str] = {"metadataPrefix": metadata_prefix}
+        if set_spec:
+            self.params["set"] = set_spec
+        if since:
+            self.params["from"] = since
+        if until:
+            self.params["until"] = until
+
+        self.count = int(resume["count"]) if resume else 0
+        self.latest_datestamp: Optional[str] = None
+        self.exhausted = False
+        self.position: Optional[Dict[str, Any]] = None
+        self._it = None
+
+    @property
+    def resumption_token(self) -> Optional[str]:
+        """Token Sickle will use to fetch the next page (None before the first/after the last page)."""
+        token = getattr(self._it, "resumption_token", None)
+        return getattr(token, "token", None) or None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self.limit is not None and self.count >= self.limit:
+            return
+        sickle = Sickle(self.base_url, class_mapping={**DEFAULT_CLASS_MAP, "ListRecords": _RawRecord})
+        token = self.resume.get("token") if self.resume else None
+        skip = int(self.resume.get("offset", 0)) if self.resume else 0  # records of the first page already read
+        drop = 0  # records to skip after restarting a list whose token expired
+        try:
+            try:
+                self._it = sickle.ListRecords(**({"resumptionToken": token} if token else self.params))
+            except BadResumptionToken:
+                logger.warning(f"Resumption token {token!r} was rejected; restarting the list and skipping {self.count} records")
+                token, skip, drop = None, 0, self.count
+                self._it = sickle.ListRecords(**self.params)
+        except NoRecordsMatch:
+            # An empty window (e.g. nothing changed since the last run) is not an error.
+            self.exhausted = True
+            return
+        page = getattr(self._it, "oai_response", None)
+        next_token = self.resumption_token
+        offset = 0
+        for rec in self._it:
+            if getattr(self._it, "oai_response", None) is not page:
+                # A new page arrived; it was requested with the token of the page before.
+                page, token, next_token, offset, skip = self._it.oai_response, next_token, self.resumption_token, 0, 0
+            offset += 1
+            if offset <= skip:
+                continue
+            try:
+                normalized = self.normalize(_record_element(rec))
+            except Exception:
+                continue
+            if drop:
+                drop -= 1
+                continue
+            self.count += 1
+            self.latest_datestamp = _newer(normalized.get("datestamp"), self.latest_datestamp)
+            self.position = {"token": token, "offset": offset, "count": self.count}
+            yield normalized
+            if self.limit is not None and self.count >= self.limit:
+                return
+        self.exhausted = True
+
+
+_DAY_FORMAT = "%Y-%m-%d"
+_SECOND_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _parse_oai_date(value: str) -> Tuple[datetime, bool]:
+    """Parse an OAI `from`/`until` value; the flag tells whether it had a time part."""
+    if "T" in value:
+        return datetime.strptime(value.rstrip("Z"), "%Y-%m-%dT%H:%M:%S"), True
+    return datetime.strptime(value, _DAY_FORMAT), False
+
+
+def split_date_range(since: str, until: Optional[str], windows: int) -> List[Tuple[str, str]]:
+    """
+    Split the inclusive OAI range `since..until` into at most `windows` contiguous windows.
+
+    Windows do not overlap (each ends one granularity unit before the next
+    begins). OAI-PMH requires `from` and `until` to share a granularity, so
+    every boundary uses seconds if either input has a time part, days
+    otherwise. A missing `until` means "now".
+    """
+    start, start_fine = _parse_oai_date(since)
+    if until:
+        end, end_fine = _parse_oai_date(until)
+    else:
+        end, end_fine = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0), start_fine
+    fine = start_fine or end_fine
+    if fine and until and not end_fine:
+        # A day-granularity `until` is inclusive of the whole day.
+        end = end + timedelta(days=1, seconds=-1)
+    if not fine:
+        end = end.replace(hour=0, minute=0, second=0)
+
+    unit = timedelta(seconds=1) if fine else timedelta(days=1)
+    fmt = _SECOND_FORMAT if fine else _DAY_FORMAT
+    total_units = int((end - start) / unit) + 1
+    if total_units <= 1 or windows <= 1:
+        return [(start.strftime(fmt), end.strftime(fmt))]
+
+    n = min(windows, total_units)
+    out: List[Tuple[str, str]] = []
+    for i in range(n):
+        lo = start + unit * (i * total_units // n)
+        hi = start + unit * ((i + 1) * total_units // n - 1)
+        out.append((lo.strftime(fmt), hi.strftime(fmt)))
+    return out
+
+
+_WINDOW_DONE = object()
+
+
+def _on_boundary(datestamp: Optional[str], closing: str) -> bool:
+    """Whether a record stamped `datestamp` falls on (or past) a window's last unit, `closing`.
+
+    Records without a datestamp are treated as on the boundary.
+    """
+    return not datestamp or datestamp[: len(closing)] >= closing
+
+
+class PartitionedRecordStream:
+    """
+    Harvest `since..until` as several date windows concurrently, yielding one ordered stream.
+
+    Each window is an independent ListRecords harvest (its own resumption-token
+    chain) run on a worker thread, so page latency overlaps across windows.
+    Workers push into bounded per-window queues; the consumer drains the
+    windows in chronological order, so memory stays bounded by
+    `workers * prefetch` records. A record stamped on the last unit (day or
+    second) of a window may be listed again by the next one; those records'
+    `oai_identifier`s are kept until the window after that starts, and repeats
+    are dropped and counted in `duplicates`.
+
+    `position` adds the index of the window being consumed to that window's
+    `RecordStream.position`, plus the overall `total` and the boundary
+    identifiers still being tracked; resuming from it skips the earlier
+    windows and continues the current one with the same duplicate checks.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        metadata_prefix: str = "oai_dc",
+        set_spec: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: Optional[int] = 100,
+        windows: int = 4,
+        workers: int = 4,
+        prefetch: int = 500,
+        resume: Optional[Dict[str, Any]] = None,
+    ):
+        if not since:
+            raise ValueError("Partitioned harvesting needs a start date (`since`).")
+        self.base_url = base_url
+        self.metadata_prefix = metadata_prefix
+        self.set_spec = set_spec
+        self.limit = limit
+        self.windows = split_date_range(since, until, windows)
+        self.workers = max(1, workers)
+        self.prefetch = max(1, prefetch)
+        self.resume = resume
+
+        self.count = int(resume["total"]) if resume else 0
+        self.duplicates = 0
+        self.latest_datestamp: Optional[str] = None
+        self.exhausted = False
+        self.position: Optional[Dict[str, Any]] = None
+        self._current: Optional[RecordStream] = None
+
+    @property
+    def resumption_token(self) -> Optional[str]:
+        """Resumption token of the window currently being consumed."""
+        return self._current.resumption_token if self._current is not None else None
+
+    @staticmethod
+    def _put(q: "queue.Queue[Any]", item: Any, stop: threading.Event) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fill(self, stream: RecordStream, q: "queue.Queue[Any]", stop: threading.Event) -> None:
+        try:
+            for rec in stream:
+                # The worker runs ahead of the consumer, so each record travels with its own position.
+                if not self._put(q, (rec, dict(stream.position or {})), stop):
+                    return
+        except Exception as exc:  # surfaced to the consumer thread
+            self._put(q, exc, stop)
+            return
+        self._put(q, _WINDOW_DONE, stop)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self.limit is not None and self.count >= self.limit:
+            return
+        first = int(self.resume["window"]) if self.resume else 0
+        streams = [
+            RecordStream(
+                base_url=self.base_url,
+                metadata_prefix=self.metadata_prefix,
+                set_spec=self.set_spec,
+                since=lo,
+                until=hi,
+                limit=None,
+                resume=self.resume if self.resume and index == first else None,
+            )
+            for index, (lo, hi) in enumerate(self.windows)
+            if index >= first
+        ]
+        queues: List["queue.Queue[Any]"] = [queue.Queue(maxsize=self.prefetch) for _ in streams]
+        stop = threading.Event()
+        # Identifiers on the previous window's closing boundary, and on the current one's.
+        carried: List[str] = list(self.resume.get("carried", ())) if self.resume else []
+        boundary: List[str] = list(self.resume.get("boundary", ())) if self.resume else []
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="oai-window")
+        try:
+            # Windows are submitted in order, so the one being consumed always has a worker.
+            for stream, q in zip(streams, queues):
+                pool.submit(self._fill, stream, q, stop)
+            for index, (stream, q) in enumerate(zip(streams, queues), start=first):
+                self._current = stream
+                if index > first:
+                    carried, boundary = boundary, []
+                repeats = set(carried)
+                closing = self.windows[index][1] if index + 1 < len(self.windows) else None
+                while True:
+                    item = q.get()
+                    if item is _WINDOW_DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    item, position = item
+                    oai_id = item.get("oai_identifier")
+                    if oai_id in repeats:
+                        self.duplicates += 1
+                        continue
+                    if oai_id and closing and _on_boundary(item.get("datestamp"), closing):
+                        # Positions share these lists, so they are replaced rather than appended to.
+                        boundary = boundary + [oai_id]
+                    self.count += 1
+                    self.latest_datestamp = _newer(item.get("datestamp"), self.latest_datestamp)
+                    self.position = {
+                        "window": index,
+                        **position,
+                        "total": self.count,
+                        "carried": carried,
+                        "boundary": boundary,
+                    }
+                    yield item
+                    if self.limit is not None and self.count >= self.limit:
+                        return
+            self.exhausted = True
+        finally:
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_records(
+    base_url: str,
+    metadata_prefix: str = "oai_dc",
+    set_spec: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: Optional[int] = 100,
+    windows: int = 1,
+    workers: int = 4,
+    resume: Optional[Dict[str, Any]] = None,
+):
+    """
+    Return a streaming iterator over normalized records.
+
+    With `windows > 1` the `since..until` range is split into date windows
+    harvested concurrently by `workers` threads (see `PartitionedRecordStream`);
+    otherwise a single `RecordStream` follows one resumption-token chain.
+    `resume` is a `position` saved from an earlier stream with the same
+    arguments; iteration continues after that record.
+    """
+    if windows > 1:
+        return PartitionedRecordStream(
+            base_url=base_url,
+            metadata_prefix=metadata_prefix,
+            set_spec=set_spec,
+            since=since,
+            until=until,
+            limit=limit,
+            windows=windows,
+            workers=workers,
+            resume=resume,
+        )
+    return RecordStream(
+        base_url=base_url,
+        metadata_prefix=metadata_prefix,
+        set_spec=set_spec,
+        since=since,
+        until=until,
+        limit=limit,
+        resume=resume,
+    )
 
-def _first(xpath, root, ns=None):
-    res = root.xpath(xpath, namespaces=ns or {})
-    return res[0] if res else None
 
 def harvest_records(
     base_url: str,
@@ -18,92 +392,25 @@ def harvest_records(
     since: Optional[str] = None,
     until: Optional[str] = None,
     limit: int = 100,
+    windows: int = 1,
+    workers: int = 4,
 ) -> List[Dict[str, Any]]:
     """
     Harvest OAI-PMH records via ListRecords. Returns a normalized list of dicts.
 
-    For Zenodo, `metadata_prefix=oai_datacite` yields richer fields.
+    For Zenodo, `metadata_prefix=oai_datacite` yields richer fields. Prefer
+    `iter_records` for large harvests; this helper materializes the whole list.
+    Pass `windows`/`workers` to harvest date windows in parallel.
     """
-    sickle = Sickle(base_url)
-    params = {"metadataPrefix": metadata_prefix}
-    if set_spec:
-        params["set"] = set_spec
-    if since:
-        params["from"] = since
-    if until:
-        params["until"] = until
-
-    out: List[Dict[str, Any]] = []
-    it = sickle.ListRecords(**params)
-    for rec in it:
-        if len(out) >= limit:
-            break
-
-        try:
-            xml = rec.raw
-            root = etree.fromstring(xml.encode("utf-8"))
-        except Exception:
-            continue
-
-        # OAI wrapper namespaces
-        ns = {
-            "oai": "http://www.openarchives.org/OAI/2.0/",
-            "dc": "http://purl.org/dc/elements/1.1/",
-            "oai_dc": "http://www.openarchives.org/OAI/2.0/oai_dc/",
-            "d": "http://datacite.org/schema/kernel-4",
-        }
-
-        # OAI identifier
-        oai_id_el = _first("//oai:header/oai:identifier", root, ns)
-        oai_id = _text(oai_id_el) if oai_id_el is not None else None
-
-        # Try DataCite schema (Zenodo)
-        title_el = _first("//d:title", root, ns)
-        creators_els = root.xpath("//d:creator/d:creatorName", namespaces=ns)
-        subjects_els = root.xpath("//d:subject", namespaces=ns)
-        desc_el = _first("//d:description", root, ns)
-        date_el = _first("//d:publicationYear", root, ns)
-        url_el = _first("//d:identifier[@identifierType='URL']", root, ns)
-        doi_el = _first("//d:identifier[@identifierType='DOI']", root, ns)
-
-        # Fallback to oai_dc
-        if title_el is None:
-            title_el = _first("//dc:title", root, ns)
-        if not creators_els:
-            creators_els = root.xpath("//dc:creator", namespaces=ns)
-        if not subjects_els:
-            subjects_els = root.xpath("//dc:subject", namespaces=ns)
-        if desc_el is None:
-            desc_el = _first("//dc:description", root, ns)
-        if date_el is None:
-            date_el = _first("//dc:date", root, ns)
-        if url_el is None:
-            # dc:identifier may contain URL
-            ids = [(_text(x) or "") for x in root.xpath("//dc:identifier", namespaces=ns)]
-            url = next((x for x in ids if x.startswith("http")), None)
-        else:
-            url = _text(url_el)
-        doi = _text(doi_el) if doi_el is not None else None
-
-        title = _text(title_el) if title_el is not None else None
-        creators = "; ".join(_text(x) for x in creators_els if _text(x))
-        subjects = "; ".join(_text(x) for x in subjects_els if _text(x))
-        description = _text(desc_el) if desc_el is not None else None
-        date = _text(date_el) if date_el is not None else None
-
-        rec_id = doi or oai_id
-
-        out.append(
-            {
-                "oai_identifier": oai_id,
-                "id": rec_id,
-                "title": title,
-                "creators": creators,
-                "subjects": subjects,
-                "description": description,
-                "date": date,
-                "url": url,
-            }
+    return list(
+        iter_records(
+            base_url=base_url,
+            metadata_prefix=metadata_prefix,
+            set_spec=set_spec,
+            since=since,
+            until=until,
+            limit=limit,
+            windows=windows,
+            workers=workers,
         )
-
-    return out
+    )
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+
+@dataclass
+class StoredRecord:
+    """A normalized record as last harvested, with the files downloaded for it."""
+
+    source: str
+    record: Dict[str, Any]
+    # One entry per downloaded file: {"path": relative to the raw dir, "sha256": content hash}.
+    files: List[Dict[str, str]] = field(default_factory=list)
+
+
+class RecordStore:
+    """
+    Every harvested record's normalized fields, kept locally in SQLite so the index can be rebuilt offline.
+
+    Records are keyed by OAI identifier and stored as zlib-compressed JSON
+    next to the list of files downloaded for them (path and content hash,
+    which is also the key of their text in the parsed-text cache). Ingest
+    replaces a record each time it is harvested and removes it when the
+    catalogue reports it deleted, so the store mirrors what the collection
+    was built from. `stats` counts records stored and removed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " oai_identifier TEXT PRIMARY KEY, source TEXT NOT NULL, datestamp TEXT,"
+            " record BLOB NOT NULL, files TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_source ON records (source)")
+        self._db.commit()
+        self.stats = {"stored": 0, "removed": 0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def put(self, source: str, rec: Dict[str, Any], files: Optional[List[Dict[str, str]]] = None) -> None:
+        key = rec.get("oai_identifier") or rec.get("id") or rec.get("identifier")
+        if not key:
+            raise ValueError("Record has no identifier to store it under")
+        blob = zlib.compress(json.dumps(rec, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO records (oai_identifier, source, datestamp, record, files, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, source, rec.get("datestamp"), blob, json.dumps(files or []), time.time()),
+            )
+            self._db.commit()
+            self.stats["stored"] += 1
+
+    def remove(self, oai_identifier: str) -> None:
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM records WHERE oai_identifier = ?", (oai_identifier,))
+            self._db.commit()
+            self.stats["removed"] += cursor.rowcount
+
+    def get(self, oai_identifier: str) -> Optional[StoredRecord]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT source, record, files FROM records WHERE oai_identifier = ?", (oai_identifier,)
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def count(self, source: Optional[str] = None) -> int:
+        with self._lock:
+            if source is None:
+                return self._db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM records WHERE source = ?", (source,)).fetchone()[0]
+
+    @staticmethod
+    def _decode(row: Any) -> StoredRecord:
+        source, blob, files = row
+        return StoredRecord(source, json.loads(zlib.decompress(blob).decode("utf-8")), json.loads(files))
+
+    def iter_records(self, source: Optional[str] = None, page_size: int = 500) -> Iterator[StoredRecord]:
+        """Stored records (of one `source`, if given) in identifier order, read a page at a time."""
+        after = ""
+        while True:
+            query = "SELECT oai_identifier, source, record, files FROM records WHERE oai_identifier > ?"
+            params: List[Any] = [after]
+            if source is not None:
+                query += " AND source = ?"
+                params.append(source)
+            with self._lock:
+                rows = self._db.execute(f"{query} ORDER BY oai_identifier LIMIT ?", (*params, page_size)).fetchall()
+            for row in rows:
+                yield self._decode(row[1:])
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+class HarvestState:
+    """
+    Per-source harvest high-water marks, one JSON file per source under `state_dir`.
+
+    The mark is the newest OAI datestamp of a run that finished harvesting its
+    window; the next run passes it as `from`, so only records created, changed
+    or deleted upstream since then are fetched. The endpoint, metadata prefix
+    and set are stored alongside the mark, and a mark saved for a different
+    configuration is ignored.
+    """
+
+    def __init__(self, state_dir: Path):
+        self.state_dir = Path(state_dir)
+
+    def _path(self, source_name: str) -> Path:
+        slug = re.sub(r"[^a-zA-Z0-9._-]+", "_", source_name).strip("_") or "source"
+        return self.state_dir / f"{slug}.json"
+
+    @staticmethod
+    def _scope(source: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "endpoint": source.get("endpoint"),
+            "metadata_prefix": source.get("metadata_prefix", "oai_dc"),
+            "set": source.get("set"),
+        }
+
+    def load(self, source: Dict[str, Any]) -> Dict[str, Any]:
+        path = self._path(source["name"])
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+        if data.get("scope") != self._scope(source):
+            return {}
+        return data
+
+    def high_water_mark(self, source: Dict[str, Any]) -> Optional[str]:
+        return self.load(source).get("last_datestamp")
+
+    def save_high_water_mark(self, source: Dict[str, Any], datestamp: str) -> None:
+        """Persist `datestamp` atomically (write to a temp file, then rename over the old one)."""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(source["name"])
+        data = {
+            "source": source["name"],
+            "scope": self._scope(source),
+            "last_datestamp": datestamp,
+            "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+class IngestCheckpoint:
+    """
+    Durable progress of one ingest run, so a run that dies can be continued with `--resume`.
+
+    Records are numbered in harvest order (`seq`, from 1) and registered with
+    their stream position as they enter the pipeline. Every pending write of
+    a record (a chunk batch or deletion that includes it) is `hold`-ed and
+    `release`-d once Chroma has it, and `finish` marks that no more writes
+    will follow; a record with no holds left after `finish` is committed.
+    Because stages run concurrently, records commit out of order, so the
+    checkpoint keeps the position of the last record of the committed prefix
+    (the watermark) plus the sequence numbers committed beyond it. It is
+    written atomically to `<source>.checkpoint.json` under `state_dir` at most
+    every `interval` seconds, and by `save()`.
+
+    Work that was embedded but not yet written when the run died is not
+    lost: its vectors are in the embedding cache, so resuming re-chunks the
+    uncommitted records without calling the embedding model again.
+    """
+
+    def __init__(self, state_dir: Path, source: Dict[str, Any], run: Dict[str, Any], interval: float = 5.0):
+        self.state_dir = Path(state_dir)
+        self.source = source
+        self.run = run
+        self.interval = interval
+        self.watermark = 0
+        self.position: Optional[Dict[str, Any]] = None
+        self.latest_datestamp: Optional[str] = None
+        self._ahead: Set[int] = set()
+        self._begun: Dict[int, Tuple[Optional[Dict[str, Any]], Optional[str]]] = {}
+        self._holds: Dict[int, int] = {}
+        self._finished: Set[int] = set()
+        self._lock = threading.Lock()
+        self._saved_at = time.monotonic()
+
+    @property
+    def path(self) -> Path:
+        return HarvestState(self.state_dir)._path(self.source["name"]).with_suffix(".checkpoint.json")
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """The saved checkpoint for this source and endpoint configuration, if any."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get("scope") != HarvestState._scope(self.source):
+            return None
+        return data
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Continue from a loaded checkpoint: its run arguments, watermark and out-of-order commits."""
+        self.run = data["run"]
+        self.watermark = int(data["committed"])
+        self.position = data.get("position")
+        self.latest_datestamp = data.get("latest_datestamp")
+        self._ahead = set(data.get("ahead", []))
+
+    def begin(self, seq: int, position: Optional[Dict[str, Any]], datestamp: Optional[str]) -> bool:
+        """Register a record entering the pipeline; False if it was already committed before a resume."""
+        with self._lock:
+            if seq <= self.watermark:
+                return False
+            self._begun[seq] = (position, datestamp)
+            if seq in self._ahead:
+                return False
+            self._holds.setdefault(seq, 0)
+            return True
+
+    def hold(self, seq: int) -> None:
+        with self._lock:
+            self._holds[seq] += 1
+
+    def release(self, seq: int) -> None:
+        with self._lock:
+            self._holds[seq] -= 1
+            if not self._holds[seq] and seq in self._finished:
+                self._commit(seq)
+        self._maybe_save()
+
+    def finish(self, seq: int) -> None:
+        with self._lock:
+            self._finished.add(seq)
+            if not self._holds[seq]:
+                self._commit(seq)
+        self._maybe_save()
+
+    def _commit(self, seq: int) -> None:
+        """Mark `seq` committed and advance the watermark over the contiguous prefix (lock held)."""
+        self._holds.pop(seq, None)
+        self._finished.discard(seq)
+        self._ahead.add(seq)
+        while self.watermark + 1 in self._ahead:
+            self.watermark += 1
+            self._ahead.discard(self.watermark)
+            position, datestamp = self._begun.pop(self.watermark, (self.position, None))
+            self.position = position
+            if datestamp and (self.latest_datestamp is None or datestamp > self.latest_datestamp):
+                self.latest_datestamp = datestamp
+
+    def _maybe_save(self) -> None:
+        if time.monotonic() - self._saved_at >= self.interval:
+            self.save()
+
+    def save(self) -> None:
+        """Write the checkpoint atomically (temp file, then rename)."""
+        with self._lock:
+            data = {
+                "source": self.source["name"],
+                "scope": HarvestState._scope(self.source),
+                "run": self.run,
+                "committed": self.watermark,
+                "position": self.position,
+                "ahead": sorted(self._ahead),
+                "latest_datestamp": self.latest_datestamp,
+                "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            self._saved_at = time.monotonic()
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        """Remove the checkpoint once a run has finished."""
+        self.path.unlink(missing_ok=True)
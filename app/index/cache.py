@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+
+def text_key(text: str) -> str:
+    """sha256 of `text` after Unicode (NFC) and whitespace normalization."""
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding vectors keyed by (model, normalized text hash).
+
+    Vectors are stored as packed float32 blobs in SQLite, a quarter of the
+    size of JSON floats. Each hit refreshes the entry's `last_used` time, and
+    when the stored vectors outgrow `max_bytes` the least recently used ones
+    are evicted down to 90% of the cap. Keying on the model means switching
+    `EMBED_MODEL` never serves vectors from another model.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def get_many(self, model: str, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Cached vectors for whichever of `keys` are present; marks them used and counts hits/misses."""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for i in range(0, len(unique), 500):
+                batch = unique[i : i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({marks})", (model, *batch)
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._db.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(keys) - hits
+        return found
+
+    def put_many(self, model: str, items: Dict[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [(model, key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            for key in items:
+                old = self._db.execute(
+                    "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND key = ?", (model, key)
+                ).fetchone()
+                if old:  # replacing an entry; only count the difference
+                    self._bytes -= old[0]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._bytes += sum(len(row[2]) for row in rows)
+            if self._bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._db.commit()
+
+    def _evict(self, target: int) -> None:
+        """Drop least recently used vectors until at most `target` bytes remain (lock held)."""
+        cursor = self._db.execute("SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used")
+        doomed = []
+        for rowid, size in cursor:
+            if self._bytes <= target:
+                break
+            doomed.append((rowid,))
+            self._bytes -= size
+        self._db.executemany("DELETE FROM embeddings WHERE rowid = ?", doomed)
+        self.stats["evicted"] += len(doomed)
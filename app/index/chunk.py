@@ -1,22 +1,224 @@
 \
 from __future__ import annotations
-from typing import List
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+SEPARATORS = ("\n\n", "\n", ". ", " ")
 
+Span = Tuple[int, int]
 
-def chunk_text(text: str, chunk_size: int = 900, overlap: int = 150) -> List[str]:
-    """Split long text using LangChain's recursive splitter.
 
-    The splitter walks through increasingly fine-grained separators to keep
-    paragraph/line boundaries where possible while maintaining the requested
-    chunk size and overlap. This keeps chunking logic aligned with the rest of
-    our LangChain-powered stack.
+@dataclass
+class Chunk:
+    text: str
+    start: int  # offset of the chunk's first character in the source text
+    end: int  # offset one past its last character
+    page_start: int = 1
+    page_end: int = 1
+
+
+def tiktoken_length(encoding: str = "cl100k_base") -> Callable[[str], int]:
+    """A `length_function` counting tokens with tiktoken (optional dependency)."""
+    try:
+        import tiktoken
+    except ImportError as e:
+        raise ImportError("Counting chunk sizes in tokens needs `pip install tiktoken`.") from e
+    enc = tiktoken.get_encoding(encoding)
+    return lambda s: len(enc.encode(s, disallowed_special=()))
+
+
+class _Splitter:
+    """Recursive separator splitting over (start, end) spans of one source string.
+
+    Mirrors LangChain's `RecursiveCharacterTextSplitter` with its defaults
+    (separators kept at the start of the following piece, whitespace stripped
+    from chunk edges) but tracks pieces as index pairs into `text`, so each
+    chunk is a slice of the source with known offsets. Finding the pieces
+    still copies the span being split (`str.split` does the separator search
+    in C), but only the part lengths are kept. Sizes are span lengths unless
+    a `length_function` (e.g. a token counter) is set.
     """
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        separators=["\n\n", "\n", ". ", " "],
-    )
-    return splitter.split_text(text)
+    def __init__(
+        self,
+        text: str,
+        chunk_size: int,
+        overlap: int,
+        separators: Sequence[str] = SEPARATORS,
+        length_function: Optional[Callable[[str], int]] = None,
+    ):
+        if overlap > chunk_size:
+            raise ValueError(f"Got a larger chunk overlap ({overlap}) than chunk size ({chunk_size}), should be smaller.")
+        self.text = text
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.separators = list(separators)
+        self._length_function = length_function
+
+    def _pieces(self, start: int, end: int, separator: str) -> List[int]:
+        """Boundaries of the pieces between occurrences of `separator`, which begins the following piece.
+
+        Piece `k` spans `bounds[k]..bounds[k + 1]`.
+        """
+        if not separator:
+            return list(range(start, end + 1))
+        # str.split finds the separators in C; only the part lengths are used.
+        parts = self.text[start:end].split(separator)
+        step = len(separator)
+        sizes = [step + len(part) for part in parts]
+        sizes[0] -= step
+        if not sizes[0]:
+            del sizes[0]
+        return list(accumulate(sizes, initial=start))
+
+    def _strip(self, start: int, end: int) -> Optional[Span]:
+        text = self.text
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
+
+    def _emit(self, start: int, end: int, out: List[Span]) -> None:
+        span = self._strip(start, end)
+        if span is not None:
+            out.append(span)
+
+    def _merge(self, bounds: List[int], cum: List[int], lo: int, stop: int, out: List[Span]) -> None:
+        """Greedily pack pieces `lo..stop` into chunks, carrying up to `overlap` into the next.
+
+        `cum[k] - cum[j]` is the total size of pieces `j..k`, so each chunk's
+        extent and the overlap to keep are found by bisection rather than by
+        adding pieces one at a time.
+        """
+        chunk_size, overlap = self.chunk_size, self.overlap
+        while True:
+            # Pieces lo..hi fit; piece hi would push the chunk past chunk_size.
+            hi = bisect_right(cum, cum[lo] + chunk_size, lo, stop + 1) - 1
+            if hi >= stop:
+                self._emit(bounds[lo], bounds[stop], out)
+                return
+            self._emit(bounds[lo], bounds[hi], out)
+            # Drop leading pieces until the rest fits in the overlap and leaves room for piece hi.
+            lo = bisect_left(cum, max(cum[hi] - overlap, cum[hi + 1] - chunk_size), lo, hi)
+
+    def split(self, start: int, end: int, separators: Optional[List[str]] = None, out: Optional[List[Span]] = None) -> List[Span]:
+        separators = self.separators if separators is None else separators
+        out = [] if out is None else out
+        separator, finer = separators[-1], []
+        for i, sep in enumerate(separators):
+            if sep == "":
+                separator = sep
+                break
+            if self.text.find(sep, start, end) != -1:
+                separator, finer = sep, separators[i + 1 :]
+                break
+
+        bounds = self._pieces(start, end, separator)
+        if self._length_function is None:
+            cum = bounds  # sizes are span lengths, so offsets already work as running totals
+        else:
+            text = self.text
+            sizes = [self._length_function(text[s:e]) for s, e in zip(bounds, bounds[1:])]
+            cum = list(accumulate(sizes, initial=0))
+        chunk_size = self.chunk_size
+        pieces = len(bounds) - 1
+        run = 0  # first piece of the current run of pieces small enough to merge
+        for i in [k for k in range(pieces) if cum[k + 1] - cum[k] >= chunk_size]:
+            if i > run:
+                self._merge(bounds, cum, run, i, out)
+            if finer:
+                self.split(bounds[i], bounds[i + 1], finer, out)
+            else:
+                out.append((bounds[i], bounds[i + 1]))
+            run = i + 1
+        if pieces > run:
+            self._merge(bounds, cum, run, pieces, out)
+        return out
+
+
+def chunk_spans(
+    text: str,
+    chunk_size: int = 900,
+    overlap: int = 150,
+    length_function: Optional[Callable[[str], int]] = None,
+) -> List[Span]:
+    """`(start, end)` offsets of the chunks of `text`; see `chunk_text`."""
+    return _Splitter(text, chunk_size, overlap, length_function=length_function).split(0, len(text))
+
+
+def chunk_text(
+    text: str,
+    chunk_size: int = 900,
+    overlap: int = 150,
+    length_function: Optional[Callable[[str], int]] = None,
+) -> List[str]:
+    """Split long text into overlapping chunks of at most `chunk_size`.
+
+    Uses the same recursive strategy and output as LangChain's
+    `RecursiveCharacterTextSplitter` with our separators: the coarsest
+    separator present (paragraph, line, sentence, word) splits the text, small
+    pieces are packed greedily with `overlap` carried between chunks, and
+    oversized pieces are split again with finer separators. It runs over
+    offsets instead of substrings, which makes it much faster on long
+    fulltext. Sizes are characters unless `length_function` says otherwise.
+    """
+
+    return [text[start:end] for start, end in chunk_spans(text, chunk_size, overlap, length_function)]
+
+
+def chunk_pages(
+    pages: Iterable[str],
+    chunk_size: int = 900,
+    overlap: int = 150,
+    length_function: Optional[Callable[[str], int]] = None,
+) -> Iterator[Chunk]:
+    """Chunk a stream of pages incrementally, yielding `Chunk`s with offsets and page numbers.
+
+    Pages (numbered from 1) are joined with newlines, as `extract_pdf_text`
+    does, and offsets refer to that joined text. Pages collect in a buffer of
+    a few chunks' worth of text; once it is full it is split like
+    `chunk_text`, every chunk but the last is yielded and the buffer restarts
+    at the last chunk, so its overlap with the chunk before is kept and
+    memory stays bounded no matter how many pages the document has.
+    """
+
+    flush_at = chunk_size * 4
+    buffer = ""
+    base = 0  # offset of `buffer` within the joined document
+    # Offset in `buffer` where each page starts, and that page's number.
+    offsets: List[int] = []
+    numbers: List[int] = []
+
+    def page_at(offset: int) -> int:
+        return numbers[max(0, bisect_right(offsets, offset) - 1)]
+
+    def located(spans: List[Span]) -> Iterator[Chunk]:
+        for start, end in spans:
+            yield Chunk(buffer[start:end], base + start, base + end, page_at(start), page_at(end - 1))
+
+    for number, page in enumerate(pages, start=1):
+        if number > 1:
+            buffer += "\n"
+        offsets.append(len(buffer))
+        numbers.append(number)
+        buffer += page
+        if len(buffer) < flush_at:
+            continue
+        spans = chunk_spans(buffer, chunk_size, overlap, length_function)
+        if len(spans) < 2:
+            flush_at *= 2  # chunks measured in tokens can span more text than expected
+            continue
+        yield from located(spans[:-1])
+        keep = spans[-1][0]
+        first = page_at(keep)
+        kept = [(o - keep, n) for o, n in zip(offsets, numbers) if o > keep]
+        offsets = [0] + [o for o, _ in kept]
+        numbers = [first] + [n for _, n in kept]
+        buffer = buffer[keep:]
+        base += keep
+        flush_at = chunk_size * 4
+
+    yield from located(chunk_spans(buffer, chunk_size, overlap, length_function))
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    """Overlapping `size`-word shingles of `text`, lowercased; short texts give one shingle."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i : i + size]) for i in range(len(words) - size + 1)]
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(bands, rows) whose S-curve `(1 / bands) ** (1 / rows)` lies closest to `threshold`."""
+    best = (num_perm, 1)
+    best_gap = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        gap = abs((1 / bands) ** (1 / rows) - threshold)
+        if gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class MinHasher:
+    """MinHash signatures of word shingles, with seeded permutations so they are stable across runs."""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # Universal hashing ((a * h + b) mod p, truncated to 32 bits) as in datasketch; the product
+        # wraps around in uint64, which mixes the bits further.
+        self._a = rng.randint(1, _MERSENNE, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)), dtype=np.uint64
+        )
+        if not hashes.size:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            permuted = ((np.outer(hashes, self._a) + self._b) % _MERSENNE) & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of stored chunks, persisted in SQLite, for finding near-duplicate text.
+
+    Each indexed chunk keeps its signature and one bucket per LSH band; a
+    query only compares signatures of chunks sharing a bucket, and reports
+    the most similar one whose estimated Jaccard similarity (of word
+    shingles) reaches `threshold`. Chunks found to be near-duplicates are recorded against
+    their canonical chunk instead of being indexed themselves, so
+    `duplicates_of` can list every record that carries the same text.
+    Changing `threshold` re-buckets the stored signatures on open.
+
+    Duplicates keep their signature, text and metadata. When a canonical
+    chunk is removed or its text changes, its duplicates are checked again:
+    each is re-pointed at another canonical chunk if one still matches, or
+    becomes canonical itself. `pop_promoted()` hands the latter back as
+    `(doc_id, text, metadata)` so the caller can store them in its place.
+    """
+
+    def __init__(self, path: Path, threshold: float = 0.9, num_perm: int = 128):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (
+                doc_id TEXT PRIMARY KEY, record_id TEXT NOT NULL, signature BLOB NOT NULL);
+            CREATE INDEX IF NOT EXISTS signatures_record ON signatures (record_id);
+            CREATE TABLE IF NOT EXISTS buckets (
+                band INTEGER NOT NULL, bucket BLOB NOT NULL, doc_id TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket);
+            CREATE INDEX IF NOT EXISTS buckets_doc ON buckets (doc_id);
+            CREATE TABLE IF NOT EXISTS duplicates (
+                doc_id TEXT PRIMARY KEY, record_id TEXT NOT NULL, canonical_id TEXT NOT NULL,
+                signature BLOB, text BLOB, metadata TEXT);
+            CREATE INDEX IF NOT EXISTS duplicates_canonical ON duplicates (canonical_id);
+            CREATE INDEX IF NOT EXISTS duplicates_record ON duplicates (record_id);
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(duplicates)")}
+        for column, kind in (("signature", "BLOB"), ("text", "BLOB"), ("metadata", "TEXT")):
+            if column not in columns:  # an index written before duplicates kept their text
+                self._db.execute(f"ALTER TABLE duplicates ADD COLUMN {column} {kind}")
+        layout = f"{num_perm}:{self.bands}:{self.rows}"
+        row = self._db.execute("SELECT value FROM settings WHERE key = 'layout'").fetchone()
+        if row is None or row[0] != layout:
+            self._rebucket()
+            self._db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('layout', ?)", (layout,))
+        self._db.commit()
+        self.stats = {"checked": 0, "duplicates": 0, "promoted": 0}
+        self._promoted: List[Tuple[str, str, Dict[str, Any]]] = []
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _band_rows(self, doc_id: str, signature: np.ndarray) -> List[Tuple[int, bytes, str]]:
+        r = self.rows
+        return [(band, signature[band * r : (band + 1) * r].tobytes(), doc_id) for band in range(self.bands)]
+
+    def _rebucket(self) -> None:
+        self._db.execute("DELETE FROM buckets")
+        for doc_id, blob in self._db.execute("SELECT doc_id, signature FROM signatures").fetchall():
+            signature = np.frombuffer(blob, dtype=np.uint64)
+            if signature.size == self.hasher.num_perm:
+                self._db.executemany("INSERT INTO buckets VALUES (?, ?, ?)", self._band_rows(doc_id, signature))
+
+    def _similar(self, doc_id: str, signature: np.ndarray) -> Optional[str]:
+        """Most similar indexed chunk other than `doc_id` at or above the threshold (lock held)."""
+        candidates = set()
+        for band, bucket, _ in self._band_rows(doc_id, signature):
+            rows = self._db.execute("SELECT doc_id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket))
+            candidates.update(other for (other,) in rows if other != doc_id)
+        best, best_score = None, self.threshold
+        for other in sorted(candidates):
+            blob = self._db.execute("SELECT signature FROM signatures WHERE doc_id = ?", (other,)).fetchone()
+            score = float(np.mean(np.frombuffer(blob[0], dtype=np.uint64) == signature))
+            if score >= best_score:
+                best, best_score = other, score
+        return best
+
+    def _unindex(self, doc_ids: List[str]) -> None:
+        self._db.executemany("DELETE FROM signatures WHERE doc_id = ?", [(d,) for d in doc_ids])
+        self._db.executemany("DELETE FROM buckets WHERE doc_id = ?", [(d,) for d in doc_ids])
+        self._db.executemany("DELETE FROM duplicates WHERE doc_id = ?", [(d,) for d in doc_ids])
+
+    def _index(
+        self, doc_id: str, record_id: str, signature: np.ndarray, text: str, meta: Dict[str, Any]
+    ) -> Optional[str]:
+        """Index one chunk as canonical, or record it against the canonical it duplicates (lock held)."""
+        canonical = self._similar(doc_id, signature)
+        if canonical is not None:
+            self._db.execute(
+                "INSERT INTO duplicates VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    doc_id,
+                    record_id,
+                    canonical,
+                    signature.tobytes(),
+                    zlib.compress(text.encode("utf-8")),
+                    json.dumps(meta, ensure_ascii=False),
+                ),
+            )
+        else:
+            self._db.execute("INSERT INTO signatures VALUES (?, ?, ?)", (doc_id, record_id, signature.tobytes()))
+            self._db.executemany("INSERT INTO buckets VALUES (?, ?, ?)", self._band_rows(doc_id, signature))
+        return canonical
+
+    def _recheck_duplicates_of(self, canonical_ids: Set[str]) -> None:
+        """Re-point or promote the duplicates of chunks that were removed or re-indexed (lock held)."""
+        ids = sorted(canonical_ids)
+        rows = []
+        for i in range(0, len(ids), 500):
+            batch = ids[i : i + 500]
+            rows += self._db.execute(
+                "SELECT doc_id, record_id, signature, text, metadata FROM duplicates"
+                f" WHERE canonical_id IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+        for doc_id, record_id, blob, text, meta in sorted(rows):
+            self._db.execute("DELETE FROM duplicates WHERE doc_id = ?", (doc_id,))
+            if blob is None:
+                # Recorded before duplicates kept their text: nothing to promote it from.
+                logger.warning(f"Dropped near-duplicate {doc_id} of a removed chunk; it returns when its record is next harvested")
+                continue
+            text, meta = zlib.decompress(text).decode("utf-8"), json.loads(meta)
+            if self._index(doc_id, record_id, np.frombuffer(blob, dtype=np.uint64), text, meta) is None:
+                self.stats["promoted"] += 1
+                self._promoted.append((doc_id, text, meta))
+
+    def update_record(self, record_id: str, chunks: Iterable[Sequence[Any]]) -> Dict[str, str]:
+        """
+        Index a record's current `(doc_id, text[, metadata])` chunks, holding back near-duplicates of indexed chunks.
+
+        Metadata is kept with duplicates, to store them with if they are promoted. Returns `{doc_id: canonical_id}` for the chunks that are near-duplicates.
+        Chunks are checked in order, so one can also duplicate an earlier chunk
+        of the same record, and every chunk is re-checked with its current text,
+        so an edited chunk can become (or stop being) a duplicate. Entries for
+        chunks the record no longer has are dropped. Duplicates of this
+        record's chunks in other records are checked again (see `pop_promoted`).
+        """
+        chunks = list(chunks)
+        found: Dict[str, str] = {}
+        with self._lock:
+            current = {chunk[0] for chunk in chunks}
+            known = self._db.execute(
+                "SELECT doc_id FROM signatures WHERE record_id = ? UNION SELECT doc_id FROM duplicates WHERE record_id = ?",
+                (record_id, record_id),
+            ).fetchall()
+            stale = [doc_id for (doc_id,) in known if doc_id not in current]
+            self._unindex(stale)
+            for doc_id, text, *meta in chunks:
+                signature = self.hasher.signature(text)
+                self.stats["checked"] += 1
+                self._unindex([doc_id])
+                canonical = self._index(doc_id, record_id, signature, text, meta[0] if meta else {})
+                if canonical is not None:
+                    self.stats["duplicates"] += 1
+                    found[doc_id] = canonical
+            self._recheck_duplicates_of(set(stale) | current)
+            self._db.commit()
+        return found
+
+    def remove_record(self, record_id: str) -> None:
+        """Forget a deleted record's chunks; their near-duplicates elsewhere are re-pointed or promoted."""
+        self.update_record(record_id, [])
+
+    def pop_promoted(self) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Duplicates that became canonical since the last call, as `(doc_id, text, metadata)`, to be stored."""
+        with self._lock:
+            promoted, self._promoted = self._promoted, []
+        return promoted
+
+    def canonical_of(self, doc_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT canonical_id FROM duplicates WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def duplicates_of(self, canonical_id: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT doc_id FROM duplicates WHERE canonical_id = ? ORDER BY doc_id", (canonical_id,)
+            ).fetchall()
+        return [doc_id for (doc_id,) in rows]
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .chunk import chunk_pages, tiktoken_length
+from .store import chunk_content_hash
+
+# Downloaded files with less extracted text than this are not indexed.
+MIN_FILE_CHARS = 200
+
+# (label, pages, paged): one text source of a record.
+TextSource = Tuple[str, List[str], bool]
+# (doc_id, text, metadata): one chunk ready for embedding.
+Candidate = Tuple[str, str, Dict[str, Any]]
+
+
+def record_id(rec: Dict[str, Any]) -> Optional[str]:
+    return rec.get("id") or rec.get("identifier") or rec.get("oai_identifier")
+
+
+def metadata_text(rec: Dict[str, Any]) -> str:
+    landing = rec.get("url") or rec.get("landing_url")
+    return "\n".join(
+        x for x in [
+            f"Title: {rec.get('title') or 'Untitled'}",
+            f"Creators: {rec.get('creators','')}",
+            f"Subjects: {rec.get('subjects','')}",
+            f"Description: {rec.get('description','')}",
+            f"Published: {rec.get('date','')}",
+            f"URL: {landing or ''}",
+        ] if x
+    ).strip()
+
+
+def text_sources(rec: Dict[str, Any], parsed_files: Sequence[Tuple[Path, Optional[List[str]]]]) -> List[TextSource]:
+    """
+    A record's text sources: its metadata, then every parsed file with enough text to be worth indexing.
+
+    Only PDFs have real pages; other sources are a single unnumbered "page".
+    """
+    texts: List[TextSource] = []
+    meta_text = metadata_text(rec)
+    if meta_text:
+        texts.append(("metadata", [meta_text], False))
+    for fp, pages in parsed_files:
+        if pages and sum(len(p.strip()) for p in pages) > MIN_FILE_CHARS:
+            texts.append((fp.name, pages, fp.suffix.lower() == ".pdf"))
+    return texts
+
+
+def record_chunks(
+    rec: Dict[str, Any],
+    texts: Sequence[TextSource],
+    chunk_size: int = 900,
+    overlap: int = 150,
+    length_function: Optional[Callable[[str], int]] = None,
+) -> List[Candidate]:
+    """
+    Chunk a record's text sources into `(doc_id, text, metadata)` triples.
+
+    Chunk ids are `<record id>:<label>:<n>` and the metadata carries the
+    chunk's offsets (and pages, for paged sources) plus its `content_hash`,
+    so ingest can compare them with what Chroma already holds. The record's
+    chunks are returned as one list, since the near-duplicate check and that
+    comparison need all of them; with the pages already in memory, a large
+    document is held whole, and only `chunk_pages`' own buffer is bounded.
+    """
+    rec_id = record_id(rec)
+    landing = rec.get("url") or rec.get("landing_url")
+    candidates: List[Candidate] = []
+    for label, pages, paged in texts:
+        for i, chunk in enumerate(chunk_pages(pages, chunk_size, overlap, length_function)):
+            meta = {
+                "record_id": rec_id,
+                "oai_identifier": rec.get("oai_identifier") or "",
+                "title": rec.get("title") or "Untitled",
+                "label": label,
+                "url": landing or "",
+                "chunk": i,
+                "char_start": chunk.start,
+                "char_end": chunk.end,
+            }
+            if paged:
+                meta["page_start"] = chunk.page_start
+                meta["page_end"] = chunk.page_end
+            meta["content_hash"] = chunk_content_hash(chunk.text, meta)
+            candidates.append((f"{rec_id}:{label}:{i}", chunk.text, meta))
+    return candidates
+
+
+@lru_cache(maxsize=None)
+def _length_function(chunk_unit: str) -> Optional[Callable[[str], int]]:
+    return tiktoken_length() if chunk_unit == "tokens" else None
+
+
+def chunk_record_in_worker(
+    rec: Dict[str, Any], texts: Sequence[TextSource], chunk_size: int, overlap: int, chunk_unit: str = "chars"
+) -> List[Candidate]:
+    """`record_chunks` for a worker process; `chunk_unit` ("chars" or "tokens") stands in for the length function."""
+    return record_chunks(rec, texts, chunk_size, overlap, _length_function(chunk_unit))
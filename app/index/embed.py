@@ -1,19 +1,264 @@
+from __future__ import annotations
+
+import logging
 import os
-from typing import List
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
 from langchain_ollama import OllamaEmbeddings
 
+from .cache import EmbeddingCache, text_key
+
 # FIX: Changed the default OLLAMA_BASE_URL from 'http://ollama:11434' to 'http://localhost:11434'.
 # This allows the host-run ingestion script to correctly resolve the Ollama service
 # exposed via docker-compose.
 OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
 EMBED_MODEL = os.environ.get("EMBED_MODEL", "nomic-embed-text")
+EMBED_CACHE_MB = int(os.environ.get("EMBED_CACHE_MB", "512"))
+# Upper bound on the characters sent in one embedding request, and the latency above which batches shrink.
+EMBED_BATCH_MAX_CHARS = int(os.environ.get("EMBED_BATCH_MAX_CHARS", "64000"))
+EMBED_TARGET_LATENCY = float(os.environ.get("EMBED_TARGET_LATENCY", "10"))
+
+logger = logging.getLogger(__name__)
 
 _embeddings = OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE_URL)
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    """Embed a batch of texts using the LangChain Ollama embeddings wrapper."""
-    if not texts:
-        return []
-    return _embeddings.embed_documents(texts)
+@dataclass
+class _Submission:
+    keys: List[str]
+    vectors: Dict[str, List[float]]
+    remaining: int
+    future: "Future[List[List[float]]]" = field(default_factory=Future)
+
+
+@dataclass
+class _Item:
+    submission: _Submission
+    key: str
+    text: str
+    queued: float
+
+
+class EmbeddingExecutor:
+    """
+    Keep several embedding batches in flight against Ollama, sizing them from observed latency.
+
+    `submit(texts)` queues texts and returns a future for their vectors;
+    `workers` threads each take the next batch from the queue, mixing texts
+    from different submissions, of at most `batch_size` texts and
+    `max_chars` characters. The size adapts after every batch: it grows by a
+    quarter while full batches come back within `target_latency` seconds and
+    per-batch throughput holds up, shrinks by a quarter when throughput drops,
+    and halves when a batch is slow or fails. A failed batch is split in two
+    and both halves retried, so a request that is too large for the server,
+    or one bad text, only costs its own half; a single text is retried
+    `retries` times with backoff before its submission fails; any other error
+    while handling a batch fails the submissions it holds. Only batches
+    taken from the queue steer the size: the halves and retries that narrow a
+    failure down to one bad text do not shrink it further. With a `cache`,
+    only texts not embedded before are queued, once per distinct text.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        workers: int = 2,
+        cache: Optional[EmbeddingCache] = None,
+        model: str = EMBED_MODEL,
+        batch_size: int = 32,
+        min_batch: int = 1,
+        max_batch: int = 256,
+        max_chars: int = EMBED_BATCH_MAX_CHARS,
+        target_latency: float = EMBED_TARGET_LATENCY,
+        retries: int = 2,
+        backoff: float = 0.5,
+        linger: float = 0.05,
+    ):
+        self.embed_fn = embed_fn
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.model = model
+        self.min_batch = max(1, min_batch)
+        self.max_batch = max(self.min_batch, max_batch)
+        self.batch_size = min(max(batch_size, self.min_batch), self.max_batch)
+        self.max_chars = max_chars
+        self.target_latency = target_latency
+        self.retries = retries
+        self.backoff = backoff
+        self.linger = linger
+        self.stats = {"batches": 0, "texts": 0, "failed": 0, "split": 0, "retried": 0, "seconds": 0.0}
+        self._rate = 0.0  # moving average of texts/sec over full batches
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._queue: Deque[_Item] = deque()
+        self._queued_chars = 0
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"embed-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def __enter__(self) -> "EmbeddingExecutor":
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Embed whatever is still queued, then stop the workers."""
+        with self._ready:
+            self._closed = True
+            self._ready.notify_all()
+        for t in self._threads:
+            t.join()
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def submit(self, texts: List[str]) -> "Future[List[List[float]]]":
+        """Queue `texts` for embedding; the future resolves to one vector per text, in order."""
+        keys = [text_key(t) for t in texts]
+        vectors: Dict[str, List[float]] = self.cache.get_many(self.model, keys) if self.cache is not None else {}
+        pending = {k: t for k, t in zip(keys, texts) if k not in vectors}
+        submission = _Submission(keys=keys, vectors=vectors, remaining=len(pending))
+        if not pending:
+            submission.future.set_result([vectors[k] for k in keys])
+            return submission.future
+        now = time.monotonic()
+        with self._ready:
+            if self._closed:
+                raise RuntimeError("EmbeddingExecutor is closed")
+            for key, text in pending.items():
+                self._queue.append(_Item(submission, key, text, now))
+                self._queued_chars += len(text)
+            self._ready.notify_all()
+        return submission.future
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed `texts` and wait for the vectors."""
+        return self.submit(texts).result()
+
+    def _take(self) -> Optional[Tuple[List[_Item], bool]]:
+        """Wait for the next batch; returns (items, whether the batch was full) or None once closed and drained."""
+        with self._ready:
+            while True:
+                if self._queue:
+                    waited = time.monotonic() - self._queue[0].queued
+                    if (
+                        len(self._queue) >= self.batch_size
+                        or self._queued_chars >= self.max_chars
+                        or waited >= self.linger
+                        or self._closed
+                    ):
+                        break
+                    # Give other submissions a moment to fill the batch.
+                    self._ready.wait(self.linger - waited)
+                elif self._closed:
+                    return None
+                else:
+                    self._ready.wait()
+            batch: List[_Item] = []
+            chars = 0
+            full = False
+            while self._queue:
+                item = self._queue[0]
+                if item.submission.future.done():  # its submission already failed
+                    self._queue.popleft()
+                    self._queued_chars -= len(item.text)
+                    continue
+                if len(batch) >= self.batch_size or (batch and chars + len(item.text) > self.max_chars):
+                    full = True
+                    break
+                batch.append(self._queue.popleft())
+                self._queued_chars -= len(item.text)
+                chars += len(item.text)
+            return batch, full or len(batch) >= self.batch_size
+
+    def _work(self) -> None:
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            batch, full = taken
+            if not batch:
+                continue
+            try:
+                self._run(batch, full)
+            except Exception as e:  # noqa: BLE001 - a dead worker would leave its submissions waiting forever
+                logger.error(f"Embedding batch of {len(batch)} texts failed: {e}")
+                self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch: List[_Item], error: Exception) -> None:
+        """Fail every submission with texts in `batch` that has not been resolved yet."""
+        for item in batch:
+            if not item.submission.future.done():
+                item.submission.future.set_exception(error)
+
+    def _adapt(self, size: int, seconds: Optional[float], full: bool) -> None:
+        """AIMD on the batch size from one batch's outcome (`seconds` is None when it failed)."""
+        with self._lock:
+            if seconds is None or seconds > self.target_latency:
+                self.batch_size = max(self.min_batch, self.batch_size // 2)
+                return
+            if not full:
+                return  # a partial batch says nothing about larger ones
+            rate = size / max(seconds, 1e-6)
+            if rate >= self._rate * 0.9:
+                self.batch_size = min(self.max_batch, self.batch_size + max(1, self.batch_size // 4))
+            else:
+                self.batch_size = max(self.min_batch, self.batch_size - max(1, self.batch_size // 4))
+            self._rate = rate if not self._rate else 0.7 * self._rate + 0.3 * rate
+
+    def _run(self, batch: List[_Item], full: bool, attempt: int = 0, whole: bool = True) -> None:
+        batch = [item for item in batch if not item.submission.future.done()]
+        if not batch:
+            return
+        embed_fn = self.embed_fn or _embeddings.embed_documents
+        started = time.monotonic()
+        try:
+            vectors = embed_fn([item.text for item in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+        except Exception as e:  # noqa: BLE001 - retried, then reported through the futures
+            self._count("failed")
+            if whole:
+                self._adapt(len(batch), None, full)
+            if len(batch) > 1:
+                self._count("split")
+                mid = len(batch) // 2
+                self._run(batch[:mid], False, whole=False)
+                self._run(batch[mid:], False, whole=False)
+            elif attempt < self.retries:
+                self._count("retried")
+                time.sleep(self.backoff * 2**attempt)
+                self._run(batch, False, attempt + 1, whole=False)
+            else:
+                logger.warning(f"Embedding failed after {attempt + 1} attempts: {e}")
+                self._fail(batch, e)
+            return
+        seconds = time.monotonic() - started
+        if whole:
+            self._adapt(len(batch), seconds, full)
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(batch)
+            self.stats["seconds"] += seconds
+        fresh = {item.key: vector for item, vector in zip(batch, vectors)}
+        if self.cache is not None:
+            self.cache.put_many(self.model, fresh)
+        for item in batch:
+            submission = item.submission
+            with self._lock:
+                submission.vectors[item.key] = fresh[item.key]
+                submission.remaining -= 1
+                finished = submission.remaining == 0
+            if finished and not submission.future.done():
+                submission.future.set_result([submission.vectors[k] for k in submission.keys])
@@ -1,7 +1,11 @@
+import hashlib
+import json
 import logging
 import os
+import re
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, List, Optional, Tuple
 
 import chromadb
 from chromadb.config import Settings
@@ -28,6 +32,8 @@ def _resolve_chroma_dir() -> Path:
 
 CHROMA_DIR = _resolve_chroma_dir()
 COLLECTION = os.environ.get("COLLECTION", "catalogue")
+# Generations of a collection kept after a new one goes live, the live one included (at least 1).
+COLLECTION_KEEP = int(os.environ.get("COLLECTION_KEEP", "2"))
 
 
 def _silence_chroma_telemetry() -> None:
@@ -44,26 +50,227 @@ def _silence_chroma_telemetry() -> None:
 _silence_chroma_telemetry()
 
 
-def get_collection():
+def chroma_client():
     Path(CHROMA_DIR).mkdir(parents=True, exist_ok=True)
+    return chromadb.PersistentClient(path=str(CHROMA_DIR), settings=Settings(anonymized_telemetry=False))
+
+
+class CollectionAlias:
+    """
+    Pointer from a collection name readers use (`COLLECTION`) to the generation that currently serves it.
+
+    Each full build of the index goes into a new Chroma collection, a
+    generation named `<alias>-g<n>`, while readers keep querying the live
+    one. The pointer is a small JSON file next to the Chroma data
+    (`<alias>.alias.json`) holding the live generation, the one being built
+    (if any) and the promoted generations in order; it is replaced with an
+    atomic rename, so a reader sees either the old or the new generation.
+    Without a pointer file the alias names an ordinary collection, as before
+    generations existed. `current()` re-reads the file only when it changes,
+    so readers can call it on every query. `version()` counts changes to
+    what readers see: each promotion, and each ingest that wrote to the
+    live generation in place; caches of answers key on it.
+    """
+
+    def __init__(self, alias: str = COLLECTION, root: Optional[Path] = None):
+        self.alias = alias
+        self.path = Path(root or CHROMA_DIR) / f"{alias}.alias.json"
+        self._seen: Optional[Tuple[int, int, int]] = None
+        self._data: Dict[str, Any] = {}
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._seen, self._data = None, {}
+            return {}
+        # Every save renames a new file into place, so the inode changes even within one mtime tick.
+        seen = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._seen != seen:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except ValueError:
+                logger.warning(f"Ignoring unreadable collection pointer {self.path}")
+                data = {}
+            self._seen, self._data = seen, data
+        return dict(self._data)
+
+    def current(self) -> str:
+        """The collection readers should query."""
+        return self.load().get("current") or self.alias
+
+    def building(self) -> Optional[str]:
+        return self.load().get("building")
+
+    def version(self) -> int:
+        return int(self.load().get("version") or 0)
+
+    def bump_version(self) -> int:
+        """Record that the live generation's contents changed; returns the new version."""
+        data = self.load()
+        data["version"] = int(data.get("version") or 0) + 1
+        self._save(data)
+        return data["version"]
+
+    def _save(self, data: Dict[str, Any]) -> None:
+        data["alias"] = self.alias
+        data["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def next_name(self) -> str:
+        data = self.load()
+        names = [g["name"] for g in data.get("generations", [])] + [data.get("building") or ""]
+        pattern = re.compile(rf"^{re.escape(self.alias)}-g(\d+)$")
+        numbers = [int(m.group(1)) for m in map(pattern.match, names) if m]
+        return f"{self.alias}-g{max(numbers, default=0) + 1:04d}"
+
+    def mark_building(self, name: Optional[str]) -> None:
+        data = self.load()
+        data["building"] = name
+        self._save(data)
+
+    def promote(self, name: str, keep: int = COLLECTION_KEEP) -> List[str]:
+        """Make `name` the live generation; returns the generations that fall outside the `keep` newest."""
+        data = self.load()
+        generations = data.get("generations", [])
+        previous = data.get("current") or self.alias
+        if previous != name and previous not in [g["name"] for g in generations]:
+            generations.append({"name": previous, "promoted_at": None})  # the collection from before generations
+        generations = [g for g in generations if g["name"] != name]
+        generations.append({"name": name, "promoted_at": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+        keep = max(1, keep)
+        retired = [g["name"] for g in generations[:-keep]]
+        data.update(
+            current=name, building=None, generations=generations[-keep:], version=int(data.get("version") or 0) + 1
+        )
+        self._save(data)
+        return retired
+
+
+def resolve_collection(alias: str = COLLECTION) -> str:
+    """Name of the generation currently serving `alias` (the alias itself if it has none)."""
+    return CollectionAlias(alias).current()
+
+
+def bump_collection_version(alias: str = COLLECTION) -> int:
+    """Mark the live generation of `alias` as changed in place, invalidating answers cached against it."""
+    return CollectionAlias(alias).bump_version()
+
+
+def get_collection(name: Optional[str] = None):
+    """The live generation of `COLLECTION`, or the collection `name` when given."""
+    name = name or resolve_collection()
     logger.info("Using Chroma directory", extra={"chroma_dir": str(CHROMA_DIR)})
-    client = chromadb.PersistentClient(path=str(CHROMA_DIR), settings=Settings(anonymized_telemetry=False))
-    
+    client = chroma_client()
+
     # Use get_or_create_collection, which is safe for both ingest and retrieval.
-    coll = client.get_or_create_collection(COLLECTION, metadata={"hnsw:space": "cosine"})
+    coll = client.get_or_create_collection(name, metadata={"hnsw:space": "cosine"})
 
     # --- Start Debugging Additions ---
     # Check and log the number of documents in the collection
     try:
         count = coll.count()
-        logger.info("Chroma collection ready", extra={"collection_name": COLLECTION, "count": count})
+        logger.info("Chroma collection ready", extra={"collection_name": name, "count": count})
         if count == 0:
             logger.warning(
                 "Chroma collection appears to be empty or data is not visible to the retriever service. "
                 "Ensure ingestion wrote data to the correct shared volume."
             )
     except Exception as e:
-        logger.error(f"Failed to get collection count for {COLLECTION}: {e}")
+        logger.error(f"Failed to get collection count for {name}: {e}")
     # --- End Debugging Additions ---
 
     return coll
+
+
+def _drop_collection(client: Any, name: str) -> None:
+    try:
+        client.delete_collection(name)
+    except ValueError:  # already gone
+        pass
+
+
+def begin_generation(alias: str = COLLECTION, copy_current: bool = False, resume: bool = False) -> Tuple[str, Any]:
+    """
+    Create the next generation of `alias` off to the side; returns `(name, collection)`.
+
+    Readers keep using the live generation until `promote_generation`. With
+    `copy_current`, the live generation's chunks (and vectors) are copied in
+    first, so an incremental ingest only has to apply its changes. With
+    `resume`, an unfinished generation left by an interrupted run is
+    continued instead of started over.
+    """
+    pointer = CollectionAlias(alias)
+    client = chroma_client()
+    existing = {getattr(c, "name", c) for c in client.list_collections()}
+    building = pointer.building()
+    if resume and building in existing:
+        logger.info(f"Continuing unfinished generation {building} of {alias}")
+        return building, client.get_collection(building)
+    if building:
+        _drop_collection(client, building)
+    name = pointer.next_name()
+    _drop_collection(client, name)
+    coll = client.create_collection(name, metadata={"hnsw:space": "cosine"})
+    pointer.mark_building(name)
+    live = pointer.current()
+    if copy_current and live in existing:
+        source = client.get_collection(live)
+        for offset in range(0, source.count(), 1000):
+            got = source.get(include=["documents", "metadatas", "embeddings"], limit=1000, offset=offset)
+            if got["ids"]:
+                coll.upsert(
+                    ids=got["ids"], documents=got["documents"], metadatas=got["metadatas"], embeddings=got["embeddings"]
+                )
+        logger.info(f"Copied {coll.count()} chunks from {live} into new generation {name}")
+    return name, coll
+
+
+def promote_generation(name: str, alias: str = COLLECTION, keep: int = COLLECTION_KEEP) -> List[str]:
+    """Switch readers of `alias` to generation `name` and drop generations beyond the `keep` newest."""
+    retired = CollectionAlias(alias).promote(name, keep)
+    client = chroma_client()
+    for old in retired:
+        _drop_collection(client, old)
+    return retired
+
+
+def discard_generation(name: str, alias: str = COLLECTION) -> None:
+    """Drop an unfinished generation; readers never saw it."""
+    pointer = CollectionAlias(alias)
+    if pointer.building() == name:
+        pointer.mark_building(None)
+    _drop_collection(chroma_client(), name)
+
+
+def delete_record_chunks(coll, oai_identifier: str) -> None:
+    """Remove every chunk that belongs to the OAI record `oai_identifier`.
+
+    Chunks carry the OAI identifier in their metadata; records without a DOI
+    also use it as their `record_id`, so match either field.
+    """
+    coll.delete(where={"$or": [{"oai_identifier": oai_identifier}, {"record_id": oai_identifier}]})
+
+
+def chunk_content_hash(text: str, meta: Dict[str, Any]) -> str:
+    """Fingerprint of a chunk's text and metadata, stored as its `content_hash`.
+
+    Metadata is included so that, for example, a corrected record title
+    rewrites the chunks that carry it.
+    """
+    fields = {k: v for k, v in meta.items() if k != "content_hash"}
+    payload = json.dumps([text, fields], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stored_chunk_hashes(coll, record_id: str) -> Dict[str, Optional[str]]:
+    """Chunk ids the collection holds for `record_id`, mapped to their `content_hash`.
+
+    Chunks written before content hashes were recorded map to None, so they
+    always compare as changed.
+    """
+    got = coll.get(where={"record_id": record_id}, include=["metadatas"])
+    return {i: (m or {}).get("content_hash") for i, m in zip(got["ids"], got["metadatas"] or [])}
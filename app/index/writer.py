@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import logging
+import pickle
+import queue
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Collection methods worker processes may call through a proxy.
+METHODS = frozenset({"get", "upsert", "delete", "count"})
+
+
+class CollectionProxy:
+    """
+    Stand-in for a Chroma collection in a worker process; every call runs in the `CollectionWriter`.
+
+    Supports the methods ingest uses (`get`, `upsert`, `delete`, `count`),
+    so `stored_chunk_hashes`, `delete_record_chunks` and the write stage work
+    unchanged. Calls block until the writer answers and re-raise its errors.
+    One call is outstanding per proxy at a time, so it is safe to share
+    between the threads of a worker.
+    """
+
+    def __init__(self, client_id: int, requests: Any, replies: Any):
+        self.client_id = client_id
+        self._requests = requests
+        self._replies = replies
+        self._lock: Optional[threading.Lock] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        state["_lock"] = None  # locks do not cross process boundaries
+        return state
+
+    def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        if self._lock is None:
+            self._lock = threading.Lock()
+        with self._lock:
+            self._requests.put((self.client_id, method, args, kwargs))
+            ok, result = self._replies.get()
+        if not ok:
+            raise result
+        return result
+
+    def get(self, *args: Any, **kwargs: Any) -> Any:
+        return self._call("get", *args, **kwargs)
+
+    def upsert(self, *args: Any, **kwargs: Any) -> Any:
+        return self._call("upsert", *args, **kwargs)
+
+    def delete(self, *args: Any, **kwargs: Any) -> Any:
+        return self._call("delete", *args, **kwargs)
+
+    def count(self) -> int:
+        return self._call("count")
+
+
+class CollectionWriter:
+    """
+    Own the Chroma collection for several worker processes and apply their calls from one thread.
+
+    Chroma's `PersistentClient` keeps its HNSW index in process memory and
+    its SQLite file does not take concurrent writers well, so with several
+    sources ingesting at once a single process holds the collection and the
+    workers talk to it through `CollectionProxy` objects from `client()`,
+    over multiprocessing queues. Requests are served one at a time in
+    arrival order. `stats` counts requests, chunks upserted and delete calls.
+    """
+
+    def __init__(self, coll: Any, context: Any):
+        self.coll = coll
+        self._requests = context.Queue()
+        self._replies: Dict[int, Any] = {}
+        self._context = context
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="chroma-writer", daemon=True)
+        self.stats = {"requests": 0, "upserted": 0, "deletes": 0}
+
+    def client(self) -> CollectionProxy:
+        """A proxy for one worker process; create it before the process starts."""
+        client_id = len(self._replies)
+        self._replies[client_id] = self._context.Queue()
+        return CollectionProxy(client_id, self._requests, self._replies[client_id])
+
+    def start(self) -> "CollectionWriter":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Finish the requests already queued, then stop serving."""
+        self._stop.set()
+        self._thread.join()
+
+    def _handle(self, method: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[bool, Any]:
+        if method not in METHODS:
+            return False, ValueError(f"Unsupported collection method: {method}")
+        try:
+            result = getattr(self.coll, method)(*args, **kwargs)
+        except Exception as e:  # noqa: BLE001 - re-raised in the calling worker
+            logger.exception(f"Chroma {method} failed")
+            try:
+                pickle.dumps(e)
+            except Exception:  # noqa: BLE001 - the queue could not carry it
+                e = RuntimeError(f"Chroma {method} failed: {e!r}")
+            return False, e
+        self.stats["requests"] += 1
+        if method == "upsert":
+            self.stats["upserted"] += len(kwargs.get("ids") or (args[0] if args else ()))
+        elif method == "delete":
+            self.stats["deletes"] += 1
+        return True, result
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                client_id, method, args, kwargs = self._requests.get(timeout=0.2)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            self._replies[client_id].put(self._handle(method, args, kwargs))
@@ -1,12 +1,13 @@
 import argparse
+import copy
 import importlib.util
 import logging
+import multiprocessing
 import os
-import re
 import sys
-import time
-from datetime import datetime
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
 
 # --- Imports Check (Leave as is) ---
 REQUIRED_MODULES = {
@@ -36,15 +37,32 @@ if missing:
 # --- End Imports Check ---
 
 import yaml
-import requests
-from tqdm import tqdm
 
-from harvest.oai_pmh import harvest_records
-from parse.pdf import extract_pdf_text
-from parse.html import extract_html_text
-from index.chunk import chunk_text
-from index.embed import embed_texts
-from index.store import get_collection
+from fetch.cache import FileCache
+from fetch.download import DownloadPool
+
+from harvest.oai_pmh import iter_records
+from harvest.records import RecordStore
+from harvest.state import HarvestState, IngestCheckpoint
+from parse.cache import ParsedTextCache, file_sha256
+from parse.pool import ParsePool
+from index.chunk import tiktoken_length
+from index.cache import EmbeddingCache
+from index.dedup import NearDuplicateIndex
+from index.documents import record_chunks, record_id, text_sources
+from index.embed import EMBED_CACHE_MB, EmbeddingExecutor
+from index.store import (
+    COLLECTION,
+    COLLECTION_KEEP,
+    begin_generation,
+    bump_collection_version,
+    delete_record_chunks,
+    get_collection,
+    promote_generation,
+    stored_chunk_hashes,
+)
+from index.writer import CollectionProxy, CollectionWriter
+from pipeline import Pipeline, Stage
 
 
 logging.basicConfig(
@@ -55,99 +73,323 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Prefix for printed summary lines; set to the source name in --all-sources worker processes.
+PRINT_PREFIX = ""
+
+
 def log_and_print(message: str, *args):
     text = message % args if args else message
     logger.info(text)
-    print(text)
+    print(f"{PRINT_PREFIX}{text}")
 
 DATA_DIR = Path(os.environ.get("DATA_DIR", "/data"))  # when in docker
 RAW_DIR = DATA_DIR / "raw"
 PARSED_DIR = DATA_DIR / "parsed"
-BATCH_SIZE = 32 # Define a batch size for upserts
-
-def safe_filename(s: str) -> str:
-    s = re.sub(r"[^a-zA-Z0-9._-]+", "_", s).strip("_")
-    return s[:180] if s else "item"
-
-def download_file(url: str, out_path: Path, max_mb: int = 80) -> bool:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with requests.get(url, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        total = 0
-        with open(out_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 256):
-                if not chunk:
-                    continue
-                total += len(chunk)
-                if total > max_mb * 1024 * 1024:
-                    log_and_print(f"File download exceeded max size of {max_mb}MB. Stopping download.")
-                    return False
-                f.write(chunk)
-    return True
-
-def try_get_zenodo_files(record_landing_url: str):
-    """
-    Zenodo OAI records often include an identifier/landing page URL.
-    This helper scrapes the landing page for downloadable file links (best-effort).
-    """
+STATE_DIR = DATA_DIR / "state"
+EMBED_CACHE_PATH = DATA_DIR / "embeddings.sqlite3"
+DEDUP_PATH = DATA_DIR / "dedup.sqlite3"
+RECORDS_PATH = DATA_DIR / "records.sqlite3"
+WRITE_BATCH = 128  # chunks per Chroma upsert; embedding request sizes adapt separately
+# Options a source may override in its `concurrency:` block of sources.yaml.
+CONCURRENCY_KEYS = ("harvest_workers", "windows", "download_workers", "per_host", "parse_workers", "embed_workers")
+PROGRESS_LINES = 6  # progress bars per pipeline: harvest plus five stages
+
+
+@dataclass
+class ChunkBatch:
+    """Chunks on their way to the embed and write stages."""
+
+    ids: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    embeddings: Optional[List[List[float]]] = None
+    records: Set[int] = field(default_factory=set)  # harvest sequence numbers of the records included
+
+    def add(self, seq: int, doc_id: str, text: str, meta: Dict[str, Any]) -> None:
+        self.records.add(seq)
+        self.ids.append(doc_id)
+        self.texts.append(text)
+        self.metadatas.append(meta)
+
+
+@dataclass
+class Deletion:
+    """Chunks to remove: every chunk of a deleted record, or specific stale chunk ids."""
+
+    record: int
+    oai_identifier: Optional[str] = None
+    ids: List[str] = field(default_factory=list)
+
+
+def stored_path(fp: Path) -> str:
+    """`fp` as recorded in the record store: relative to RAW_DIR when it lies inside it."""
     try:
-        # Increased timeout slightly
-        html = requests.get(record_landing_url, timeout=45).text 
-    except Exception as e:
-        logger.warning(f"Failed to scrape Zenodo landing page {record_landing_url}: {e}")
-        return []
-    # Zenodo file download links often contain `/records/<id>/files/<name>?download=1`
-    links = sorted(set(re.findall(r'https://zenodo\.org/records/\d+/files/[^"\s<>]+', html)))
-    # Add download=1 if missing, to force download
-    fixed = []
-    for u in links:
-        if "download=1" not in u:
-            sep = "&" if "?" in u else "?"
-            fixed.append(u + f"{sep}download=1")
-        else:
-            fixed.append(u)
-    return fixed
+        return str(fp.relative_to(RAW_DIR))
+    except ValueError:
+        return str(fp)
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="sources.yaml")
-    parser.add_argument("--source", required=True, help="sources.yaml name")
-    parser.add_argument("--since", default=None, help="YYYY-MM-DD (optional)")
+    which = parser.add_mutually_exclusive_group(required=True)
+    which.add_argument("--source", help="sources.yaml name")
+    which.add_argument(
+        "--all-sources",
+        action="store_true",
+        help="Ingest every source in the config concurrently, one worker process each, with a single Chroma writer",
+    )
+    parser.add_argument(
+        "--since",
+        default=None,
+        help="YYYY-MM-DD (optional; defaults to the source's stored high-water mark)",
+    )
     parser.add_argument("--until", default=None, help="YYYY-MM-DD (optional)")
     parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument(
+        "--windows",
+        type=int,
+        default=1,
+        help="Split the since..until range into N date windows harvested in parallel",
+    )
+    parser.add_argument("--harvest-workers", type=int, default=4, help="Concurrent harvest windows")
+    parser.add_argument("--download-workers", type=int, default=8, help="Concurrent fulltext downloads")
+    parser.add_argument("--per-host", type=int, default=4, help="Max concurrent requests per file host")
+    parser.add_argument("--parse-workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--parse-timeout", type=float, default=120.0, help="Seconds allowed per file before it is skipped")
+    parser.add_argument("--embed-workers", type=int, default=4, help="Embedding batches kept in flight against Ollama")
+    parser.add_argument("--chunk-size", type=int, default=900, help="Maximum chunk size (see --chunk-unit)")
+    parser.add_argument("--chunk-overlap", type=int, default=150, help="Overlap carried between chunks")
+    parser.add_argument(
+        "--chunk-unit",
+        choices=["chars", "tokens"],
+        default="chars",
+        help="Measure chunk sizes in characters or in tokens (tokens need tiktoken)",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.9,
+        help="Estimated Jaccard similarity at which a chunk counts as a near-duplicate of a stored one (0 disables)",
+    )
+    parser.add_argument(
+        "--trust-cache",
+        action="store_true",
+        help="Reuse previously downloaded files without revalidating them with the server",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last unfinished run for --source (or for every source that has one) from its checkpoint",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the stored high-water mark and harvest the whole --since/--until window",
+    )
+    parser.add_argument(
+        "--new-generation",
+        action="store_true",
+        help="Write into a copy of the live collection and switch the API over to it only when the run succeeds",
+    )
+    parser.add_argument(
+        "--keep-generations",
+        type=int,
+        default=COLLECTION_KEEP,
+        help="With --new-generation: generations of the collection to keep, the new one included",
+    )
     args = parser.parse_args()
 
     with open(args.config, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
 
-    source = next((s for s in cfg["sources"] if s["name"] == args.source), None)
-    if not source:
-        raise SystemExit(f"Source not found: {args.source}")
+    if args.all_sources:
+        sources = cfg["sources"]
+    else:
+        sources = [s for s in cfg["sources"] if s["name"] == args.source][:1]
+        if not sources:
+            raise SystemExit(f"Source not found: {args.source}")
+
+    generation = None
+    if args.new_generation:
+        # Readers keep querying the live generation while this run writes to the new one.
+        generation, coll = begin_generation(copy_current=True, resume=args.resume)
+        log_and_print("Writing to new generation %s of collection %s", generation, COLLECTION)
+    else:
+        coll = get_collection()
+
+    try:
+        if args.all_sources:
+            failed = ingest_all_sources(args, sources, coll)
+        else:
+            ingest_source(source_args(args, sources[0]), sources[0], coll)
+            failed = 0
+    finally:
+        if generation is None:
+            # Written in place (possibly only in part): answers cached by the API are stale now.
+            bump_collection_version()
+
+    if generation is not None:
+        if failed:
+            log_and_print(
+                "Generation %s was not promoted because %s source(s) failed; rerun with --resume --new-generation to finish it.",
+                generation,
+                failed,
+            )
+        else:
+            retired = promote_generation(generation, keep=args.keep_generations)
+            log_and_print(
+                "Collection %s now serves generation %s%s",
+                COLLECTION,
+                generation,
+                f"; dropped {', '.join(retired)}" if retired else "",
+            )
+    if failed:
+        raise SystemExit(failed)
+
+
+def source_args(args: argparse.Namespace, source: Dict[str, Any]) -> argparse.Namespace:
+    """`args` with the source's own `concurrency:` settings from sources.yaml applied on top."""
+    out = copy.copy(args)
+    for key, value in (source.get("concurrency") or {}).items():
+        attr = key.replace("-", "_")
+        if attr not in CONCURRENCY_KEYS:
+            raise SystemExit(f"Unknown concurrency setting {key!r} for source {source['name']!r}")
+        setattr(out, attr, value)
+    return out
+
+
+def ingest_all_sources(args: argparse.Namespace, sources: List[Dict[str, Any]], coll: Any) -> int:
+    """
+    Ingest every source concurrently, one worker process each; returns the number of sources that failed.
+
+    The Chroma collection `coll` is only used in this process: every read
+    and write from the workers goes through one `CollectionWriter`.
+    Downloads, parsing and embedding run in the workers with each source's
+    own limits.
+    """
+    context = multiprocessing.get_context("spawn")
+    writer = CollectionWriter(coll, context).start()
+    processes = []
+    for index, source in enumerate(sources):
+        process = context.Process(
+            target=_source_worker,
+            args=(source_args(args, source), source, writer.client(), index),
+            name=f"ingest-{source['name']}",
+        )
+        process.start()
+        processes.append((source, process))
+    log_and_print("Ingesting %s sources in parallel: %s", len(sources), ", ".join(s["name"] for s, _ in processes))
+    try:
+        for _, process in processes:
+            process.join()
+    finally:
+        writer.stop()
+
+    failed = [source["name"] for source, process in processes if process.exitcode != 0]
+    log_and_print(
+        "Chroma writer: %s requests, %s chunks upserted, %s delete calls",
+        writer.stats["requests"],
+        writer.stats["upserted"],
+        writer.stats["deletes"],
+    )
+    for source, process in processes:
+        log_and_print("Source %s: %s", source["name"], "ok" if process.exitcode == 0 else f"failed (exit code {process.exitcode})")
+    return len(failed)
+
+
+def _source_worker(args: argparse.Namespace, source: Dict[str, Any], coll: CollectionProxy, index: int) -> None:
+    global PRINT_PREFIX
+    # Tag this process's output with its source.
+    PRINT_PREFIX = f"[{source['name']}] "
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(
+            logging.Formatter(f"%(asctime)s %(levelname)s [{source['name']}] %(message)s", "%Y-%m-%d %H:%M:%S")
+        )
+    try:
+        ingest_source(args, source, coll, label=source["name"], position=index * PROGRESS_LINES)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            logger.error(f"{e.code}")
+        raise
+
+
+def ingest_source(
+    args: argparse.Namespace,
+    source: Dict[str, Any],
+    coll: Any,
+    label: Optional[str] = None,
+    position: int = 0,
+) -> None:
+    """Harvest one source and write its chunks to `coll` (a Chroma collection or a `CollectionProxy`)."""
+    length_function = None
+    if args.chunk_unit == "tokens":
+        try:
+            length_function = tiktoken_length()
+        except ImportError as e:
+            raise SystemExit(str(e))
 
     RAW_DIR.mkdir(parents=True, exist_ok=True)
     PARSED_DIR.mkdir(parents=True, exist_ok=True)
 
-    coll = get_collection()
+    state = HarvestState(STATE_DIR)
+
+    # Progress is checkpointed as records are committed to Chroma, so a run that dies can be resumed.
+    checkpoint = IngestCheckpoint(STATE_DIR, source, run={})
+    saved = checkpoint.load()
+    if args.resume and saved is None and args.all_sources:
+        log_and_print("No checkpoint to resume for source=%s; starting a normal run.", source["name"])
+    elif args.resume:
+        if saved is None:
+            raise SystemExit(f"No checkpoint to resume for source={source['name']}; start a normal run instead.")
+        checkpoint.restore(saved)
+        # The listing must match the interrupted run's, so its arguments win over the command line.
+        args.since, args.until, args.limit, args.windows = (
+            saved["run"][k] for k in ("since", "until", "limit", "windows")
+        )
+        args.full = True  # `since` is already resolved
+        log_and_print(
+            "Resuming interrupted run: %s records committed, continuing after resumption token %s",
+            checkpoint.watermark + len(saved.get("ahead", [])),
+            (saved.get("position") or {}).get("token") or "-",
+        )
+    elif saved is not None:
+        log_and_print("Discarding the checkpoint of an unfinished run (pass --resume to continue it instead).")
 
     since = args.since
     until = args.until
+    if since is None and not args.full:
+        # Incremental run: only ask for records changed since the last completed harvest.
+        since = state.high_water_mark(source)
+        if since:
+            log_and_print("Resuming incremental harvest from high-water mark %s", since)
+
+    if args.windows > 1 and not since:
+        raise SystemExit("--windows needs a start date: pass --since or run once to record a high-water mark.")
 
     log_and_print(
-        "Starting harvest for source=%s since=%s until=%s limit=%s",
-        args.source,
+        "Starting harvest for source=%s since=%s until=%s limit=%s windows=%s",
+        source["name"],
         since,
         until,
         args.limit,
+        args.windows,
     )
 
-    records = harvest_records(
+    checkpoint.run = {"since": since, "until": until, "limit": args.limit, "windows": args.windows}
+
+    # Stream records page by page so downloading/embedding starts while Sickle
+    # keeps following the resumption token.
+    records = iter_records(
         base_url=source["endpoint"],
         metadata_prefix=source.get("metadata_prefix", "oai_dc"),
         set_spec=source.get("set"),
         since=since,
         until=until,
         limit=args.limit,
+        windows=args.windows,
+        workers=args.harvest_workers,
+        resume=checkpoint.position,
     )
 
     fulltext_cfg = source.get("fulltext", {}) or {}
@@ -155,127 +397,168 @@ def main():
     allowed_domains = set(fulltext_cfg.get("allowed_domains", []))
     max_mb = int(fulltext_cfg.get("max_mb", 80))
 
-    log_and_print("Harvested %s records. Fulltext enabled: %s", len(records), fulltext_enabled)
-    
-    # --- Batching Structures ---
-    texts_to_embed = []
-    metadatas_to_upsert = []
-    ids_to_upsert = []
-    # --- End Batching Structures ---
-
-    total_chunks_ingested = 0
+    log_and_print("Streaming records. Fulltext enabled: %s", fulltext_enabled)
+
+    counts = {"records": 0, "deleted_records": 0, "chunks_written": 0}
+    chunk_stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "duplicates": 0, "promoted": 0}
+    pending = ChunkBatch()
+
+    # Vectors for text embedded before (by any record, in any run) come from the local cache.
+    embed_cache = EmbeddingCache(EMBED_CACHE_PATH, max_bytes=EMBED_CACHE_MB * 1024 * 1024)
+    # Cache misses are re-batched across records; batch sizes follow Ollama's observed latency.
+    embedder = EmbeddingExecutor(workers=args.embed_workers, cache=embed_cache)
+    dedup = NearDuplicateIndex(DEDUP_PATH, threshold=args.dedup_threshold) if args.dedup_threshold > 0 else None
+    # Normalized records and their files are kept locally so `reindex.py` can rebuild without harvesting.
+    record_store = RecordStore(RECORDS_PATH)
+
+    # Files are stored once by content hash under RAW_DIR/objects; repeat URLs become conditional requests.
+    file_cache = FileCache(RAW_DIR, revalidate=not args.trust_cache)
+    pool = DownloadPool(
+        RAW_DIR,
+        workers=args.download_workers,
+        per_host=args.per_host,
+        max_mb=max_mb,
+        allowed_domains=allowed_domains,
+        progress=False,  # the pipeline shows download progress
+        cache=file_cache,
+    )
 
-    for idx, rec in enumerate(tqdm(records, desc="Ingesting"), start=1):
-        rec_id = rec.get("id") or rec.get("identifier") or rec.get("oai_identifier")
+    # Extracted text is cached in PARSED_DIR by file hash, so re-runs skip re-parsing unchanged files.
+    parsed_cache = ParsedTextCache(PARSED_DIR)
+    parse_pool = ParsePool(workers=args.parse_workers, timeout=args.parse_timeout, cache=parsed_cache)
+
+    # --- Pipeline stages: harvest -> download -> parse -> chunk -> embed -> write ---
+    # Every stage runs in its own threads with a bounded queue in front of it, so Ollama embeds
+    # one batch while the next records download and parse.
+
+    def harvested():
+        # Number records in harvest order; after --resume, skip those the crashed run committed.
+        for rec in records:
+            seq = records.count
+            if checkpoint.begin(seq, records.position, rec.get("datestamp")):
+                yield seq, rec
+
+    def download(item):
+        seq, rec = item
+        rec_id = record_id(rec)
+        if not fulltext_enabled or rec.get("deleted") or not rec_id:
+            return [(seq, rec, [])]
+        landing = rec.get("url") or rec.get("landing_url")
+        return [(seq, rec, pool.submit_record(rec_id, landing, file_urls=rec.get("files")).result())]
+
+    def parse(item):
+        seq, rec, files = item
+        return [(seq, rec, [(fp, parse_pool.parse(fp)) for fp in files])]
+
+    def chunk(item):
+        seq = item[0]
+        yield from chunk_record(*item)
+        # Every write the record needs is queued; it commits once they have all landed.
+        checkpoint.finish(seq)
+
+    def queue_chunk(seq, doc_id, text, meta):
+        # Add a chunk to `pending`, handing the batch to the embed stage once it is full.
+        nonlocal pending
+        if seq not in pending.records:
+            checkpoint.hold(seq)
+        pending.add(seq, doc_id, text, meta)
+        if len(pending.ids) >= WRITE_BATCH:
+            yield pending
+            pending = ChunkBatch()
+
+    def queue_promoted(seq):
+        # Near-duplicates whose canonical chunk was just removed or rewritten were never stored
+        # themselves; the ones that no longer match any stored chunk are embedded and written now.
+        for doc_id, text, meta in dedup.pop_promoted() if dedup is not None else []:
+            chunk_stats["promoted"] += 1
+            yield from queue_chunk(seq, doc_id, text, meta)
+
+    def chunk_record(seq, rec, parsed_files):
+        # Single worker: owns `pending`, `counts` and `chunk_stats`.
+        counts["records"] += 1
+        idx = seq
+        if rec.get("deleted"):
+            if rec.get("oai_identifier"):
+                counts["deleted_records"] += 1
+                logger.info("[%s/%s] Removing chunks of deleted record %s", idx, args.limit, rec["oai_identifier"])
+                if dedup is not None:
+                    dedup.remove_record(rec["oai_identifier"])
+                record_store.remove(rec["oai_identifier"])
+                checkpoint.hold(seq)
+                yield Deletion(record=seq, oai_identifier=rec["oai_identifier"])
+                yield from queue_promoted(seq)
+            return
+
+        rec_id = record_id(rec)
         if not rec_id:
-             logger.warning(f"Record {idx} skipped: No valid ID found.")
-             continue
-             
+            logger.warning(f"Record {idx} skipped: No valid ID found.")
+            return
+
         title = rec.get("title") or "Untitled"
         landing = rec.get("url") or rec.get("landing_url")
 
         logger.info(
-            "[%s/%s] Ingesting record id=%s title=%r url=%s", idx, len(records), rec_id, title, landing
+            "[%s/%s] Ingesting record id=%s title=%r url=%s", idx, args.limit, rec_id, title, landing
+        )
+        record_store.put(
+            source["name"],
+            rec,
+            [{"path": stored_path(fp), "sha256": file_sha256(fp)} for fp, _ in parsed_files if fp.exists()],
         )
 
-        # Collect text sources: description + maybe fulltext
-        texts = []
-        meta_text = "\n".join(
-            x for x in [
-                f"Title: {title}",
-                f"Creators: {rec.get('creators','')}",
-                f"Subjects: {rec.get('subjects','')}",
-                f"Description: {rec.get('description','')}",
-                f"Published: {rec.get('date','')}",
-                f"URL: {landing or ''}",
-            ] if x
-        ).strip()
-        if meta_text:
-            texts.append(("metadata", meta_text))
-
-        downloaded_files = []
-        if fulltext_enabled and landing and any(landing.startswith(f"https://{d}") for d in allowed_domains):
-            for file_url in try_get_zenodo_files(landing):
-                fname = safe_filename(file_url.split("/")[-1].split("?")[0])
-                # Ensure the file path is unique and uses a safe ID
-                out_path = RAW_DIR / safe_filename(rec_id) / fname 
-                try:
-                    ok = download_file(file_url, out_path, max_mb=max_mb)
-                    if ok:
-                        downloaded_files.append(out_path)
-                    else:
-                        logger.warning(f"Download failed or was too large for {file_url}")
-                except Exception as e:
-                    logger.error(f"Error downloading file {file_url}: {e}")
-                    continue
-
+        # Collect text sources as (label, pages, paged): description + maybe fulltext.
+        texts = text_sources(rec, parsed_files)
         logger.info(
-            "[%s/%s] Text sources before parsing: metadata=%s downloaded_files=%s",
+            "[%s/%s] Text sources: %s of %s downloaded file(s) had enough text to index",
             idx,
-            len(records),
-            bool(meta_text),
-            len(downloaded_files),
+            args.limit,
+            sum(1 for label, _, _ in texts if label != "metadata"),
+            len(parsed_files),
         )
 
-        # Parse downloaded files
-        for fp in downloaded_files:
-            try:
-                if fp.suffix.lower() == ".pdf":
-                    text = extract_pdf_text(fp)
-                elif fp.suffix.lower() in (".html", ".htm"):
-                    text = extract_html_text(fp.read_text(encoding="utf-8", errors="ignore"))
-                else:
-                    # best-effort plain text
-                    text = fp.read_text(encoding="utf-8", errors="ignore")
-                if text and len(text.strip()) > 200:
-                    texts.append((fp.name, text))
-            except Exception as e:
-                logger.error(f"Error parsing file {fp}: {e}")
+        # Chunk + queue for embedding. Each chunk's content hash is compared with what Chroma already
+        # holds for the record: unchanged chunks are neither embedded nor written, and chunks no longer
+        # produced are deleted.
+        candidates = record_chunks(rec, texts, args.chunk_size, args.chunk_overlap, length_function)
+
+        # Near-duplicates of an indexed chunk (typically another version of the same record) are
+        # recorded against that canonical chunk instead of being embedded and stored again.
+        duplicates = {}
+        if dedup is not None:
+            duplicates = dedup.update_record(rec.get("oai_identifier") or rec_id, candidates)
+            chunk_stats["duplicates"] += len(duplicates)
+            yield from queue_promoted(seq)
+
+        stored = stored_chunk_hashes(coll, rec_id)
+        produced = set()
+        queued = 0
+        for doc_id, text, meta in candidates:
+            if doc_id in duplicates:
+                continue
+            produced.add(doc_id)
+            if doc_id not in stored:
+                chunk_stats["added"] += 1
+            elif stored[doc_id] != meta["content_hash"]:
+                chunk_stats["updated"] += 1
+            else:
+                chunk_stats["unchanged"] += 1
                 continue
 
-        # Chunk + queue for embedding
-        record_chunks = 0
-        for label, t in texts:
-            for i, chunk in enumerate(chunk_text(t)):
-                doc_id = f"{rec_id}:{label}:{i}"
-                meta = {
-                    "record_id": rec_id,
-                    "title": title,
-                    "label": label,
-                    "url": landing or "",
-                    "chunk": i,
-                }
-                
-                texts_to_embed.append(chunk)
-                metadatas_to_upsert.append(meta)
-                ids_to_upsert.append(doc_id)
-                record_chunks += 1
-                total_chunks_ingested += 1
-
-                # If batch is full, process it
-                if len(texts_to_embed) >= BATCH_SIZE:
-                    log_and_print("Embedding and upserting batch of %s chunks...", len(texts_to_embed))
-                    embeddings = embed_texts(texts_to_embed)
-                    # NOTE: Chroma upsert is outside the tqdm loop to prevent locking the terminal
-                    coll.upsert(
-                        ids=ids_to_upsert,
-                        documents=texts_to_embed,
-                        embeddings=embeddings,
-                        metadatas=metadatas_to_upsert,
-                    )
-                    # Reset batches
-                    texts_to_embed = []
-                    metadatas_to_upsert = []
-                    ids_to_upsert = []
-                    log_and_print("Batch upsert complete.")
+            yield from queue_chunk(seq, doc_id, text, meta)
+            queued += 1
 
+        orphaned = [doc_id for doc_id in stored if doc_id not in produced]
+        if orphaned:
+            chunk_stats["deleted"] += len(orphaned)
+            checkpoint.hold(seq)
+            yield Deletion(record=seq, ids=orphaned)
 
         if texts:
             logger.info(
-                "[%s/%s] Queued %s chunks from %s text source(s) for record id=%s",
+                "[%s/%s] Queued %s new or changed chunks from %s text source(s) for record id=%s",
                 idx,
-                len(records),
-                record_chunks,
+                args.limit,
+                queued,
                 len(texts),
                 rec_id,
             )
@@ -283,24 +566,156 @@ def main():
             logger.info(
                 "[%s/%s] No text extracted for record id=%s title=%r; skipped embedding",
                 idx,
-                len(records),
+                args.limit,
                 rec_id,
                 title,
             )
-    
-    # Process remaining batch (if any)
-    if texts_to_embed:
-        log_and_print("Processing final batch of %s chunks...", len(texts_to_embed))
-        embeddings = embed_texts(texts_to_embed)
+
+    def flush_chunks():
+        # Process remaining batch (if any)
+        return [pending] if pending.ids else None
+
+    def embed(item):
+        if isinstance(item, ChunkBatch):
+            item.embeddings = embedder.embed(item.texts)
+        return [item]
+
+    def write(item):
+        if isinstance(item, Deletion):
+            if item.oai_identifier:
+                delete_record_chunks(coll, item.oai_identifier)
+            if item.ids:
+                coll.delete(ids=item.ids)
+            checkpoint.release(item.record)
+            return None
         coll.upsert(
-            ids=ids_to_upsert,
-            documents=texts_to_embed,
-            embeddings=embeddings,
-            metadatas=metadatas_to_upsert,
+            ids=item.ids,
+            documents=item.texts,
+            embeddings=item.embeddings,
+            metadatas=item.metadatas,
+        )
+        counts["chunks_written"] += len(item.ids)
+        for seq in item.records:
+            checkpoint.release(seq)
+        return None
+
+    pipeline = Pipeline(
+        harvested(),
+        [
+            Stage("download", download, workers=args.download_workers),
+            Stage("parse", parse, workers=parse_pool.workers),
+            Stage("chunk", chunk, workers=1, on_close=flush_chunks),
+            Stage("embed", embed, workers=args.embed_workers),
+            Stage("write", write, workers=1),
+        ],
+        source_name="harvest",
+        status=lambda: f"resumption_token={records.resumption_token or '-'}",
+        label=label,
+        position=position,
+    )
+    try:
+        pipeline.run()
+    except BaseException:
+        checkpoint.save()
+        log_and_print(
+            "Ingest stopped with %s records committed; run again with --resume to continue from %s",
+            checkpoint.watermark,
+            checkpoint.path,
         )
-        log_and_print("Final batch upsert complete.")
+        raise
+    finally:
+        pool.close()
+        parse_pool.close()
+        file_cache.close()
+        embedder.close()
+        embed_cache.close()
+        if dedup is not None:
+            dedup.close()
+        record_store.close()
+
+    checkpoint.clear()
+
+    for line in pipeline.summary():
+        log_and_print("Stage %s", line)
+    log_and_print(
+        "Fulltext downloads: %s files (%.1f MB), %s failed, %s too large, %s rejected by allowed_domains",
+        pool.stats["files"],
+        pool.stats["bytes"] / 1e6,
+        pool.stats["failed"],
+        pool.stats["too_large"],
+        pool.stats["rejected"],
+    )
+    log_and_print(
+        "Parsing: %s files parsed, %s loaded from the parsed-text cache, %s failed, %s timed out",
+        parse_pool.stats["parsed"],
+        parsed_cache.stats["hits"],
+        parse_pool.stats["failed"],
+        parse_pool.stats["timed_out"],
+    )
+    log_and_print(
+        "File URLs: %s records resolved from metadata, %s landing pages scraped as a fallback",
+        pool.stats["from_metadata"],
+        pool.stats["scraped"],
+    )
+    log_and_print(
+        "File cache: %s downloaded, %s not modified (304), %s reused without a request, %s duplicate bodies",
+        file_cache.stats["downloaded"],
+        file_cache.stats["not_modified"],
+        file_cache.stats["reused"],
+        file_cache.stats["deduplicated"],
+    )
+    log_and_print(
+        "Embedding: %s texts in %s requests (%.1f per request, batch size now %s), %s failed requests, %s split, %s retried",
+        embedder.stats["texts"],
+        embedder.stats["batches"],
+        embedder.stats["texts"] / max(1, embedder.stats["batches"]),
+        embedder.batch_size,
+        embedder.stats["failed"],
+        embedder.stats["split"],
+        embedder.stats["retried"],
+    )
+    log_and_print(
+        "Embedding cache: %s hits, %s misses, %s vectors evicted",
+        embed_cache.stats["hits"],
+        embed_cache.stats["misses"],
+        embed_cache.stats["evicted"],
+    )
 
-    log_and_print("Total chunks ingested: %s. Chroma count should reflect this number.", total_chunks_ingested)
+    log_and_print("Harvested %s records (%s deleted upstream).", records.count, counts["deleted_records"])
+    log_and_print(
+        "Chunks: %s added, %s updated, %s unchanged (skipped), %s deleted as stale",
+        chunk_stats["added"],
+        chunk_stats["updated"],
+        chunk_stats["unchanged"],
+        chunk_stats["deleted"],
+    )
+    if dedup is not None:
+        produced = sum(chunk_stats[k] for k in ("added", "updated", "unchanged", "duplicates"))
+        log_and_print(
+            "Near-duplicates: %s chunks referenced a canonical chunk instead of being stored (dedup ratio %.1f%%, threshold %.2f)",
+            chunk_stats["duplicates"],
+            100 * chunk_stats["duplicates"] / max(1, produced),
+            args.dedup_threshold,
+        )
+        if chunk_stats["promoted"]:
+            log_and_print(
+                "Near-duplicates: %s chunks stored in place of a removed or rewritten canonical chunk",
+                chunk_stats["promoted"],
+            )
+    # A resumed run also covers the records committed before the crash.
+    latest = max(filter(None, [records.latest_datestamp, checkpoint.latest_datestamp]), default=None)
+    if records.exhausted and latest:
+        state.save_high_water_mark(source, latest)
+        log_and_print("Saved high-water mark %s for source=%s", latest, source["name"])
+    elif not records.exhausted:
+        log_and_print(
+            "Harvest stopped at --limit=%s before the end of the list; high-water mark not advanced.",
+            args.limit,
+        )
+    log_and_print(
+        "Total chunks written: %s (unchanged chunks already in Chroma were left as they were).",
+        counts["chunks_written"],
+    )
     log_and_print("Done. You can now query the LangChain RAG endpoint at http://localhost:8000/rag")
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+# Bump whenever extraction output changes (parser upgrade, new cleanup rules) so
+# text cached by the old code is not reused.
+PARSER_VERSION = 3
+
+# Pages are stored as one text with form feeds between them, as pdftotext does.
+PAGE_BREAK = "\f"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parser_kind(path: Path) -> str:
+    """Which extractor handles `path`; the same bytes parse differently as PDF, HTML or text."""
+    suffix = path.suffix.lower()
+    if suffix == ".pdf":
+        return "pdf"
+    if suffix in (".html", ".htm"):
+        return "html"
+    return "text"
+
+
+class ParsedTextCache:
+    """
+    Extracted pages stored under `root`, keyed by source file content and parser version.
+
+    Entries live at `v<PARSER_VERSION>/<sha[:2]>/<sha>.<kind>.txt.gz`, so
+    renamed or re-downloaded files with the same bytes hit the cache, and
+    bumping `PARSER_VERSION` starts a fresh namespace. Writes go through a
+    temp file and a rename, so an interrupted run never leaves a truncated
+    entry behind.
+    """
+
+    def __init__(self, root: Path, version: int = PARSER_VERSION):
+        self.root = Path(root) / f"v{version}"
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "stored": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def key(self, path: Path) -> str:
+        return f"{file_sha256(path)}.{parser_kind(path)}"
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.txt.gz"
+
+    def get(self, key: str) -> Optional[List[str]]:
+        try:
+            data = self._entry_path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+        self._count("hits")
+        return gzip.decompress(data).decode("utf-8").split(PAGE_BREAK)
+
+    def put(self, key: str, pages: List[str]) -> None:
+        text = PAGE_BREAK.join(page.replace(PAGE_BREAK, "\n") for page in pages)
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name: two workers may store the same content concurrently.
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(gzip.compress(text.encode("utf-8"), compresslevel=6))
+        os.replace(tmp, path)
+        self._count("stored")
@@ -1,13 +1,91 @@
 \
-from bs4 import BeautifulSoup
+from __future__ import annotations
+
+from typing import Dict, List
+
+from lxml import etree
+
+# Elements whose whole subtree is page chrome or code rather than content.
+SKIP_TAGS = frozenset(
+    {
+        "head", "script", "style", "noscript", "template", "svg", "math", "iframe", "object",
+        "nav", "aside", "form", "button", "select", "textarea", "dialog",
+    }
+)
+SKIP_ROLES = frozenset({"navigation", "banner", "contentinfo", "search", "complementary"})
+# Site banner and footer, unless inside the content (an article's header carries its title and byline).
+PAGE_CHROME_TAGS = frozenset({"header", "footer"})
+CONTENT_TAGS = frozenset({"article", "main"})
+
+# Elements that start a new line: headings, paragraphs and other block containers.
+BLOCK_TAGS = frozenset(
+    {
+        "address", "article", "blockquote", "br", "caption", "dd", "details", "div", "dl", "dt",
+        "figcaption", "figure", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "main", "ol",
+        "p", "pre", "section", "summary", "table", "td", "th", "tr", "ul",
+    }
+)
+
+
+class _TextCollector:
+    """lxml parser target: keeps text outside skipped subtrees, one line per block."""
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self._parts: List[str] = []
+        self._skip = 0
+        self._content = 0  # open article/main elements
+
+    def _flush(self) -> None:
+        line = " ".join("".join(self._parts).split())
+        if line:
+            self.lines.append(line)
+        self._parts = []
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        if self._skip:
+            self._skip += 1
+        elif (
+            tag in SKIP_TAGS
+            or (tag in PAGE_CHROME_TAGS and not self._content)
+            or attrib.get("role") in SKIP_ROLES
+            or "hidden" in attrib
+        ):
+            self._flush()
+            self._skip = 1
+        else:
+            if tag in CONTENT_TAGS:
+                self._content += 1
+            if tag in BLOCK_TAGS or tag in PAGE_CHROME_TAGS:
+                self._flush()
+
+    def end(self, tag: str) -> None:
+        if self._skip:
+            self._skip -= 1
+            return
+        if tag in CONTENT_TAGS:
+            self._content -= 1
+        if tag in BLOCK_TAGS or tag in PAGE_CHROME_TAGS:
+            self._flush()
+
+    def data(self, text: str) -> None:
+        if not self._skip:
+            self._parts.append(text)
+
+    def close(self) -> str:
+        self._flush()
+        return "\n".join(self.lines)
+
 
 def extract_html_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    # remove scripts/styles
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    text = soup.get_text("\n")
-    # normalize whitespace
-    lines = [ln.strip() for ln in text.splitlines()]
-    lines = [ln for ln in lines if ln]
-    return "\n".join(lines)
+    """Readable text of an HTML page, one heading or paragraph per line.
+
+    lxml's HTML parser streams events into a collector, so no tree is built.
+    Scripts, styles, navigation, forms and the page's own header and footer
+    are dropped; inline markup (links, emphasis) stays within its paragraph.
+    """
+    if not html.strip():
+        return ""
+    parser = etree.HTMLParser(target=_TextCollector(), remove_comments=True, remove_pis=True)
+    parser.feed(html)
+    return parser.close()
@@ -1,13 +1,24 @@
 \
 from pathlib import Path
+from typing import List, Optional
 from pypdf import PdfReader
 
 def extract_pdf_text(path: Path) -> str:
+    return "\n".join(extract_pdf_pages(path))
+
+def pdf_page_count(path: Path) -> int:
+    return len(PdfReader(str(path)).pages)
+
+def extract_pdf_pages(path: Path, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """Text of pages `start..stop` as a list, one entry per page (all pages by default).
+
+    Unreadable pages yield an empty string, keeping page numbers aligned.
+    """
     reader = PdfReader(str(path))
-    parts = []
-    for page in reader.pages:
+    pages = []
+    for page in reader.pages[start:stop]:
         try:
-            parts.append(page.extract_text() or "")
+            pages.append(page.extract_text() or "")
         except Exception:
-            continue
-    return "\n".join(parts)
+            pages.append("")
+    return pages
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple
+
+from .cache import ParsedTextCache, parser_kind
+from .html import extract_html_text
+from .pdf import extract_pdf_pages, pdf_page_count
+
+logger = logging.getLogger(__name__)
+
+
+def extract_file_pages(path: Path) -> List[str]:
+    """Extract text from a downloaded file as a list of pages, picking the parser from its suffix.
+
+    PDFs yield one entry per page; other formats have no pages and yield one entry.
+    """
+    kind = parser_kind(path)
+    if kind == "pdf":
+        return extract_pdf_pages(path)
+    if kind == "html":
+        return [extract_html_text(path.read_text(encoding="utf-8", errors="ignore"))]
+    # best-effort plain text
+    return [path.read_text(encoding="utf-8", errors="ignore")]
+
+
+class ParseTimeout(Exception):
+    pass
+
+
+class ParsePool:
+    """
+    Parse downloaded files in worker processes with a per-file wall-clock timeout.
+
+    pypdf and HTML extraction are CPU-bound, so they run in a
+    `ProcessPoolExecutor` sized to the machine's cores. PDFs with more than
+    `pages_per_task` pages are split into page ranges parsed by different
+    workers and returned in order, one string per page. A file whose tasks run longer than `timeout`
+    seconds is abandoned: the pool's processes are terminated and replaced so
+    the stuck worker cannot hold a core, and the file is counted in
+    `stats["timed_out"]`. Other files caught in the restart are retried once.
+    Failures never raise; `parse` returns None and counts them instead.
+    With a `ParsedTextCache`, files parsed before (same bytes, same parser
+    version) are served from the cache without touching the workers.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        timeout: float = 120.0,
+        pages_per_task: int = 64,
+        cache: Optional[ParsedTextCache] = None,
+    ):
+        self.cache = cache
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.timeout = timeout
+        self.pages_per_task = max(1, pages_per_task)
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+        self.stats = {"parsed": 0, "failed": 0, "timed_out": 0, "retried": 0}
+
+    def __enter__(self) -> "ParsePool":
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: workers start lazily and on restarts, while download,
+        # pipeline and embed threads are running and may hold locks a fork would copy.
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _recycle(self, broken: ProcessPoolExecutor) -> None:
+        """Kill the processes of `broken` (possibly stuck in a parser) and start a fresh pool."""
+        with self._lock:
+            if self._executor is not broken:
+                return  # another thread already replaced it
+            # ProcessPoolExecutor has no public way to stop a running task.
+            for proc in list((getattr(broken, "_processes", None) or {}).values()):
+                proc.terminate()
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+
+    def _run_tasks(self, calls: List[Tuple[Callable[..., Any], tuple]], budget: float) -> Tuple[List[Any], float]:
+        """
+        Run `calls` on the process pool within `budget` seconds; returns (results, seconds used).
+
+        The clock starts once one of the tasks is actually running, so time
+        spent queued behind other files does not count against this one.
+        """
+        executor = self._executor
+        try:
+            futures = [executor.submit(fn, *args) for fn, args in calls]
+        except RuntimeError as e:  # pool was shut down by a concurrent restart
+            raise BrokenProcessPool(str(e)) from e
+        started: Optional[float] = None
+        pending = set(futures)
+        while pending:
+            if started is None and any(f.running() or f.done() for f in futures):
+                started = time.monotonic()
+            remaining = 0.2 if started is None else budget - (time.monotonic() - started)
+            if remaining <= 0:
+                for f in pending:
+                    f.cancel()
+                self._recycle(executor)
+                raise ParseTimeout()
+            _done, pending = wait(pending, timeout=min(remaining, 0.5), return_when=FIRST_COMPLETED)
+        used = time.monotonic() - started if started is not None else 0.0
+        return [f.result() for f in futures], used
+
+    def _parse_once(self, path: Path) -> List[str]:
+        if parser_kind(path) != "pdf":
+            return self._run_tasks([(extract_file_pages, (path,))], self.timeout)[0][0]
+        counted, used = self._run_tasks([(pdf_page_count, (path,))], self.timeout)
+        step = self.pages_per_task
+        ranges = [(start, min(start + step, counted[0])) for start in range(0, counted[0], step)]
+        parts, _ = self._run_tasks([(extract_pdf_pages, (path, lo, hi)) for lo, hi in ranges], self.timeout - used)
+        return [page for part in parts for page in part]
+
+    def parse(self, path: Path) -> Optional[List[str]]:
+        """Pages of text extracted from `path`, or None if parsing failed or timed out (blocking).
+
+        The whole file's pages come back at once: they are built in worker
+        processes and returned as lists, so a document is held in memory in full.
+        """
+        key: Optional[str] = None
+        if self.cache is not None:
+            try:
+                key = self.cache.key(path)
+                cached = self.cache.get(key)
+            except OSError as e:
+                logger.warning(f"Parsed-text cache unavailable for {path}: {e}")
+                key = cached = None
+            if cached is not None:
+                return cached
+        for attempt in (1, 2):
+            try:
+                pages = self._parse_once(path)
+            except ParseTimeout:
+                logger.error(f"Parsing {path} exceeded {self.timeout:.0f}s; skipped")
+                self._count("timed_out")
+                return None
+            except BrokenProcessPool:
+                # Our tasks were caught in a restart triggered by another file's timeout.
+                if attempt == 1:
+                    self._count("retried")
+                    continue
+                logger.error(f"Error parsing file {path}: worker pool broke twice")
+                self._count("failed")
+                return None
+            except Exception as e:
+                logger.error(f"Error parsing file {path}: {e}")
+                self._count("failed")
+                return None
+            self._count("parsed")
+            if key is not None:
+                try:
+                    self.cache.put(key, pages)
+                except OSError as e:
+                    logger.warning(f"Could not cache parsed text for {path}: {e}")
+            return pages
+        return None
+
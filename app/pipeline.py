@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional
+
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a `Pipeline`: `workers` threads applying `fn` to items from a bounded queue.
+
+    `fn(item)` returns an iterable of items for the next stage (or None for
+    none), so a stage can filter, pass through, or fan out. `on_close()` runs
+    once after the last input item has been handled and may return items of
+    its own, e.g. a partly filled batch. `queue_size` bounds the queue feeding
+    this stage; when it is full the stage before blocks, which keeps a slow
+    stage from letting work pile up in memory.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Optional[Iterable[Any]]],
+        workers: int = 1,
+        queue_size: Optional[int] = None,
+        on_close: Optional[Callable[[], Optional[Iterable[Any]]]] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or self.workers * 4
+        self.on_close = on_close
+        self.stats = {"in": 0, "out": 0, "busy": 0.0}
+
+
+class Pipeline:
+    """
+    Run `source` through `stages`, every stage in its own threads, connected by bounded queues.
+
+    Each stage works on a different item at the same time, so throughput is
+    set by the slowest stage rather than by the sum of all of them; give slow
+    I/O-bound stages more workers. Items may finish out of order. The first
+    exception raised by any stage stops the pipeline and is re-raised from
+    `run`. With `progress`, one tqdm bar per stage shows items handled, rate
+    and the depth of the queue in front of it; `status()` adds text to the
+    source bar. `label` prefixes the bar names and `position` is the terminal
+    line of the first bar, so several pipelines can share a terminal.
+    """
+
+    def __init__(
+        self,
+        source: Iterable[Any],
+        stages: List[Stage],
+        source_name: str = "source",
+        progress: bool = True,
+        status: Optional[Callable[[], str]] = None,
+        label: Optional[str] = None,
+        position: int = 0,
+    ):
+        self.source = source
+        self.stages = stages
+        self.source_name = source_name
+        self.progress = progress
+        self.status = status
+        self.label = label
+        self.position = position
+        self.source_count = 0
+        self.elapsed = 0.0
+        self._queues: List["queue.Queue[Any]"] = [queue.Queue(maxsize=s.queue_size) for s in stages]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._running: List[int] = [s.workers for s in stages]
+        self._bars: List[Optional[tqdm]] = []
+
+    def _fail(self, exc: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = exc
+        self._stop.set()
+
+    def _put(self, index: int, item: Any) -> bool:
+        """Block until stage `index` has room for `item`; False if the pipeline stopped first."""
+        if index >= len(self.stages):
+            return True
+        q = self._queues[index]
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _tick(self, bar_index: int, queue_index: Optional[int]) -> None:
+        bar = self._bars[bar_index] if self.progress else None
+        if bar is None:
+            return
+        with self._lock:
+            bar.update(1)
+            postfix = ""
+            if queue_index is not None:
+                q = self._queues[queue_index]
+                postfix = f"queue={q.qsize()}/{q.maxsize}"
+            if bar_index == 0 and self.status is not None:
+                postfix = f"{postfix} {self.status()}".strip()
+            bar.set_postfix_str(postfix, refresh=False)
+
+    def _feed(self) -> None:
+        try:
+            for item in self.source:
+                if not self._put(0, item):
+                    return
+                self.source_count += 1
+                self._tick(0, 0 if self.stages else None)
+        except BaseException as e:  # noqa: BLE001 - surfaced from run()
+            logger.exception(f"Pipeline source {self.source_name} failed")
+            self._fail(e)
+            return
+        for _ in range(self.stages[0].workers if self.stages else 0):
+            self._put(0, _DONE)
+
+    def _emit(self, index: int, outputs: Optional[Iterable[Any]]) -> bool:
+        stage = self.stages[index]
+        for out in outputs or ():
+            if not self._put(index + 1, out):
+                return False
+            with self._lock:
+                stage.stats["out"] += 1
+        return True
+
+    def _work(self, index: int) -> None:
+        stage = self.stages[index]
+        q = self._queues[index]
+        try:
+            while True:
+                if self._stop.is_set():
+                    return
+                try:
+                    item = q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                started = time.monotonic()
+                outputs = list(stage.fn(item) or ())
+                # Busy time excludes waiting for room downstream.
+                busy = time.monotonic() - started
+                if not self._emit(index, outputs):
+                    return
+                with self._lock:
+                    stage.stats["in"] += 1
+                    stage.stats["busy"] += busy
+                self._tick(index + 1, index)
+            # The last worker to see the end of input flushes the stage and closes the next one.
+            with self._lock:
+                self._running[index] -= 1
+                if self._running[index]:
+                    return
+            if stage.on_close is not None and not self._emit(index, stage.on_close()):
+                return
+            if index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    self._put(index + 1, _DONE)
+        except BaseException as e:  # noqa: BLE001 - surfaced from run()
+            logger.exception(f"Pipeline stage {stage.name} failed")
+            self._fail(e)
+
+    def run(self) -> None:
+        """Push every source item through all stages; blocks until done or a stage fails."""
+        names = [self.source_name] + [s.name for s in self.stages]
+        if self.label:
+            names = [f"{self.label}/{n}" for n in names]
+        width = max(len(n) for n in names)
+        self._bars = [
+            tqdm(desc=n.ljust(width), unit="item", position=self.position + i, leave=True) if self.progress else None
+            for i, n in enumerate(names)
+        ]
+        started = time.monotonic()
+        threads = [threading.Thread(target=self._feed, name=f"pipeline-{self.source_name}", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads += [
+                threading.Thread(target=self._work, args=(index,), name=f"pipeline-{stage.name}-{w}", daemon=True)
+                for w in range(stage.workers)
+            ]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self._stop.set()
+            raise
+        finally:
+            self.elapsed = time.monotonic() - started
+            for bar in self._bars:
+                if bar is not None:
+                    bar.close()
+        if self._error is not None:
+            raise self._error
+
+    def summary(self) -> List[str]:
+        """One line per stage: items handled, busy time, and the rate its workers sustained."""
+        minutes = max(self.elapsed, 1e-9) / 60
+        lines = [f"{self.source_name}: {self.source_count} items, {self.source_count / minutes:,.1f}/min end to end"]
+        for stage in self.stages:
+            s = stage.stats
+            capacity = s["in"] / (s["busy"] / stage.workers) * 60 if s["busy"] else 0.0
+            utilization = s["busy"] / (stage.workers * max(self.elapsed, 1e-9))
+            lines.append(
+                f"{stage.name}: {s['in']} in, {s['out']} out, {stage.workers} worker(s), "
+                f"{utilization:.0%} busy, capacity {capacity:,.1f}/min"
+            )
+        return lines
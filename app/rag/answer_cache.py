@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.index.cache import text_key
+from app.rag.lru import LRUCache
+
+# The collection an answer was drawn from: live generation and the pointer's version counter.
+VersionStamp = Tuple[str, int]
+
+
+class AnswerCache:
+    """
+    Whole RAG responses (answer and hits), kept in process for repeated questions.
+
+    Entries are keyed by the normalized question (as for query embeddings),
+    `k`, the chat model and the collection's version stamp: the live
+    generation plus the version counter bumped on every promotion and
+    in-place ingest. Once the collection changes, lookups carry the new
+    stamp and no longer match the old entries, which leave through the LRU
+    (beyond `max_entries`) or after `ttl` seconds like any other. An answer
+    finished under a stamp older than the newest one seen (a request that
+    started before the change) is not stored; `snapshot()` counts those as
+    `stale` next to the LRU counters.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        max_entries: int = 256,
+        ttl: float = 86400.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.model = model
+        self._cache = LRUCache(max_entries, ttl, clock)
+        self._newest = -1
+        self._lock = threading.Lock()
+        self.stale = 0
+
+    def _key(self, question: str, k: int, stamp: VersionStamp) -> Hashable:
+        return text_key(question), k, self.model, stamp
+
+    def _current(self, stamp: VersionStamp) -> bool:
+        """Note `stamp`'s version; False if a newer one has been seen already."""
+        with self._lock:
+            if stamp[1] < self._newest:
+                return False
+            self._newest = stamp[1]
+            return True
+
+    def get(self, question: str, k: int, stamp: VersionStamp) -> Optional[Any]:
+        self._current(stamp)
+        return self._cache.get(self._key(question, k, stamp))
+
+    def put(self, question: str, k: int, stamp: VersionStamp, value: Any) -> None:
+        if not self._current(stamp):
+            with self._lock:
+                self.stale += 1
+            return
+        self._cache.put(self._key(question, k, stamp), value)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {**self._cache.snapshot(), "stale": self.stale}
@@ -1,29 +1,51 @@
+import asyncio
 import logging
 import os
+import threading
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Any, AsyncIterator, List, Tuple
 
 import chromadb
 from chromadb.config import Settings
 from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_ollama import ChatOllama, OllamaEmbeddings
 
 from app.index.embed import EMBED_MODEL, OLLAMA_BASE_URL
-from app.index.store import CHROMA_DIR, COLLECTION
+from app.index.store import CHROMA_DIR, CollectionAlias
+from app.rag.answer_cache import AnswerCache, VersionStamp
+from app.rag.query_cache import QueryEmbeddingCache
 
 logger = logging.getLogger(__name__)
 
 CHAT_MODEL = os.environ.get("CHAT_MODEL", "llama3.1")
 DEFAULT_TOP_K = int(os.environ.get("RAG_TOP_K", "4"))
+# Query embeddings kept in memory, and for how long (seconds); a size of 0 disables the cache.
+QUERY_EMBED_CACHE_SIZE = int(os.environ.get("QUERY_EMBED_CACHE_SIZE", "1024"))
+QUERY_EMBED_CACHE_TTL = float(os.environ.get("QUERY_EMBED_CACHE_TTL", "3600"))
+# Whole answers kept in memory, and for how long (seconds); they are also dropped whenever the collection changes.
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "86400"))
 
 
-def _build_vectorstore() -> Chroma:
+def _build_vectorstore(collection_name: str | None = None, embeddings: Embeddings | None = None) -> Chroma:
+    """A LangChain view of `collection_name`, by default the generation `COLLECTION` currently points to."""
     client = chromadb.PersistentClient(path=str(CHROMA_DIR), settings=Settings(anonymized_telemetry=False))
-    embeddings = OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE_URL)
-    return Chroma(client=client, collection_name=COLLECTION, embedding_function=embeddings)
+    embeddings = embeddings or OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE_URL)
+    return Chroma(
+        client=client,
+        collection_name=collection_name or CollectionAlias().current(),
+        embedding_function=embeddings,
+    )
+
+
+def _page_label(meta: dict) -> str:
+    start, end = meta.get("page_start"), meta.get("page_end")
+    if start is None:
+        return ""
+    return f"p. {start}" if end in (None, start) else f"pp. {start}-{end}"
 
 
 def _format_documents(docs) -> str:
@@ -40,6 +62,9 @@ def _format_documents(docs) -> str:
             header_bits.append(label)
         if chunk is not None:
             header_bits.append(f"chunk {chunk}")
+        pages = _page_label(meta)
+        if pages:
+            header_bits.append(pages)
         if url:
             header_bits.append(url)
 
@@ -55,11 +80,28 @@ class RagHit:
     score: float
     metadata: dict
 
+    @property
+    def pages(self) -> str:
+        """Page citation for chunks of paged documents ("p. 3", "pp. 3-4"), else ""."""
+        return _page_label(self.metadata or {})
+
 
 class LangChainRAG:
     def __init__(self, top_k: int = DEFAULT_TOP_K):
         self.top_k = top_k
-        self.vectorstore = _build_vectorstore()
+        # Repeated questions skip the embedding round trip to Ollama.
+        self.query_embeddings = QueryEmbeddingCache(
+            OllamaEmbeddings(model=EMBED_MODEL, base_url=OLLAMA_BASE_URL),
+            EMBED_MODEL,
+            max_entries=QUERY_EMBED_CACHE_SIZE,
+            ttl=QUERY_EMBED_CACHE_TTL,
+        )
+        # Repeated questions against an unchanged collection skip retrieval and generation altogether.
+        self.answers = AnswerCache(CHAT_MODEL, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+        self.alias = CollectionAlias()
+        self.collection_name = self.alias.current()
+        self.vectorstore = _build_vectorstore(self.collection_name, self.query_embeddings)
+        self._lock = threading.Lock()
         self.prompt = ChatPromptTemplate.from_messages(
             [
                 (
@@ -72,29 +114,107 @@ class LangChainRAG:
         )
         self.llm = ChatOllama(model=CHAT_MODEL, base_url=OLLAMA_BASE_URL, temperature=0)
         self.output_parser = StrOutputParser()
+        # Built once; each call passes the question and its formatted context.
+        self.chain = self.prompt | self.llm | self.output_parser
+
+    def _current_vectorstore(self) -> Chroma:
+        """The vector store for the live generation, switching over when ingest has promoted a new one."""
+        name = self.alias.current()
+        if name != self.collection_name:
+            with self._lock:
+                if name != self.collection_name:
+                    logger.info(f"Collection generation changed from {self.collection_name} to {name}")
+                    self.vectorstore = _build_vectorstore(name, self.query_embeddings)
+                    self.collection_name = name
+        return self.vectorstore
+
+    def _version_stamp(self) -> VersionStamp:
+        """What the collection looked like for an answer: the live generation and its in-place version."""
+        return self.alias.current(), self.alias.version()
+
+    @staticmethod
+    def _search_by_vector(vectorstore: Chroma, embedding: List[float], k: int) -> List[Tuple[object, float]]:
+        # Collections are created with cosine distance (see `get_collection`); relevance is its complement,
+        # the same score `similarity_search_with_relevance_scores` gives.
+        found = vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=max(1, k))
+        return [(doc, 1.0 - distance) for doc, distance in found]
 
     def _search(self, question: str, k: int) -> List[Tuple[object, float]]:
-        k = max(1, k)
-        return self.vectorstore.similarity_search_with_relevance_scores(question, k=k)
+        embedding = self.query_embeddings.embed_query(question)
+        return self._search_by_vector(self._current_vectorstore(), embedding, k)
 
-    def invoke(self, question: str, k: int | None = None) -> Tuple[str, List[RagHit]]:
-        k = k or self.top_k
-        docs_and_scores = self._search(question, k)
-        docs = [doc for doc, _ in docs_and_scores]
-        context = _format_documents(docs)
-
-        chain = (
-            {"context": RunnableLambda(lambda _x: context), "question": RunnablePassthrough()}
-            | self.prompt
-            | self.llm
-            | self.output_parser
-        )
+    async def _asearch(self, question: str, k: int) -> List[Tuple[object, float]]:
+        embedding = await self.query_embeddings.aembed_query(question)
+        # Chroma's client is synchronous; keep the event loop free while it searches.
+        return await asyncio.to_thread(self._search_by_vector, self._current_vectorstore(), embedding, k)
 
-        answer = chain.invoke(question)
+    @staticmethod
+    def _chain_input(question: str, docs_and_scores: List[Tuple[object, float]]) -> dict:
+        return {"question": question, "context": _format_documents([doc for doc, _ in docs_and_scores])}
 
+    @staticmethod
+    def _hits(docs_and_scores: List[Tuple[object, float]]) -> List[RagHit]:
         hits: List[RagHit] = []
         for doc, score in docs_and_scores:
             meta = doc.metadata or {}
             hits.append(RagHit(text=doc.page_content, score=float(score), metadata=meta))
+        return hits
 
-        return answer, hits
+    def invoke(self, question: str, k: int | None = None, use_cache: bool = True) -> Tuple[str, List[RagHit]]:
+        """
+        Answer `question` from the `k` best chunks; returns `(answer, hits)`.
+
+        A repeated question is answered from the answer cache unless
+        `use_cache` is false; either way a freshly generated answer is stored.
+        """
+        k = k or self.top_k
+        stamp = self._version_stamp()
+        cached = self.answers.get(question, k, stamp) if use_cache else None
+        if cached is not None:
+            return cached
+        docs_and_scores = self._search(question, k)
+        answer = self.chain.invoke(self._chain_input(question, docs_and_scores))
+        result = answer, self._hits(docs_and_scores)
+        self.answers.put(question, k, stamp, result)
+        return result
+
+    async def ainvoke(self, question: str, k: int | None = None, use_cache: bool = True) -> Tuple[str, List[RagHit]]:
+        """`invoke` for async callers: generation awaits Ollama instead of holding a thread."""
+        k = k or self.top_k
+        stamp = self._version_stamp()
+        cached = self.answers.get(question, k, stamp) if use_cache else None
+        if cached is not None:
+            return cached
+        docs_and_scores = await self._asearch(question, k)
+        answer = await self.chain.ainvoke(self._chain_input(question, docs_and_scores))
+        result = answer, self._hits(docs_and_scores)
+        self.answers.put(question, k, stamp, result)
+        return result
+
+    async def astream(
+        self, question: str, k: int | None = None, use_cache: bool = True
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Retrieve, then stream the answer: yields `("contexts", hits)` once, then `("token", text)` pieces.
+
+        Tokens are passed on as `ChatOllama` produces them, so callers can show
+        the sources and the start of the answer long before generation ends.
+        A cached answer (see `invoke`) comes back as a single token.
+        """
+        k = k or self.top_k
+        stamp = self._version_stamp()
+        cached = self.answers.get(question, k, stamp) if use_cache else None
+        if cached is not None:
+            answer, hits = cached
+            yield "contexts", hits
+            yield "token", answer
+            return
+        docs_and_scores = await self._asearch(question, k)
+        hits = self._hits(docs_and_scores)
+        yield "contexts", hits
+        parts: List[str] = []
+        async for token in self.chain.astream(self._chain_input(question, docs_and_scores)):
+            if token:
+                parts.append(token)
+                yield "token", token
+        self.answers.put(question, k, stamp, ("".join(parts), hits))
@@ -0,0 +1,61 @@
+import time
+from typing import Callable, Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+from app.index.cache import text_key
+from app.rag.lru import LRUCache
+
+
+class QueryEmbeddingCache(Embeddings):
+    """
+    In-process LRU cache of query embeddings in front of another `Embeddings`, entries expiring after `ttl` seconds.
+
+    Queries are keyed by (model, sha256 of the NFC/whitespace-normalized
+    text), so repeats that differ only in spacing share one entry and a
+    model switch never serves another model's vectors. Past `max_entries`
+    the least recently used entry is evicted; `max_entries=0` disables
+    caching. Document embeddings pass straight through. `snapshot()` reports
+    size, hits, misses, expirations, evictions and the hit rate.
+    """
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        model: str,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.inner = inner
+        self.model = model
+        self._cache = LRUCache(max_entries, ttl, clock)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return self._cache.stats
+
+    def embed_query(self, text: str) -> List[float]:
+        key = (self.model, text_key(text))
+        vector = self._cache.get(key)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self._cache.put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = (self.model, text_key(text))
+        vector = self._cache.get(key)
+        if vector is None:
+            vector = await self.inner.aembed_query(text)
+            self._cache.put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    def snapshot(self) -> Dict[str, float]:
+        return self._cache.snapshot()
@@ -0,0 +1,264 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from ingest import (
+    DATA_DIR,
+    DEDUP_PATH,
+    EMBED_CACHE_PATH,
+    PARSED_DIR,
+    RAW_DIR,
+    RECORDS_PATH,
+    WRITE_BATCH,
+    ChunkBatch,
+    log_and_print,
+)
+from harvest.records import RecordStore, StoredRecord
+from parse.cache import ParsedTextCache, file_sha256, parser_kind
+from parse.pool import ParsePool
+from index.cache import EmbeddingCache
+from index.chunk import tiktoken_length
+from index.dedup import NearDuplicateIndex
+from index.documents import chunk_record_in_worker, record_id, text_sources
+from index.embed import EMBED_CACHE_MB, EMBED_MODEL, EmbeddingExecutor
+from index.store import COLLECTION, COLLECTION_KEEP, begin_generation, discard_generation, promote_generation
+from pipeline import Pipeline, Stage
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the Chroma collection from the local record store and parsed-text cache, without harvesting."
+    )
+    parser.add_argument(
+        "--collection",
+        default=COLLECTION,
+        help="Collection to rebuild (default: COLLECTION, the one the API serves); "
+        "readers switch to the new generation once it is complete",
+    )
+    parser.add_argument(
+        "--keep-generations",
+        type=int,
+        default=COLLECTION_KEEP,
+        help="Generations of the collection to keep, the new one included; older ones are dropped",
+    )
+    parser.add_argument("--chunk-size", type=int, default=900, help="Maximum chunk size (see --chunk-unit)")
+    parser.add_argument("--chunk-overlap", type=int, default=150, help="Overlap carried between chunks")
+    parser.add_argument(
+        "--chunk-unit",
+        choices=["chars", "tokens"],
+        default="chars",
+        help="Measure chunk sizes in characters or in tokens (tokens need tiktoken)",
+    )
+    parser.add_argument("--chunk-workers", type=int, default=None, help="Chunking processes (default: CPU count)")
+    parser.add_argument("--load-workers", type=int, default=4, help="Threads reading records' parsed text")
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=None,
+        help="Parser processes for local files missing from the parsed-text cache (default: CPU count)",
+    )
+    parser.add_argument("--parse-timeout", type=float, default=120.0, help="Seconds allowed per file before it is skipped")
+    parser.add_argument("--embed-workers", type=int, default=4, help="Embedding batches kept in flight against Ollama")
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.9,
+        help="Estimated Jaccard similarity at which a chunk counts as a near-duplicate (0 disables)",
+    )
+    args = parser.parse_args()
+
+    if args.chunk_unit == "tokens":
+        try:
+            tiktoken_length()
+        except ImportError as e:
+            raise SystemExit(str(e))
+
+    store = RecordStore(RECORDS_PATH)
+    try:
+        if not store.count():
+            raise SystemExit(f"No records in {RECORDS_PATH}; run ingest.py first to harvest them.")
+        # Build next to the live collection; the API keeps serving it until the swap.
+        generation, coll = begin_generation(args.collection)
+        try:
+            reindex(args, store, coll)
+        except BaseException:
+            discard_generation(generation, args.collection)
+            raise
+        retired = promote_generation(generation, args.collection, keep=args.keep_generations)
+        log_and_print(
+            "Collection %s now serves generation %s%s",
+            args.collection,
+            generation,
+            f"; dropped {', '.join(retired)}" if retired else "",
+        )
+    finally:
+        store.close()
+
+
+def dedup_path(collection: str) -> Path:
+    """The near-duplicate index kept for `collection`; ingest uses DEDUP_PATH for the default one."""
+    return DEDUP_PATH if collection == COLLECTION else DATA_DIR / f"dedup.{collection}.sqlite3"
+
+
+def reindex(args: argparse.Namespace, store: RecordStore, coll: Any) -> None:
+    """
+    Chunk, embed and write every record in `store` to the empty collection `coll` (a new generation).
+
+    Nothing is fetched from the catalogue: each record's files come from the
+    parsed-text cache, or are parsed again from RAW_DIR when the cache has no
+    entry for them (e.g. after a parser upgrade). Chunking runs in worker
+    processes, and vectors for chunk texts embedded before are served from
+    the embedding cache. The near-duplicate index is rebuilt alongside and
+    replaces the old one only when the run completes.
+    """
+    log_and_print(
+        "Reindexing %s stored records into collection=%s chunk_size=%s overlap=%s unit=%s model=%s",
+        store.count(),
+        args.collection,
+        args.chunk_size,
+        args.chunk_overlap,
+        args.chunk_unit,
+        EMBED_MODEL,
+    )
+    counts = {"records": 0, "files": 0, "reparsed": 0, "missing_files": 0, "chunks": 0, "duplicates": 0, "written": 0}
+    counts_lock = threading.Lock()
+    pending = ChunkBatch()
+
+    parsed_cache = ParsedTextCache(PARSED_DIR)
+    parse_pool = ParsePool(workers=args.parse_workers, timeout=args.parse_timeout, cache=parsed_cache)
+    chunk_workers = max(1, args.chunk_workers or os.cpu_count() or 1)
+    # Chunking is CPU-bound Python; one process per core (spawned, as the pipeline threads are already running).
+    chunkers = ProcessPoolExecutor(max_workers=chunk_workers, mp_context=multiprocessing.get_context("spawn"))
+    embed_cache = EmbeddingCache(EMBED_CACHE_PATH, max_bytes=EMBED_CACHE_MB * 1024 * 1024)
+    embedder = EmbeddingExecutor(workers=args.embed_workers, cache=embed_cache)
+    dedup = None
+    target = dedup_path(args.collection)
+    building = target.with_name(f"{target.name}.reindex")
+    if args.dedup_threshold > 0:
+        building.unlink(missing_ok=True)
+        dedup = NearDuplicateIndex(building, threshold=args.dedup_threshold)
+
+    # --- Pipeline stages: records -> load -> chunk -> batch -> embed -> write ---
+
+    def count(key: str, amount: int = 1) -> None:
+        with counts_lock:
+            counts[key] += amount
+
+    def load(stored: StoredRecord):
+        parsed_files = []
+        for f in stored.files:
+            path = RAW_DIR / f["path"]
+            pages = parsed_cache.get(f"{f['sha256']}.{parser_kind(path)}")
+            if pages is None and path.exists() and file_sha256(path) == f["sha256"]:
+                # Not in the cache (or cached by an older parser): parse the local copy again.
+                pages = parse_pool.parse(path)
+                count("reparsed")
+            if pages is None:
+                logger.warning(f"No text for {f['path']} of record {record_id(stored.record)}; file skipped")
+                count("missing_files")
+            count("files")
+            parsed_files.append((path, pages))
+        return [(stored.record, parsed_files)]
+
+    def chunk(item):
+        rec, parsed_files = item
+        texts = text_sources(rec, parsed_files)
+        future = chunkers.submit(
+            chunk_record_in_worker, rec, texts, args.chunk_size, args.chunk_overlap, args.chunk_unit
+        )
+        return [(rec, future.result())]
+
+    def batch(item):
+        # Single worker: owns `pending`.
+        nonlocal pending
+        rec, candidates = item
+        counts["records"] += 1
+        duplicates = {}
+        if dedup is not None:
+            duplicates = dedup.update_record(rec.get("oai_identifier") or record_id(rec), candidates)
+            counts["duplicates"] += len(duplicates)
+        for doc_id, text, meta in candidates:
+            if doc_id in duplicates:
+                continue
+            counts["chunks"] += 1
+            pending.add(counts["records"], doc_id, text, meta)
+            if len(pending.ids) >= WRITE_BATCH:
+                yield pending
+                pending = ChunkBatch()
+
+    def flush_batch():
+        return [pending] if pending.ids else None
+
+    def embed(item):
+        item.embeddings = embedder.embed(item.texts)
+        return [item]
+
+    def write(item):
+        coll.upsert(ids=item.ids, documents=item.texts, embeddings=item.embeddings, metadatas=item.metadatas)
+        counts["written"] += len(item.ids)
+        return None
+
+    pipeline = Pipeline(
+        store.iter_records(),
+        [
+            Stage("load", load, workers=args.load_workers),
+            Stage("chunk", chunk, workers=chunk_workers),
+            Stage("batch", batch, workers=1, on_close=flush_batch),
+            Stage("embed", embed, workers=args.embed_workers),
+            Stage("write", write, workers=1),
+        ],
+        source_name="records",
+    )
+    try:
+        pipeline.run()
+    except BaseException:
+        log_and_print(
+            "Reindex stopped after writing %s chunks; collection=%s still serves the previous generation.",
+            counts["written"],
+            args.collection,
+        )
+        raise
+    finally:
+        parse_pool.close()
+        chunkers.shutdown(wait=True, cancel_futures=True)
+        embedder.close()
+        embed_cache.close()
+        if dedup is not None:
+            dedup.close()
+
+    if dedup is not None:
+        os.replace(building, target)
+
+    for line in pipeline.summary():
+        log_and_print("Stage %s", line)
+    log_and_print(
+        "Files: %s read, %s from the parsed-text cache, %s parsed again from local copies, %s without text",
+        counts["files"],
+        parsed_cache.stats["hits"],
+        counts["reparsed"],
+        counts["missing_files"],
+    )
+    log_and_print(
+        "Embedding: %s texts in %s requests, %s cache hits, %s misses",
+        embedder.stats["texts"],
+        embedder.stats["batches"],
+        embed_cache.stats["hits"],
+        embed_cache.stats["misses"],
+    )
+    log_and_print(
+        "Reindexed %s records: %s chunks written, %s near-duplicates referenced instead of stored.",
+        counts["records"],
+        counts["written"],
+        counts["duplicates"],
+    )
+
+
+if __name__ == "__main__":
+    main()
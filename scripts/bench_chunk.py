@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Compare chunking throughput (MB/sec) and output with LangChain's splitter.
+
+Times `chunk_text` from `app/index/chunk.py` against LangChain's
+`RecursiveCharacterTextSplitter` with the same separators, size and overlap,
+and checks that both produce identical chunks. Pass `--file` (a plain-text
+export, e.g. parsed fulltext) or let it build a synthetic document laid out
+as paragraphs, as short lines (like PDF extraction output) or as run-on
+text with no line or sentence breaks.
+
+    python scripts/bench_chunk.py --mb 4 --layout lines --chunk-size 900 --overlap 150
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import sys
+import textwrap
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from index.chunk import SEPARATORS, chunk_text  # noqa: E402
+
+
+def synthetic_text(mb: float, layout: str = "paragraphs", seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = ["sea", "level", "gauge", "tide", "station", "measurement", "coastal", "data", "survey", "model"]
+    parts: List[str] = []
+    size = 0
+    while size < mb * 1e6:
+        sentences = [" ".join(rng.choice(words) for _ in range(rng.randint(5, 30))) for _ in range(rng.randint(1, 12))]
+        para = ". ".join(sentences) + "."
+        if rng.random() < 0.2:
+            para = para.replace(". ", "\n")  # line-broken text, as PDF extraction produces
+        parts.append(para)
+        size += len(para) + 2
+    text = "\n\n".join(parts)
+    if layout == "lines":
+        return "\n".join(textwrap.wrap(text.replace("\n", " "), 80))
+    if layout == "runon":
+        return text.replace("\n", " ").replace(". ", " ")
+    return text
+
+
+def timed(fn: Callable[[], List[str]], repeat: int):
+    best, out = float("inf"), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", type=Path, default=None, help="Text file to chunk")
+    parser.add_argument("--mb", type=float, default=4.0, help="Synthetic document size when no file is given")
+    parser.add_argument("--layout", choices=["paragraphs", "lines", "runon"], default="paragraphs")
+    parser.add_argument("--chunk-size", type=int, default=900)
+    parser.add_argument("--overlap", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)  # LangChain warns about every oversized chunk
+
+    text = args.file.read_text(encoding="utf-8", errors="ignore") if args.file else synthetic_text(args.mb, args.layout)
+    mb = len(text.encode("utf-8")) / 1e6
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size, chunk_overlap=args.overlap, separators=list(SEPARATORS)
+    )
+
+    new_time, new_chunks = timed(lambda: chunk_text(text, args.chunk_size, args.overlap), args.repeat)
+    old_time, old_chunks = timed(lambda: splitter.split_text(text), args.repeat)
+
+    print(f"text: {mb:.1f} MB source: {args.file or 'synthetic ' + args.layout} chunk_size={args.chunk_size} overlap={args.overlap}")
+    print(f"native chunker: {mb / new_time:,.1f} MB/sec, {len(new_chunks):,} chunks")
+    print(f"LangChain splitter: {mb / old_time:,.1f} MB/sec, {len(old_chunks):,} chunks")
+    print(f"speedup: {old_time / new_time:.1f}x, identical output: {new_chunks == old_chunks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Measure HTML text extraction throughput (MB/sec) on saved pages.
+
+Times the streaming lxml extractor from `app/parse/html.py` against the
+previous BeautifulSoup (`html.parser`) implementation, copied below. Point
+`--corpus` at a directory of saved `.html`/`.htm` pages (searched
+recursively); without it a synthetic corpus of article-like pages with
+navigation, footers and scripts is generated. No network access is needed.
+
+    python scripts/bench_html.py --corpus data/raw --repeat 3
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from parse.html import extract_html_text  # noqa: E402
+
+SYNTHETIC_PAGE = """<!DOCTYPE html>
+<html><head><title>Record {n}</title><style>body {{ font: 14px sans-serif; }}</style>
+<script>window.analytics = {{ page: {n} }};</script></head>
+<body>
+  <header><a href="/">Repository</a><form><input name="q"><button>Search</button></form></header>
+  <nav><ul>{nav}</ul></nav>
+  <main><article>
+    <h1>Dataset {n}: coastal measurements</h1>
+    {paragraphs}
+    <table><tr><th>Year</th><th>Value</th></tr>{rows}</table>
+  </article></main>
+  <aside>Related records: {nav}</aside>
+  <footer><p>Copyright, licence and contact links</p></footer>
+</body></html>
+"""
+
+
+def legacy_extract_html_text(html: str) -> str:
+    """The previous implementation: full BeautifulSoup tree, then line cleanup."""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    text = soup.get_text("\n")
+    lines = [ln.strip() for ln in text.splitlines()]
+    lines = [ln for ln in lines if ln]
+    return "\n".join(lines)
+
+
+def synthetic_corpus(pages: int) -> List[str]:
+    nav = "".join(f'<li><a href="/r/{i}">Link {i}</a></li>' for i in range(30))
+    sentence = "Measurements were taken at <em>low tide</em> with a <a href='#m'>calibrated gauge</a>. "
+    paragraphs = "".join(f"<h2>Section {i}</h2><p>{sentence * 12}</p>" for i in range(20))
+    rows = "".join(f"<tr><td>{1990 + i}</td><td>{i * 0.3:.1f}</td></tr>" for i in range(40))
+    return [SYNTHETIC_PAGE.format(n=n, nav=nav, paragraphs=paragraphs, rows=rows) for n in range(pages)]
+
+
+def load_corpus(corpus: Path) -> List[str]:
+    files = sorted(p for p in corpus.rglob("*") if p.suffix.lower() in (".html", ".htm"))
+    return [p.read_text(encoding="utf-8", errors="ignore") for p in files]
+
+
+def timed(fn: Callable[[str], str], pages: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            fn(page)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=None, help="Directory of saved HTML pages")
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic pages when no corpus is given")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.pages)
+    if not pages:
+        raise SystemExit(f"No .html/.htm files found under {args.corpus}")
+    mb = sum(len(p.encode("utf-8")) for p in pages) / 1e6
+
+    new_time = timed(extract_html_text, pages, args.repeat)
+    old_time = timed(legacy_extract_html_text, pages, args.repeat)
+    new_chars = sum(len(extract_html_text(p)) for p in pages)
+    old_chars = sum(len(legacy_extract_html_text(p)) for p in pages)
+
+    print(f"pages: {len(pages)} ({mb:.1f} MB) source: {args.corpus or 'synthetic'}")
+    print(f"lxml streaming extractor: {mb / new_time:,.1f} MB/sec, {new_chars:,} chars kept")
+    print(f"legacy BeautifulSoup: {mb / old_time:,.1f} MB/sec, {old_chars:,} chars kept")
+    print(f"speedup: {old_time / new_time:.1f}x, boilerplate removed: {1 - new_chars / old_chars:.0%}")
+
+
+if __name__ == "__main__":
+    main()
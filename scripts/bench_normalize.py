@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Measure OAI record normalization throughput (records/sec).
+
+Builds a synthetic ListRecords page of DataCite or Dublin Core records shaped
+like the fixtures in `tests/test_harvest.py`, then times the compiled
+normalizer from `app/harvest/normalize.py` against the previous approach
+(re-serialize each record, reparse it, and run `//`-rooted XPath queries).
+No network access is needed.
+
+    python scripts/bench_normalize.py --records 5000 --prefix oai_datacite
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from lxml import etree
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from harvest.normalize import NS, make_normalizer  # noqa: E402
+
+DATACITE_RECORD = """
+<record>
+  <header><identifier>oai:zenodo.org:{n}</identifier><datestamp>2025-01-01T00:00:00Z</datestamp></header>
+  <metadata>
+    <d:resource>
+      <d:identifier identifierType="DOI">10.1234/example.{n}</d:identifier>
+      <d:creators>
+        <d:creator><d:creatorName>Ada Lovelace</d:creatorName></d:creator>
+        <d:creator><d:creatorName>Charles Babbage</d:creatorName></d:creator>
+      </d:creators>
+      <d:titles><d:title>Sample Title {n}</d:title></d:titles>
+      <d:subjects><d:subject>math</d:subject><d:subject>engines</d:subject></d:subjects>
+      <d:descriptions><d:description>Description of record {n}. {filler}</d:description></d:descriptions>
+      <d:publicationYear>2024</d:publicationYear>
+      <d:alternateIdentifiers>
+        <d:alternateIdentifier alternateIdentifierType="url">https://example.org/rec/{n}</d:alternateIdentifier>
+      </d:alternateIdentifiers>
+    </d:resource>
+  </metadata>
+</record>
+"""
+
+DC_RECORD = """
+<record>
+  <header><identifier>oai:example:{n}</identifier><datestamp>2025-01-01</datestamp></header>
+  <metadata>
+    <oai_dc:dc>
+      <dc:title>DC Title {n}</dc:title>
+      <dc:creator>Someone</dc:creator>
+      <dc:subject>Topic</dc:subject>
+      <dc:description>DC description {n}. {filler}</dc:description>
+      <dc:date>2023-01-01</dc:date>
+      <dc:identifier>https://example.org/dc/{n}</dc:identifier>
+    </oai_dc:dc>
+  </metadata>
+</record>
+"""
+
+
+def build_page(prefix: str, count: int):
+    template = DATACITE_RECORD if prefix == "oai_datacite" else DC_RECORD
+    filler = "lorem ipsum " * 40
+    body = "".join(template.format(n=n, filler=filler) for n in range(count))
+    nsdecl = " ".join(
+        f'xmlns:{k}="{v}"' for k, v in NS.items() if k != "oai"
+    )
+    xml = (
+        f'<OAI-PMH xmlns="{NS["oai"]}" {nsdecl}><ListRecords>{body}</ListRecords></OAI-PMH>'
+    )
+    root = etree.fromstring(xml.encode("utf-8"))
+    return root.findall(f"{{{NS['oai']}}}ListRecords/{{{NS['oai']}}}record")
+
+
+def legacy_normalize(record_el) -> dict:
+    """The pre-registry approach: reparse the record and scan it with `//` queries."""
+    root = etree.fromstring(etree.tounicode(record_el).encode("utf-8"))
+    ns = dict(NS)
+
+    def first(xpath):
+        res = root.xpath(xpath, namespaces=ns)
+        return (res[0].text or "").strip() if res else None
+
+    def all_(xpath):
+        return "; ".join((x.text or "").strip() for x in root.xpath(xpath, namespaces=ns))
+
+    out = {
+        "oai_identifier": first("//oai:header/oai:identifier"),
+        "title": first("//d:title") or first("//dc:title"),
+        "creators": all_("//d:creator/d:creatorName") or all_("//dc:creator"),
+        "subjects": all_("//d:subject") or all_("//dc:subject"),
+        "description": first("//d:description") or first("//dc:description"),
+        "date": first("//d:publicationYear") or first("//dc:date"),
+        "url": first("//d:identifier[@identifierType='URL']"),
+        "doi": first("//d:identifier[@identifierType='DOI']"),
+    }
+    if out["url"] is None:
+        ids = [(x.text or "").strip() for x in root.xpath("//dc:identifier", namespaces=ns)]
+        out["url"] = next((x for x in ids if x.startswith("http")), None)
+    return out
+
+
+def timed(fn, records, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for rec in records:
+            fn(rec)
+        best = min(best, time.perf_counter() - start)
+    return len(records) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--prefix", choices=["oai_datacite", "oai_dc"], default="oai_datacite")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    records = build_page(args.prefix, args.records)
+    normalize = make_normalizer(args.prefix)
+
+    new_rate = timed(normalize, records, args.repeat)
+    old_rate = timed(legacy_normalize, records, args.repeat)
+
+    print(f"records: {len(records)} prefix: {args.prefix}")
+    print(f"compiled normalizer: {new_rate:,.0f} records/sec")
+    print(f"legacy reparse + // xpath: {old_rate:,.0f} records/sec")
+    print(f"speedup: {new_rate / old_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,159 @@
 import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
 
 # Ensure `app` package is importable when running tests from repo root
 ROOT = Path(__file__).resolve().parents[1]
 APP_DIR = ROOT / "app"
 if str(APP_DIR) not in sys.path:
     sys.path.insert(0, str(APP_DIR))
+
+
+class FakeOAIServer:
+    """Tiny OAI-PMH ListRecords endpoint with paging, date filters and per-page latency.
+
+    Records are Dublin Core, one per `hours_apart` hours starting 2025-01-01.
+    `max_concurrency` records the peak number of requests served at once.
+    """
+
+    def __init__(self, records=40, page_size=5, latency=0.05, hours_apart=6):
+        start = datetime(2025, 1, 1)
+        self.records = [
+            (f"oai:fake:{i}", start + timedelta(hours=hours_apart * i)) for i in range(records)
+        ]
+        self.page_size = page_size
+        self.latency = latency
+        self.requests = 0
+        self.max_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/oai"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _bound(value, upper):
+        if "T" in value:
+            return datetime.strptime(value.rstrip("Z"), "%Y-%m-%dT%H:%M:%S")
+        day = datetime.strptime(value, "%Y-%m-%d")
+        return day + timedelta(days=1, seconds=-1) if upper else day
+
+    def _select(self, params):
+        lo = self._bound(params["from"], False) if "from" in params else None
+        hi = self._bound(params["until"], True) if "until" in params else None
+        return [
+            r for r in self.records
+            if (lo is None or r[1] >= lo) and (hi is None or r[1] <= hi)
+        ]
+
+    def render(self, query: str) -> str:
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        if "resumptionToken" in params:
+            frm, until, offset = params["resumptionToken"].split("|")
+            params = {k: v for k, v in (("from", frm), ("until", until)) if v}
+            offset = int(offset)
+        else:
+            offset = 0
+        matches = self._select(params)
+        head = '<?xml version="1.0"?><OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+        if not matches:
+            return head + '<error code="noRecordsMatch">none</error></OAI-PMH>'
+        page = matches[offset:offset + self.page_size]
+        body = "".join(
+            "<record><header>"
+            f"<identifier>{oai_id}</identifier><datestamp>{stamp:%Y-%m-%dT%H:%M:%SZ}</datestamp>"
+            "</header><metadata>"
+            '<oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/" '
+            'xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f"<dc:title>Title {oai_id}</dc:title></oai_dc:dc></metadata></record>"
+            for oai_id, stamp in page
+        )
+        nxt = offset + self.page_size
+        token = ""
+        if nxt < len(matches):
+            token = f"{params.get('from', '')}|{params.get('until', '')}|{nxt}"
+        return head + f"<ListRecords>{body}<resumptionToken>{token}</resumptionToken></ListRecords></OAI-PMH>"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    server._active += 1
+                    server.max_concurrency = max(server.max_concurrency, server._active)
+                try:
+                    time.sleep(server.latency)
+                    payload = server.render(urlparse(self.path).query).encode("utf-8")
+                finally:
+                    with server._lock:
+                        server._active -= 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *_args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def fake_oai_server():
+    server = FakeOAIServer().start()
+    yield server
+    server.stop()
+
+
+def _write_text_pdf(path: Path, pages) -> Path:
+    """Write a minimal PDF whose page i shows the string pages[i] (pypdf cannot author text)."""
+    objs = []
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objs.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    objs.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objs.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objs.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for num, body in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(out)
+    return path
+
+
+@pytest.fixture
+def make_text_pdf():
+    return _write_text_pdf
@@ -1,8 +1,8 @@
-import pytest
+import random
 
-pytest.importorskip("langchain")
+import pytest
 
-from index.chunk import chunk_text
+from index.chunk import chunk_pages, chunk_spans, chunk_text
 
 
 def test_chunk_text_overlap_and_size():
@@ -19,3 +19,71 @@ def test_chunk_text_overlap_and_size():
     for prev, nxt in zip(chunks, chunks[1:]):
         tail = prev[-30:]
         assert tail in nxt
+
+
+def test_chunk_pages_tracks_page_ranges_while_streaming():
+    pages = [f"Page {n} " + " ".join(f"p{n}w{i}" for i in range(60)) for n in range(1, 41)]
+    consumed = []
+
+    def stream():
+        for page in pages:
+            consumed.append(page)
+            yield page
+
+    chunks = chunk_pages(stream(), chunk_size=250, overlap=30)
+    first = next(chunks)
+    # The first chunk is available long before the last page has been read.
+    assert len(consumed) < len(pages)
+    assert (first.page_start, first.page_end) == (1, 1)
+    assert first.text.startswith("Page 1 ")
+
+    results = [first] + list(chunks)
+    document = "\n".join(pages)
+    assert all(len(c.text) <= 250 for c in results)
+    for c in results:
+        assert document[c.start:c.end] == c.text
+        assert c.page_start <= c.page_end
+        for word in c.text.split():
+            if word.startswith("p") and "w" in word:
+                assert c.page_start <= int(word[1:word.index("w")]) <= c.page_end
+    # Every word of the document lands in some chunk.
+    seen = {word for c in results for word in c.text.split()}
+    assert seen == {word for page in pages for word in page.split()}
+    assert results[-1].page_end == 40
+
+
+def test_chunk_pages_matches_chunk_text_for_short_documents():
+    pages = ["First page text.", "Second page text."]
+    chunks = list(chunk_pages(pages))
+    assert [c.text for c in chunks] == chunk_text("\n".join(pages))
+    assert (chunks[0].page_start, chunks[0].page_end) == (1, 2)
+
+
+def test_chunk_spans_are_offsets_into_the_source():
+    text = "Intro line.\n\n  " + "word " * 120 + "\n\nLast paragraph. Ends here."
+    spans = chunk_spans(text, chunk_size=100, overlap=20)
+    assert [text[a:b] for a, b in spans] == chunk_text(text, chunk_size=100, overlap=20)
+    assert all(text[a:b] == text[a:b].strip() for a, b in spans)
+    assert spans == sorted(spans)
+
+
+def test_chunk_text_counts_sizes_with_length_function():
+    words = " ".join(f"w{i}" for i in range(100))
+    chunks = chunk_text(words, chunk_size=10, overlap=2, length_function=lambda s: len(s.split()))
+    assert all(len(c.split()) <= 10 for c in chunks)
+    assert len(chunks) > 10
+
+
+def test_chunk_text_matches_langchain_splitter():
+    text_splitter = pytest.importorskip("langchain.text_splitter")
+
+    rng = random.Random(7)
+    vocab = ["alpha", "beta.", "gamma", "x" * 60, "y" * 400, "\n", "\n\n", "\n\n\n", " ", ". "]
+    for _ in range(300):
+        text = "".join(rng.choice(vocab) + rng.choice(["", " ", "\n"]) for _ in range(rng.randint(0, 200)))
+        chunk_size = rng.choice([30, 100, 250])
+        overlap = rng.choice([0, 10, chunk_size // 2])
+        splitter = text_splitter.RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=overlap, separators=["\n\n", "\n", ". ", " "]
+        )
+        assert chunk_text(text, chunk_size, overlap) == splitter.split_text(text)
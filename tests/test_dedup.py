@@ -0,0 +1,76 @@
+from pathlib import Path
+
+import numpy as np
+
+from index.dedup import MinHasher, NearDuplicateIndex, lsh_params, shingles
+
+DESCRIPTION = (
+    "Sea surface temperature and salinity measured hourly by the coastal buoy network between 2010 and 2015. "
+    "Values were quality controlled against ship-based profiles, flagged where sensors drifted, and gap filled "
+    "with a seasonal model. The archive includes station coordinates, instrument metadata and processing notes."
+)
+
+
+def test_minhash_estimates_shingle_jaccard():
+    hasher = MinHasher()
+    edited = DESCRIPTION.replace("hourly", "every hour")
+    a, b = set(shingles(DESCRIPTION)), set(shingles(edited))
+    jaccard = len(a & b) / len(a | b)
+    estimate = np.mean(hasher.signature(DESCRIPTION) == hasher.signature(edited))
+    assert abs(estimate - jaccard) < 0.15
+    # Signatures are stable across instances (and therefore across runs).
+    assert np.array_equal(MinHasher().signature(DESCRIPTION), hasher.signature(DESCRIPTION))
+    bands, rows = lsh_params(0.9, 128)
+    assert bands * rows <= 128 and abs((1 / bands) ** (1 / rows) - 0.9) < 0.05
+
+
+def test_near_duplicates_reference_the_canonical_chunk(tmp_path: Path):
+    index = NearDuplicateIndex(tmp_path / "dedup.sqlite3", threshold=0.7)
+    assert index.update_record("oai:v1", [("v1:metadata:0", DESCRIPTION)]) == {}
+
+    # A new version of the record with a one-word change, plus a genuinely new chunk.
+    version_two = DESCRIPTION.replace("2015", "2016")
+    found = index.update_record(
+        "oai:v2", [("v2:metadata:0", version_two), ("v2:report.pdf:0", "Completely different text about seabirds.")]
+    )
+    assert found == {"v2:metadata:0": "v1:metadata:0"}
+    assert index.duplicates_of("v1:metadata:0") == ["v2:metadata:0"]
+    assert index.stats == {"checked": 3, "duplicates": 1, "promoted": 0}
+
+    # Re-indexing the canonical record finds nothing: duplicates are not indexed themselves.
+    assert index.update_record("oai:v1", [("v1:metadata:0", DESCRIPTION)]) == {}
+    index.close()
+
+    # The index persists; a stricter threshold re-buckets it and the edit no longer counts.
+    strict = NearDuplicateIndex(tmp_path / "dedup.sqlite3", threshold=0.99)
+    assert strict.canonical_of("v2:metadata:0") == "v1:metadata:0"
+    assert strict.update_record("oai:v2", [("v2:metadata:0", version_two)]) == {}
+    assert strict.canonical_of("v2:metadata:0") is None
+
+    # Deleting the record removes its chunks, so the next copy becomes canonical.
+    strict.remove_record("oai:v1")
+    assert strict.update_record("oai:v3", [("v3:metadata:0", DESCRIPTION)]) == {}
+    strict.close()
+
+
+def test_duplicates_are_promoted_when_their_canonical_goes_away(tmp_path: Path):
+    index = NearDuplicateIndex(tmp_path / "dedup.sqlite3", threshold=0.7)
+    index.update_record("oai:v1", [("v1:metadata:0", DESCRIPTION, {"record_id": "v1"})])
+    version_two = DESCRIPTION.replace("2015", "2016")
+    version_three = DESCRIPTION.replace("Sea surface", "SEA SURFACE")  # same shingles as version one
+    index.update_record("oai:v2", [("v2:metadata:0", version_two, {"record_id": "v2"})])
+    index.update_record("oai:v3", [("v3:metadata:0", version_three, {"record_id": "v3"})])
+    assert index.duplicates_of("v1:metadata:0") == ["v2:metadata:0", "v3:metadata:0"]
+    assert index.pop_promoted() == []
+
+    # The canonical's record is deleted: the first duplicate takes its place, the other now points at it.
+    index.remove_record("oai:v1")
+    assert index.pop_promoted() == [("v2:metadata:0", version_two, {"record_id": "v2"})]
+    assert index.canonical_of("v2:metadata:0") is None
+    assert index.canonical_of("v3:metadata:0") == "v2:metadata:0"
+
+    # Editing a canonical chunk beyond recognition promotes its duplicate the same way.
+    index.update_record("oai:v2", [("v2:metadata:0", "Completely different text about seabirds.", {})])
+    assert index.pop_promoted() == [("v3:metadata:0", version_three, {"record_id": "v3"})]
+    assert index.stats["promoted"] == 2
+    index.close()
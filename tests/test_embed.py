@@ -0,0 +1,242 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("langchain_ollama")
+
+from langchain_ollama import OllamaEmbeddings
+
+import index.embed as embed_mod
+from index.cache import EmbeddingCache, text_key
+from index.embed import EmbeddingExecutor
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 0.5, -1.25] for t in texts]
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(embed_mod, "_embeddings", fake)
+    return fake
+
+
+def test_executor_only_sends_cache_misses(tmp_path: Path, fake_embeddings):
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite3")
+
+    with EmbeddingExecutor(workers=1, cache=cache) as executor:
+        first = executor.embed(["alpha", "beta", "alpha"])
+        assert fake_embeddings.calls == [["alpha", "beta"]]
+        assert first == [[5.0, 0.5, -1.25], [4.0, 0.5, -1.25], [5.0, 0.5, -1.25]]
+
+        # Whitespace differences normalize to the same key.
+        again = executor.embed(["  alpha\n", "gamma"])
+        assert fake_embeddings.calls[-1] == ["gamma"]
+        assert again[0] == first[0]
+    assert cache.stats == {"hits": 1, "misses": 4, "evicted": 0}
+    cache.close()
+
+    # A new process with the same cache file embeds nothing.
+    reopened = EmbeddingCache(tmp_path / "embeddings.sqlite3")
+    with EmbeddingExecutor(workers=1, cache=reopened) as executor:
+        assert executor.embed(["alpha", "beta", "gamma"]) == [
+            [5.0, 0.5, -1.25],
+            [4.0, 0.5, -1.25],
+            [5.0, 0.5, -1.25],
+        ]
+    assert len(fake_embeddings.calls) == 2
+    assert reopened.stats["hits"] == 3
+
+
+def test_embedding_cache_is_keyed_by_model_and_evicts_least_recently_used(tmp_path: Path):
+    # Three-float vectors take 12 bytes each; the cap holds two of them.
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite3", max_bytes=30)
+    cache.put_many("model-a", {text_key("one"): [1.0, 2.0, 3.0]})
+    assert cache.get_many("model-b", [text_key("one")]) == {}
+
+    cache.put_many("model-a", {text_key("two"): [0.1, 0.2, 0.3]})
+    cache.get_many("model-a", [text_key("one")])  # "one" is now the most recently used
+    cache.put_many("model-a", {text_key("three"): [0.1, 5.0, 6.0]})
+
+    remaining = cache.get_many("model-a", [text_key(t) for t in ("one", "two", "three")])
+    assert set(remaining) == {text_key("one"), text_key("three")}
+    assert cache.stats["evicted"] == 1
+    assert remaining[text_key("one")] == [1.0, 2.0, 3.0]
+    # Stored as float32, so values come back rounded to single precision.
+    assert remaining[text_key("three")] == pytest.approx([0.1, 5.0, 6.0])
+    assert remaining[text_key("three")][0] != 0.1
+
+
+class FakeOllamaServer:
+    """`/api/embed` endpoint with per-request and per-text latency.
+
+    Requests with more than `max_inputs` texts, or containing `poison`, get a
+    500. `sizes` records the number of texts in every request and
+    `max_concurrency` the peak number served at once.
+    """
+
+    def __init__(self, latency=0.02, per_text=0.0, max_inputs=None, poison=None):
+        self.latency = latency
+        self.per_text = per_text
+        self.max_inputs = max_inputs
+        self.poison = poison
+        self.sizes = []
+        self.chars = []
+        self.max_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                texts = body["input"]
+                with server._lock:
+                    server._active += 1
+                    server.max_concurrency = max(server.max_concurrency, server._active)
+                    server.sizes.append(len(texts))
+                    server.chars.append(sum(len(t) for t in texts))
+                try:
+                    time.sleep(server.latency + server.per_text * len(texts))
+                    if (server.max_inputs and len(texts) > server.max_inputs) or server.poison in texts:
+                        payload, status = {"error": "embedding failed"}, 500
+                    else:
+                        vectors = [[float(len(t)), float(t.count("x")), 1.0] for t in texts]
+                        payload, status = {"model": body["model"], "embeddings": vectors}, 200
+                finally:
+                    with server._lock:
+                        server._active -= 1
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def fake_ollama():
+    servers = []
+
+    def make(**kwargs):
+        server = FakeOllamaServer(**kwargs).start()
+        servers.append(server)
+        return OllamaEmbeddings(model="fake-embed", base_url=server.url).embed_documents, server
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+def expected(text):
+    return [float(len(text)), float(text.count("x")), 1.0]
+
+
+def test_executor_keeps_batches_in_flight_and_grows_them(fake_ollama):
+    embed_fn, server = fake_ollama(latency=0.02)
+    texts = [f"text {i} " + "x" * (i % 7) for i in range(600)]
+    with EmbeddingExecutor(embed_fn, workers=4, batch_size=8, max_batch=64, max_chars=500) as executor:
+        futures = [executor.submit(texts[i : i + 100]) for i in range(0, 600, 100)]
+        results = [f.result(timeout=30) for f in futures]
+
+    assert [v for part in results for v in part] == [expected(t) for t in texts]
+    assert server.max_concurrency > 1
+    # Requests grew past the starting size but never exceeded the character budget.
+    assert max(server.sizes) > 8
+    assert max(server.chars) <= 500
+    assert executor.stats["texts"] == 600
+    assert executor.stats["failed"] == 0
+
+
+def test_executor_splits_batches_the_server_rejects_and_shrinks(fake_ollama):
+    embed_fn, server = fake_ollama(latency=0.0, max_inputs=5)
+    texts = [f"chunk {i}" for i in range(40)]
+    with EmbeddingExecutor(embed_fn, workers=2, batch_size=16, max_chars=10_000) as executor:
+        assert executor.embed(texts) == [expected(t) for t in texts]
+
+    assert executor.stats["failed"] > 0 and executor.stats["split"] > 0
+    assert executor.stats["retried"] == 0
+    # Every text was eventually embedded by a request the server accepted.
+    assert executor.stats["texts"] == 40
+    assert executor.batch_size < 16
+
+
+def test_executor_shrinks_slow_batches_and_fails_only_the_bad_submission(fake_ollama, tmp_path: Path):
+    embed_fn, server = fake_ollama(latency=0.0, per_text=0.01, poison="bad")
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite3")
+    with EmbeddingExecutor(
+        embed_fn, workers=2, cache=cache, batch_size=32, target_latency=0.1, retries=1, backoff=0.01
+    ) as executor:
+        bad = executor.submit(["fine", "bad"])
+        good = executor.submit([f"good {i}" for i in range(60)])
+        assert good.result(timeout=30) == [expected(f"good {i}") for i in range(60)]
+        with pytest.raises(Exception, match="embedding failed"):
+            bad.result(timeout=30)
+        # 32 texts take ~0.32s against a 0.1s target, so batches shrank.
+        assert executor.batch_size < 32
+        assert executor.stats["retried"] == 1
+
+        # Vectors that came back were cached; nothing is sent for them again.
+        sent = len(server.sizes)
+        assert executor.embed(["good 1", "good 2"]) == [expected("good 1"), expected("good 2")]
+        assert len(server.sizes) == sent
+    cache.close()
+
+
+def test_executor_shrinks_once_for_a_bad_text_not_per_split(fake_ollama):
+    embed_fn, server = fake_ollama(latency=0.0, poison="bad")
+    texts = [f"chunk {i}" for i in range(15)] + ["bad"]
+    with EmbeddingExecutor(embed_fn, workers=1, batch_size=16, max_batch=16, retries=0) as executor:
+        with pytest.raises(Exception, match="embedding failed"):
+            executor.embed(texts)
+
+    # The failed request halved the size once; narrowing it down to "bad" (16 -> 8 -> 4 -> 2 -> 1) did not.
+    assert executor.stats["split"] == 4
+    assert executor.batch_size == 8
+
+
+def test_executor_fails_submissions_when_storing_a_batch_raises(tmp_path: Path):
+    class BrokenCache(EmbeddingCache):
+        def put_many(self, model, vectors):
+            raise OSError("disk full")
+
+    cache = BrokenCache(tmp_path / "embeddings.sqlite3")
+    with EmbeddingExecutor(lambda texts: [[1.0] for _ in texts], workers=1, cache=cache) as executor:
+        with pytest.raises(OSError, match="disk full"):
+            executor.submit(["alpha", "beta"]).result(timeout=5)
+        # The worker survived and keeps serving later submissions.
+        with pytest.raises(OSError, match="disk full"):
+            executor.submit(["gamma"]).result(timeout=5)
+    cache.close()
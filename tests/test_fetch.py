@@ -0,0 +1,226 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from fetch.download import DownloadPool, host_allowed
+
+
+class FileServer:
+    """Serves `/files/<name>` (64 KiB each, `/big/<name>` 2 MiB) and `/landing/<n>` pages linking n files."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def base(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server.lock:
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    time.sleep(server.latency)
+                    if self.path.startswith("/landing/"):
+                        n = int(self.path.rsplit("/", 1)[1])
+                        body = " ".join(
+                            f'<a href="{server.base}/files/f{i}.txt">f{i}</a>' for i in range(n)
+                        ).encode()
+                    elif self.path.startswith("/big/"):
+                        body = b"x" * (2 * 1024 * 1024)
+                    else:
+                        body = b"y" * (64 * 1024)
+                finally:
+                    with server.lock:
+                        server.active -= 1
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+def test_host_allowed_matches_domain_and_subdomains():
+    assert host_allowed("https://zenodo.org/records/1/files/a.pdf", ["zenodo.org"])
+    assert host_allowed("https://sandbox.zenodo.org/x", ["zenodo.org"])
+    assert not host_allowed("https://zenodo.org.evil.com/x", ["zenodo.org"])
+
+
+def test_pool_downloads_concurrently_with_per_host_cap(tmp_path: Path, file_server, monkeypatch):
+    import fetch.download as download
+
+    def fake_resolve(landing_url, session=None):
+        rec = landing_url.rsplit("/", 1)[1]
+        return [f"{file_server.base}/files/{rec}_{i}.txt" for i in range(4)]
+
+    monkeypatch.setattr(download, "try_get_zenodo_files", fake_resolve)
+
+    with DownloadPool(tmp_path, workers=8, per_host=3, allowed_domains=["127.0.0.1"], progress=False) as pool:
+        futures = [pool.submit_record(f"rec{n}", f"{file_server.base}/landing/{n}") for n in range(3)]
+        results = [f.result(timeout=10) for f in futures]
+
+    assert [len(r) for r in results] == [4, 4, 4]
+    assert all(p.exists() and p.stat().st_size == 64 * 1024 for r in results for p in r)
+    assert pool.stats["files"] == 12
+    assert file_server.max_active == 3
+
+
+def test_pool_enforces_max_mb_and_allowed_domains(tmp_path: Path, file_server):
+    with DownloadPool(tmp_path, workers=2, max_mb=1, allowed_domains=["127.0.0.1"], progress=False) as pool:
+        assert not pool.fetch(f"{file_server.base}/big/a.bin", tmp_path / "a.bin")
+        assert pool.fetch(f"{file_server.base}/files/b.bin", tmp_path / "b.bin")
+        assert pool.submit_record("rec", "https://example.org/landing/1").result(timeout=5) == []
+        assert not pool.fetch("https://example.org/files/c.bin", tmp_path / "c.bin")
+
+    assert not (tmp_path / "a.bin").exists()
+    assert not list(tmp_path.glob("*.part"))
+    assert pool.stats["too_large"] == 1
+    assert pool.stats["rejected"] == 1
+
+
+class ETagServer:
+    """Serves fixed bodies with ETags and answers If-None-Match with 304."""
+
+    def __init__(self):
+        self.bodies = {"/a.pdf": b"same-bytes" * 1000, "/b.pdf": b"same-bytes" * 1000, "/c.pdf": b"other"}
+        self.full_responses = 0
+        self.not_modified = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def base(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                import hashlib
+
+                body = server.bodies[self.path]
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                server.full_responses += 1
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def etag_server():
+    server = ETagServer()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+def test_file_cache_revalidates_and_stores_bodies_once(tmp_path: Path, etag_server):
+    from fetch.cache import FileCache
+    from fetch.download import download_file
+
+    cache = FileCache(tmp_path)
+    first = tmp_path / "rec1" / "a.pdf"
+    twin = tmp_path / "rec2" / "b.pdf"
+    assert download_file(f"{etag_server.base}/a.pdf", first, cache=cache)
+    assert download_file(f"{etag_server.base}/b.pdf", twin, cache=cache)
+    assert etag_server.full_responses == 2
+    assert cache.stats["deduplicated"] == 1
+    # Identical bodies from different URLs share one blob.
+    assert first.stat().st_ino == twin.stat().st_ino
+    assert len(list((tmp_path / "objects").rglob("*"))) == 2  # one fan-out dir + one blob
+
+    # Re-ingest: a conditional request comes back 304 and the file is relinked from the store.
+    first.unlink()
+    assert download_file(f"{etag_server.base}/a.pdf", first, cache=cache)
+    assert etag_server.full_responses == 2
+    assert etag_server.not_modified == 1
+    assert first.read_bytes() == etag_server.bodies["/a.pdf"]
+    cache.close()
+
+    # Without revalidation a known URL does not touch the network at all.
+    trusting = FileCache(tmp_path, revalidate=False)
+    assert download_file(f"{etag_server.base}/a.pdf", first, cache=trusting)
+    assert etag_server.full_responses == 2 and etag_server.not_modified == 1
+    assert trusting.stats["reused"] == 1
+
+    # Changed upstream content is fetched again.
+    etag_server.bodies["/a.pdf"] = b"new version"
+    revalidating = FileCache(tmp_path)
+    assert download_file(f"{etag_server.base}/a.pdf", first, cache=revalidating)
+    assert first.read_bytes() == b"new version"
+    assert twin.read_bytes() == etag_server.bodies["/b.pdf"]
+
+
+def test_pool_prefers_metadata_file_links_over_scraping(tmp_path: Path, file_server, monkeypatch):
+    import fetch.download as download
+
+    scraped = []
+
+    def fake_resolve(landing_url, session=None):
+        scraped.append(landing_url)
+        return [f"{file_server.base}/files/scraped.txt"]
+
+    monkeypatch.setattr(download, "try_get_zenodo_files", fake_resolve)
+
+    with DownloadPool(tmp_path, workers=4, allowed_domains=["127.0.0.1"], progress=False) as pool:
+        from_meta = pool.submit_record(
+            "rec1", f"{file_server.base}/landing/1", file_urls=[f"{file_server.base}/files/meta.txt"]
+        ).result(timeout=5)
+        fallback = pool.submit_record("rec2", f"{file_server.base}/landing/2").result(timeout=5)
+
+    assert [p.name for p in from_meta] == ["meta.txt"]
+    assert [p.name for p in fallback] == ["scraped.txt"]
+    assert scraped == [f"{file_server.base}/landing/2"]
+    assert pool.stats["from_metadata"] == 1
+    assert pool.stats["scraped"] == 1
+
+
+def test_with_download_param_only_touches_zenodo_links():
+    from fetch.download import with_download_param
+
+    assert with_download_param("https://zenodo.org/records/1/files/a.pdf") == (
+        "https://zenodo.org/records/1/files/a.pdf?download=1"
+    )
+    assert with_download_param("https://example.org/a.pdf") == "https://example.org/a.pdf"
@@ -1,3 +1,7 @@
+import time
+
+import pytest
+
 from harvest import oai_pmh
 
 
@@ -77,3 +81,438 @@ def test_harvest_records_falls_back_to_dc(monkeypatch):
     assert out[0]["id"] == "oai:example:1"
     assert out[0]["subjects"] == "Topic"
     assert out[0]["description"] == "DC desc"
+
+
+def test_iter_records_streams_pages_lazily(monkeypatch):
+    def page_xml(n: int) -> str:
+        return f"""
+        <record xmlns:oai="http://www.openarchives.org/OAI/2.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+          <oai:header><oai:identifier>oai:example:{n}</oai:identifier></oai:header>
+          <oai:metadata><dc:title>T{n}</dc:title></oai:metadata>
+        </record>
+        """
+
+    class Token:
+        def __init__(self, token):
+            self.token = token
+
+    fetched = []
+
+    class FakeIterator:
+        """Mimics Sickle's OAIItemIterator: two records per page, three pages."""
+
+        def __init__(self):
+            self.page = 0
+            self.resumption_token = None
+            self._items = iter(())
+            self._fetch()
+
+        def _fetch(self):
+            fetched.append(self.page)
+            self._items = iter([FakeRecord(page_xml(self.page * 2 + i)) for i in range(2)])
+            self.resumption_token = Token(f"tok{self.page + 1}") if self.page < 2 else None
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            while True:
+                for item in self._items:
+                    return item
+                if self.resumption_token is None:
+                    raise StopIteration
+                self.page += 1
+                self._fetch()
+
+    class FakeSickle:
+        def __init__(self, *_args, **_kwargs):
+            pass
+
+        def ListRecords(self, **_kwargs):
+            return FakeIterator()
+
+    monkeypatch.setattr(oai_pmh, "Sickle", FakeSickle)
+
+    stream = oai_pmh.iter_records(base_url="http://fake", limit=None)
+    it = iter(stream)
+    first = next(it)
+    assert first["id"] == "oai:example:0"
+    assert fetched == [0]
+    assert stream.count == 1
+    assert stream.resumption_token == "tok1"
+
+    rest = list(it)
+    assert [r["title"] for r in rest] == ["T1", "T2", "T3", "T4", "T5"]
+    assert fetched == [0, 1, 2]
+    assert stream.count == 6
+    assert stream.resumption_token is None
+
+
+def test_iter_records_stops_at_limit_without_fetching_next_page(monkeypatch):
+    calls = []
+
+    class FakeList:
+        def __iter__(self):
+            for i in range(5):
+                calls.append(i)
+                yield FakeRecord(
+                    f"""<record xmlns:oai="http://www.openarchives.org/OAI/2.0/">
+                    <oai:header><oai:identifier>oai:x:{i}</oai:identifier></oai:header></record>"""
+                )
+
+    class FakeSickle:
+        def __init__(self, *_args, **_kwargs):
+            pass
+
+        def ListRecords(self, **_kwargs):
+            return iter(FakeList())
+
+    monkeypatch.setattr(oai_pmh, "Sickle", FakeSickle)
+
+    out = list(oai_pmh.iter_records(base_url="http://fake", limit=2))
+    assert [r["id"] for r in out] == ["oai:x:0", "oai:x:1"]
+    assert calls == [0, 1]
+
+
+def test_normalizer_reads_zenodo_wrapped_datacite():
+    from lxml import etree
+
+    from harvest.normalize import get_normalizer, make_normalizer
+
+    xml = """
+    <record xmlns="http://www.openarchives.org/OAI/2.0/">
+      <header><identifier>oai:zenodo.org:42</identifier></header>
+      <metadata>
+        <oai_datacite xmlns="http://schema.datacite.org/oai/oai-1.1/">
+          <payload>
+            <resource xmlns="http://datacite.org/schema/kernel-4">
+              <identifier identifierType="DOI">10.5281/zenodo.42</identifier>
+              <creators>
+                <creator><creatorName>Doe, Jane</creatorName></creator>
+                <creator><creatorName>Roe, Rich</creatorName></creator>
+              </creators>
+              <titles><title>Wrapped Title</title></titles>
+              <subjects><subject>a</subject><subject>b</subject></subjects>
+              <descriptions><description>Abstract</description></descriptions>
+              <publicationYear>2025</publicationYear>
+            </resource>
+          </payload>
+        </oai_datacite>
+      </metadata>
+    </record>
+    """
+    assert get_normalizer("oai_datacite") is not None
+    out = make_normalizer("oai_datacite")(etree.fromstring(xml))
+    assert out["oai_identifier"] == "oai:zenodo.org:42"
+    assert out["id"] == "10.5281/zenodo.42"
+    assert out["title"] == "Wrapped Title"
+    assert out["creators"] == "Doe, Jane; Roe, Rich"
+    assert out["subjects"] == "a; b"
+    assert out["description"] == "Abstract"
+    assert out["date"] == "2025"
+
+
+def test_normalizer_handles_record_without_metadata():
+    from lxml import etree
+
+    from harvest.normalize import make_normalizer
+
+    xml = """
+    <record xmlns="http://www.openarchives.org/OAI/2.0/">
+      <header><identifier>oai:example:9</identifier></header>
+    </record>
+    """
+    out = make_normalizer("marcxml")(etree.fromstring(xml))
+    assert out["id"] == "oai:example:9"
+    assert out["title"] is None
+
+
+def test_normalizer_without_extract_cannot_be_created():
+    from harvest.normalize import Normalizer
+
+    class Incomplete(Normalizer):
+        prefixes = ("marcxml",)
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_iter_records_reports_deleted_records_and_datestamps(monkeypatch):
+    xml = """
+    <record xmlns:oai="http://www.openarchives.org/OAI/2.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+      <oai:header{status}>
+        <oai:identifier>oai:example:{n}</oai:identifier>
+        <oai:datestamp>2025-01-0{n}T00:00:00Z</oai:datestamp>
+      </oai:header>
+      {metadata}
+    </record>
+    """
+    recs = [
+        FakeRecord(xml.format(n=3, status="", metadata="<oai:metadata><dc:title>A</dc:title></oai:metadata>")),
+        FakeRecord(xml.format(n=5, status=' status="deleted"', metadata="")),
+        FakeRecord(xml.format(n=4, status="", metadata="<oai:metadata><dc:title>B</dc:title></oai:metadata>")),
+    ]
+
+    class FakeSickle:
+        def __init__(self, *_args, **_kwargs):
+            pass
+
+        def ListRecords(self, **_kwargs):
+            return iter(recs)
+
+    monkeypatch.setattr(oai_pmh, "Sickle", FakeSickle)
+
+    stream = oai_pmh.iter_records(base_url="http://fake", limit=10)
+    out = list(stream)
+    assert [r["deleted"] for r in out] == [False, True, False]
+    assert out[1]["oai_identifier"] == "oai:example:5"
+    assert out[1]["title"] is None
+    assert stream.exhausted
+    assert stream.latest_datestamp == "2025-01-05T00:00:00Z"
+
+    truncated = oai_pmh.iter_records(base_url="http://fake", limit=1)
+    list(truncated)
+    assert not truncated.exhausted
+
+
+def test_harvest_state_round_trip_and_scope(tmp_path):
+    from harvest.state import HarvestState
+
+    source = {"name": "Zenodo OAI demo", "endpoint": "https://zenodo.org/oai2d", "metadata_prefix": "oai_datacite"}
+    state = HarvestState(tmp_path / "state")
+    assert state.high_water_mark(source) is None
+
+    state.save_high_water_mark(source, "2025-01-05T00:00:00Z")
+    assert HarvestState(tmp_path / "state").high_water_mark(source) == "2025-01-05T00:00:00Z"
+
+    # A mark recorded for another set/prefix must not leak into this harvest.
+    assert state.high_water_mark({**source, "set": "user-foo"}) is None
+
+
+@pytest.mark.parametrize("windows", [1, 3])
+def test_stream_resumes_right_after_a_saved_position(fake_oai_server, windows):
+    kwargs = dict(base_url=fake_oai_server.url, since="2025-01-01", until="2025-01-10", limit=None, windows=windows)
+    everything = [r["oai_identifier"] for r in oai_pmh.iter_records(**kwargs)]
+
+    stream = oai_pmh.iter_records(**kwargs)
+    first = []
+    for rec in stream:
+        first.append(rec["oai_identifier"])
+        # A slow consumer: window workers get well ahead of the record being processed.
+        time.sleep(0.02)
+        if len(first) == 7:  # part-way through the second page (and the first of three windows)
+            time.sleep(0.3)
+            break
+    position = stream.position
+
+    before = fake_oai_server.requests
+    resumed = oai_pmh.iter_records(resume=position, **kwargs)
+    rest = [r["oai_identifier"] for r in resumed]
+    assert first + rest == everything
+    assert resumed.count == 40 and resumed.exhausted
+    if windows == 1:
+        # The resumption token refetches the interrupted page, not the ones before it.
+        assert fake_oai_server.requests - before == 7
+
+
+def test_ingest_checkpoint_tracks_commits_out_of_order(tmp_path):
+    from harvest.state import IngestCheckpoint
+
+    source = {"name": "demo", "endpoint": "https://example.org/oai"}
+    run = {"since": "2025-01-01", "until": None, "limit": 100, "windows": 1}
+    checkpoint = IngestCheckpoint(tmp_path / "state", source, run, interval=3600)
+    for seq in (1, 2, 3, 4):
+        assert checkpoint.begin(seq, {"token": f"t{seq}", "offset": seq, "count": seq}, f"2025-01-0{seq}")
+
+    checkpoint.hold(1)  # record 1 has a chunk batch on its way to Chroma
+    checkpoint.finish(1)
+    checkpoint.finish(2)
+    checkpoint.finish(4)
+    assert checkpoint.watermark == 0  # record 1 is not written yet
+    checkpoint.release(1)
+    assert checkpoint.watermark == 2
+    checkpoint.save()
+
+    # A new process resumes after record 2, skipping record 4, which was committed out of order.
+    resumed = IngestCheckpoint(tmp_path / "state", source, run={})
+    data = resumed.load()
+    resumed.restore(data)
+    assert resumed.run == run
+    assert resumed.position == {"token": "t2", "offset": 2, "count": 2}
+    assert resumed.latest_datestamp == "2025-01-02"
+    assert [resumed.begin(seq, None, None) for seq in (3, 4, 5)] == [True, False, True]
+    resumed.finish(3)
+    resumed.finish(5)
+    assert resumed.watermark == 5
+
+    assert IngestCheckpoint(tmp_path / "state", {**source, "set": "other"}, run).load() is None
+    resumed.clear()
+    assert resumed.load() is None
+
+
+def test_record_store_keeps_latest_version_of_each_record(tmp_path):
+    from harvest.records import RecordStore
+
+    store = RecordStore(tmp_path / "records.sqlite3")
+    rec = {"oai_identifier": "oai:x:1", "id": "10.1/x", "title": "Old title", "datestamp": "2025-01-01"}
+    store.put("demo", rec, [{"path": "10.1_x/file_0.pdf", "sha256": "ab" * 32}])
+    store.put("demo", dict(rec, title="New title", datestamp="2025-01-02"))
+    store.put("other", {"oai_identifier": "oai:y:1", "title": "Ünïcode"})
+    for n in range(2, 7):
+        store.put("demo", {"oai_identifier": f"oai:x:{n}"})
+    store.close()
+
+    reopened = RecordStore(tmp_path / "records.sqlite3")
+    assert reopened.get("oai:x:1").record["title"] == "New title"
+    assert reopened.get("oai:x:1").files == []
+    assert reopened.count() == 7 and reopened.count("demo") == 6
+    # Paging through the store yields every record once, in identifier order.
+    assert [r.record["oai_identifier"] for r in reopened.iter_records("demo", page_size=2)] == [
+        f"oai:x:{n}" for n in range(1, 7)
+    ]
+    assert [r.record["title"] for r in reopened.iter_records("other")] == ["Ünïcode"]
+
+    reopened.remove("oai:x:1")
+    reopened.remove("oai:missing")
+    assert reopened.get("oai:x:1") is None
+    assert reopened.stats == {"stored": 0, "removed": 1}
+
+
+def test_split_date_range_produces_contiguous_windows():
+    windows = oai_pmh.split_date_range("2025-01-01", "2025-01-10", 4)
+    assert windows[0][0] == "2025-01-01"
+    assert windows[-1][1] == "2025-01-10"
+    assert len(windows) == 4
+
+    fine = oai_pmh.split_date_range("2025-01-01T12:00:00Z", "2025-01-02", 3)
+    assert fine[0] == ("2025-01-01T12:00:00Z", "2025-01-01T23:59:59Z")
+    assert fine[-1][1] == "2025-01-02T23:59:59Z"
+
+    assert oai_pmh.split_date_range("2025-01-01", "2025-01-01", 8) == [("2025-01-01", "2025-01-01")]
+
+
+def test_partitioned_harvest_matches_sequential_and_runs_concurrently(fake_oai_server):
+    sequential = oai_pmh.harvest_records(
+        base_url=fake_oai_server.url, since="2025-01-01", until="2025-01-10", limit=None
+    )
+    assert fake_oai_server.max_concurrency == 1
+
+    stream = oai_pmh.iter_records(
+        base_url=fake_oai_server.url,
+        since="2025-01-01",
+        until="2025-01-10",
+        limit=None,
+        windows=4,
+        workers=4,
+    )
+    partitioned = list(stream)
+
+    assert [r["oai_identifier"] for r in partitioned] == [r["oai_identifier"] for r in sequential]
+    assert len(partitioned) == 40
+    assert stream.exhausted
+    assert stream.latest_datestamp == sequential[-1]["datestamp"]
+    assert fake_oai_server.max_concurrency > 1
+
+
+def test_partitioned_harvest_honours_limit_and_empty_windows(fake_oai_server):
+    # The fake catalogue ends on 2025-01-10, so the later windows match nothing.
+    stream = oai_pmh.iter_records(
+        base_url=fake_oai_server.url,
+        since="2025-01-01",
+        until="2025-02-28",
+        limit=None,
+        windows=6,
+        workers=3,
+    )
+    assert len(list(stream)) == 40
+    assert stream.exhausted
+
+    limited = oai_pmh.iter_records(
+        base_url=fake_oai_server.url, since="2025-01-01", until="2025-01-10", limit=7, windows=3
+    )
+    assert len(list(limited)) == 7
+    assert not limited.exhausted
+
+
+def test_partitioned_harvest_drops_duplicates_across_windows(monkeypatch):
+    xml = """
+    <record xmlns:oai="http://www.openarchives.org/OAI/2.0/">
+      <oai:header><oai:identifier>oai:x:{n}</oai:identifier><oai:datestamp>{stamp}</oai:datestamp></oai:header>
+    </record>
+    """
+    # Record 2 is stamped on the first window's last day and listed again by the second window;
+    # record 1 was modified during the harvest and legitimately shows up in both.
+    pages = {
+        "2025-01-01": [(1, "2025-01-01T05:00:00Z"), (2, "2025-01-02T23:00:00Z")],
+        "2025-01-03": [(2, "2025-01-02T23:00:00Z"), (3, "2025-01-03T08:00:00Z"), (1, "2025-01-04T09:00:00Z")],
+    }
+
+    class FakeSickle:
+        def __init__(self, *_args, **_kwargs):
+            pass
+
+        def ListRecords(self, **kwargs):
+            return iter([FakeRecord(xml.format(n=n, stamp=stamp)) for n, stamp in pages[kwargs["from"]]])
+
+    monkeypatch.setattr(oai_pmh, "Sickle", FakeSickle)
+
+    def harvest(resume=None):
+        return oai_pmh.iter_records(
+            base_url="http://fake", since="2025-01-01", until="2025-01-04", limit=None, windows=2, resume=resume
+        )
+
+    stream = harvest()
+    ids, positions = [], []
+    for rec in stream:
+        ids.append(rec["id"])
+        positions.append(stream.position)
+    assert ids == ["oai:x:1", "oai:x:2", "oai:x:3", "oai:x:1"]
+    assert stream.duplicates == 1
+    # Only the boundary record is tracked, and only until the second window is done with it.
+    assert [p["boundary"] for p in positions[:2]] == [[], ["oai:x:2"]]
+    assert positions[-1]["carried"] == ["oai:x:2"] and positions[-1]["boundary"] == []
+
+    # Resuming after the first window's last record still drops the repeat.
+    resumed = harvest(resume=positions[1])
+    assert [r["id"] for r in resumed] == ["oai:x:3", "oai:x:1"]
+    assert resumed.duplicates == 1
+
+
+def test_normalizers_carry_file_links_from_metadata():
+    from lxml import etree
+
+    from harvest.normalize import make_normalizer
+
+    datacite = """
+    <record xmlns:oai="http://www.openarchives.org/OAI/2.0/" xmlns:d="http://datacite.org/schema/kernel-4">
+      <oai:header><oai:identifier>oai:zenodo.org:7</oai:identifier></oai:header>
+      <oai:metadata>
+        <d:resource>
+          <d:identifier identifierType="DOI">10.5281/zenodo.7</d:identifier>
+          <d:alternateIdentifiers>
+            <d:alternateIdentifier alternateIdentifierType="url">https://zenodo.org/records/7</d:alternateIdentifier>
+          </d:alternateIdentifiers>
+          <d:relatedIdentifiers>
+            <d:relatedIdentifier relatedIdentifierType="URL" relationType="HasPart">https://zenodo.org/records/7/files/report.pdf</d:relatedIdentifier>
+            <d:relatedIdentifier relatedIdentifierType="DOI" relationType="IsVersionOf">10.5281/zenodo.6</d:relatedIdentifier>
+          </d:relatedIdentifiers>
+        </d:resource>
+      </oai:metadata>
+    </record>
+    """
+    out = make_normalizer("oai_datacite")(etree.fromstring(datacite))
+    assert out["url"] == "https://zenodo.org/records/7"
+    assert out["files"] == ["https://zenodo.org/records/7/files/report.pdf"]
+
+    dc = """
+    <record xmlns:oai="http://www.openarchives.org/OAI/2.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+      <oai:header><oai:identifier>oai:example:1</oai:identifier></oai:header>
+      <oai:metadata>
+        <dc:identifier>https://example.org/dc/1</dc:identifier>
+        <dc:relation>https://example.org/dc/1/paper.PDF</dc:relation>
+      </oai:metadata>
+    </record>
+    """
+    out = make_normalizer("oai_dc")(etree.fromstring(dc))
+    assert out["url"] == "https://example.org/dc/1"
+    assert out["files"] == ["https://example.org/dc/1/paper.PDF"]
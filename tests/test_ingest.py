@@ -0,0 +1,92 @@
+import argparse
+import functools
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+import ingest
+from index import store
+from index.embed import EmbeddingExecutor
+
+DESCRIPTION = (
+    "Sea surface temperature and salinity measured hourly by the coastal buoy network between 2010 and 2015. "
+    "Values were quality controlled against ship-based profiles, flagged where sensors drifted, and gap filled "
+    "with a seasonal model."
+)
+
+
+class FakeRecordStream:
+    """Stands in for the OAI-PMH record stream ingest harvests from."""
+
+    def __init__(self, records):
+        self.records = records
+        self.count = 0
+        self.position = None
+        self.resumption_token = None
+        self.latest_datestamp = None
+        self.exhausted = False
+
+    def __iter__(self):
+        for rec in self.records:
+            self.count += 1
+            self.position = {"token": None, "offset": self.count, "count": self.count}
+            yield rec
+        self.exhausted = True
+
+
+def test_near_duplicates_of_a_deleted_record_are_stored_in_its_place(tmp_path: Path, monkeypatch):
+    for name in ("RAW_DIR", "PARSED_DIR", "STATE_DIR"):
+        monkeypatch.setattr(ingest, name, tmp_path / name.lower())
+    for name in ("EMBED_CACHE_PATH", "DEDUP_PATH", "RECORDS_PATH"):
+        monkeypatch.setattr(ingest, name, tmp_path / f"{name.lower()}.sqlite3")
+    monkeypatch.setattr(store, "CHROMA_DIR", tmp_path / "chroma")
+    monkeypatch.setattr(
+        ingest,
+        "EmbeddingExecutor",
+        functools.partial(EmbeddingExecutor, embed_fn=lambda texts: [[float(len(t)), 1.0] for t in texts]),
+    )
+    harvests = []
+    monkeypatch.setattr(ingest, "iter_records", lambda **_: FakeRecordStream(harvests.pop(0)))
+
+    args = argparse.Namespace(
+        since=None,
+        until=None,
+        limit=None,
+        windows=1,
+        full=False,
+        resume=False,
+        all_sources=False,
+        harvest_workers=1,
+        download_workers=1,
+        per_host=1,
+        parse_workers=1,
+        parse_timeout=30.0,
+        embed_workers=1,
+        chunk_size=900,
+        chunk_overlap=150,
+        chunk_unit="chars",
+        dedup_threshold=0.9,
+        trust_cache=False,
+    )
+    source = {"name": "demo", "endpoint": "https://example.org/oai"}
+    coll = store.get_collection("demo")
+
+    # Two versions of the same dataset: the second one's text is only recorded against the first's.
+    record = {"title": "Buoy network", "description": DESCRIPTION}
+    harvests.append(
+        [
+            {**record, "oai_identifier": "oai:1", "id": "r1", "datestamp": "2025-01-01T00:00:00Z"},
+            {**record, "oai_identifier": "oai:2", "id": "r2", "datestamp": "2025-01-02T00:00:00Z"},
+        ]
+    )
+    ingest.ingest_source(args, source, coll)
+    assert coll.get()["ids"] == ["r1:metadata:0"]
+
+    # The first version is withdrawn upstream; the second one's chunk takes its place.
+    harvests.append([{"oai_identifier": "oai:1", "deleted": True, "datestamp": "2025-01-03T00:00:00Z"}])
+    ingest.ingest_source(args, source, coll)
+    got = coll.get()
+    assert got["ids"] == ["r2:metadata:0"]
+    assert DESCRIPTION in got["documents"][0] and got["metadatas"][0]["record_id"] == "r2"
@@ -1,4 +1,5 @@
 from pathlib import Path
+
 from parse.html import extract_html_text
 from parse.pdf import extract_pdf_text
 from pypdf import PdfWriter
@@ -17,6 +18,38 @@ def test_extract_html_text_removes_scripts_and_empty_lines():
     assert "\n\n" not in text
 
 
+def test_extract_html_text_drops_boilerplate_and_keeps_blocks():
+    html = """
+    <html><body>
+      <nav><a href="/">Home</a><a href="/about">About</a></nav>
+      <header><div class="logo">Site name</div></header>
+      <div role="navigation">Breadcrumbs</div>
+      <main>
+        <article><header><h1>Coastal sea level</h1><p>By A. Author</p></header>
+        <h2>Results</h2>
+        <p>Sea level rose by <b>3&nbsp;mm</b> per year, see <a href="#t1">Table 1</a>.</p>
+        <ul><li>first</li><li>second</li></ul>
+        <p>Line one<br>line two</p>
+        <footer>Published 2024</footer></article>
+      </main>
+      <form><label>Search</label><input name="q"></form>
+      <footer>Copyright notice</footer>
+    </body></html>
+    """
+    assert extract_html_text(html).splitlines() == [
+        "Coastal sea level",
+        "By A. Author",
+        "Results",
+        "Sea level rose by 3 mm per year, see Table 1.",
+        "first",
+        "second",
+        "Line one",
+        "line two",
+        "Published 2024",
+    ]
+    assert extract_html_text("  ") == ""
+
+
 def test_extract_pdf_text_reads_simple_pdf(tmp_path: Path):
     pdf_path = tmp_path / "sample.pdf"
     writer = PdfWriter()
@@ -26,3 +59,71 @@ def test_extract_pdf_text_reads_simple_pdf(tmp_path: Path):
 
     text = extract_pdf_text(pdf_path)
     assert isinstance(text, str)
+
+
+def test_parse_pool_splits_pdf_into_page_ranges(tmp_path: Path, make_text_pdf):
+    from parse.pool import ParsePool
+
+    pdf_path = make_text_pdf(tmp_path / "report.pdf", [f"Page number {i}" for i in range(7)])
+    html_path = tmp_path / "page.html"
+    html_path.write_text("<html><body><p>Hello</p><script>x()</script></body></html>")
+
+    with ParsePool(workers=2, pages_per_task=2) as pool:
+        pages = pool.parse(pdf_path)
+        html = pool.parse(html_path)
+
+    assert pages == [f"Page number {i}" for i in range(7)]
+    assert "\n".join(pages) == extract_pdf_text(pdf_path)
+    assert html == ["Hello"]
+    assert pool.stats["parsed"] == 2
+
+
+def test_parse_pool_counts_failures_and_timeouts(tmp_path: Path, monkeypatch):
+    import parse.pool as pool_mod
+
+    bad_pdf = tmp_path / "broken.pdf"
+    bad_pdf.write_bytes(b"not a pdf")
+    slow = tmp_path / "slow.txt"
+    slow.write_text("zzz")
+    fine = tmp_path / "fine.txt"
+    fine.write_text("plain text")
+
+    monkeypatch.setattr(pool_mod, "extract_file_pages", _sleep_on_slow_files)
+
+    with pool_mod.ParsePool(workers=2, timeout=1.0) as pool:
+        assert pool.parse(bad_pdf) is None
+        assert pool.parse(slow) is None
+        # The pool is replaced after a timeout and keeps serving later files.
+        assert pool.parse(fine) == ["plain text"]
+
+    assert pool.stats == {"parsed": 1, "failed": 1, "timed_out": 1, "retried": 0}
+
+
+def _sleep_on_slow_files(path: Path) -> list:
+    import time
+
+    if path.name.startswith("slow"):
+        time.sleep(60)
+    return [path.read_text()]
+
+
+def test_parse_pool_reuses_cached_text(tmp_path: Path, make_text_pdf):
+    from parse.cache import PARSER_VERSION, ParsedTextCache
+    from parse.pool import ParsePool
+
+    pdf_path = make_text_pdf(tmp_path / "report.pdf", ["Cached page", "Second page"])
+    copy = tmp_path / "renamed.pdf"
+    copy.write_bytes(pdf_path.read_bytes())
+
+    cache = ParsedTextCache(tmp_path / "parsed")
+    with ParsePool(workers=1, cache=cache) as pool:
+        first = pool.parse(pdf_path)
+        second = pool.parse(copy)
+    assert first == second == ["Cached page", "Second page"]
+    assert pool.stats["parsed"] == 1
+    assert cache.stats == {"hits": 1, "stored": 1}
+    assert len(list((tmp_path / "parsed").rglob("*.txt.gz"))) == 1
+
+    # A new parser version does not see text cached by the old one.
+    newer = ParsedTextCache(tmp_path / "parsed", version=PARSER_VERSION + 1)
+    assert newer.get(newer.key(pdf_path)) is None
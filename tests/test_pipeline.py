@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Pipeline, Stage
+
+
+def test_pipeline_runs_stages_concurrently_and_flushes_on_close():
+    results = []
+    batch = []
+
+    def slow_double(x):
+        time.sleep(0.05)
+        return [x * 2]
+
+    def slow_batch(x):
+        time.sleep(0.05)
+        batch.append(x)
+        if len(batch) == 3:
+            out = [list(batch)]
+            batch.clear()
+            return out
+        return None
+
+    def flush():
+        return [list(batch)] if batch else None
+
+    pipeline = Pipeline(
+        range(10),
+        [
+            Stage("double", slow_double, workers=2),
+            Stage("batch", slow_batch, on_close=flush),
+            Stage("collect", results.append),
+        ],
+        progress=False,
+    )
+    started = time.monotonic()
+    pipeline.run()
+    elapsed = time.monotonic() - started
+
+    assert sorted(x for b in results for x in b) == [x * 2 for x in range(10)]
+    assert sorted(len(b) for b in results) == [1, 3, 3, 3]
+    # Serial would take 10 * (0.05 + 0.05) = 1.0s; overlapping stages are bound by the slowest one.
+    assert elapsed < 0.85
+    assert [s.stats["in"] for s in pipeline.stages] == [10, 10, 4]
+    assert pipeline.source_count == 10
+    assert len(pipeline.summary()) == 4
+
+
+def test_pipeline_bounds_queues_for_backpressure():
+    produced = []
+    gate = threading.Event()
+
+    def source():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    def blocked(x):
+        gate.wait()
+        return None
+
+    pipeline = Pipeline(source(), [Stage("blocked", blocked, workers=1, queue_size=5)], progress=False)
+    runner = threading.Thread(target=pipeline.run)
+    runner.start()
+    time.sleep(0.3)
+    # One item in the worker, five queued, one waiting to be put.
+    assert len(produced) <= 7
+    gate.set()
+    runner.join(timeout=10)
+    assert len(produced) == 100
+
+
+def test_pipeline_reraises_stage_errors():
+    def boom(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return [x]
+
+    pipeline = Pipeline(range(1000), [Stage("boom", boom, workers=2), Stage("sink", lambda x: None)], progress=False)
+    with pytest.raises(ValueError, match="bad item"):
+        pipeline.run()
@@ -15,7 +15,7 @@ from app.rag.langchain_rag import RagHit
 
 def test_rag_endpoint_uses_langchain_pipeline(monkeypatch):
     class FakeRag:
-        def invoke(self, question: str, k: int | None = None):
+        def invoke(self, question: str, k: int | None = None, use_cache: bool = True):
             meta = {"title": "T", "record_id": "1", "url": "u", "label": "metadata", "chunk": 0}
             return "answer", [RagHit(text="ctx", score=0.9, metadata=meta)]
 
@@ -41,3 +41,325 @@ def test_rag_endpoint_returns_503_when_pipeline_missing(monkeypatch):
     resp = client.post("/rag", json={"query": "hello", "k": 2})
     assert resp.status_code == 503
     assert resp.json()["detail"].startswith("RAG pipeline unavailable")
+
+
+def test_rag_endpoint_returns_page_range_for_pdf_chunks(monkeypatch):
+    class FakeRag:
+        def invoke(self, question: str, k: int | None = None, use_cache: bool = True):
+            meta = {"title": "T", "record_id": "1", "label": "report.pdf", "chunk": 3, "page_start": 4, "page_end": 5}
+            return "answer", [RagHit(text="ctx", score=0.5, metadata=meta)]
+
+    monkeypatch.setattr("app.api.main.rag_pipeline", FakeRag())
+
+    resp = TestClient(app).post("/rag", json={"query": "hello"})
+    source = resp.json()["contexts"][0]["source"]
+    assert (source["page_start"], source["page_end"]) == (4, 5)
+
+
+def test_context_headers_cite_pages():
+    from langchain_core.documents import Document
+
+    from app.rag.langchain_rag import _format_documents
+
+    docs = [
+        Document(page_content="a", metadata={"title": "Report", "label": "r.pdf", "chunk": 0, "page_start": 2, "page_end": 2}),
+        Document(page_content="b", metadata={"title": "Report", "label": "r.pdf", "chunk": 1, "page_start": 2, "page_end": 3}),
+        Document(page_content="c", metadata={"title": "Record", "label": "metadata", "chunk": 0}),
+    ]
+    headers = [part.splitlines()[0] for part in _format_documents(docs).split("\n\n")]
+    assert headers == [
+        "[1] Report · r.pdf · chunk 0 · p. 2",
+        "[2] Report · r.pdf · chunk 1 · pp. 2-3",
+        "[3] Record · metadata · chunk 0",
+    ]
+    assert RagHit(text="b", score=0.1, metadata=docs[1].metadata).pages == "pp. 2-3"
+
+
+def test_rag_endpoint_awaits_async_pipeline_and_sheds_excess_load(monkeypatch):
+    import asyncio
+
+    import httpx
+
+    from app.api.limiter import ConcurrencyLimiter
+
+    class SlowAsyncRag:
+        active = peak = 0
+
+        async def ainvoke(self, question: str, k: int | None = None, use_cache: bool = True):
+            SlowAsyncRag.active += 1
+            SlowAsyncRag.peak = max(SlowAsyncRag.peak, SlowAsyncRag.active)
+            await asyncio.sleep(0.2)
+            SlowAsyncRag.active -= 1
+            return f"answer to {question}", []
+
+    # One generation at a time, one more request may wait; the rest are turned away.
+    limiter = ConcurrencyLimiter(1, max_queue=1, queue_timeout=5)
+    monkeypatch.setattr("app.api.main.rag_pipeline", SlowAsyncRag())
+    monkeypatch.setattr("app.api.main.rag_limiter", limiter)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/rag", json={"query": f"q{i}"}) for i in range(4)))
+
+    responses = asyncio.run(burst())
+    assert sorted(r.status_code for r in responses) == [200, 200, 429, 429]
+    assert {r.json()["answer"] for r in responses if r.status_code == 200} <= {f"answer to q{i}" for i in range(4)}
+    assert all(r.headers["retry-after"] == "1" for r in responses if r.status_code == 429)
+    assert SlowAsyncRag.peak == 1
+    assert limiter.snapshot() == {"limit": 1, "in_flight": 0, "waiting": 0, "admitted": 2, "rejected": 2, "peak_in_flight": 1}
+
+
+def test_queued_requests_time_out_with_overloaded():
+    import asyncio
+
+    from app.api.limiter import ConcurrencyLimiter, Overloaded
+
+    limiter = ConcurrencyLimiter(1, max_queue=5, queue_timeout=0.05)
+
+    async def hold(seconds):
+        async with limiter.slot():
+            await asyncio.sleep(seconds)
+
+    async def scenario():
+        return await asyncio.gather(hold(0.3), hold(0), return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    assert first is None and isinstance(second, Overloaded)
+
+
+def test_langchain_rag_builds_chain_once_and_answers_async(monkeypatch):
+    import asyncio
+
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from app.rag import langchain_rag
+
+    doc = Document(page_content="Buoys measure salinity.", metadata={"title": "Buoys", "chunk": 0})
+
+    class FakeVectorStore:
+        def similarity_search_by_vector_with_relevance_scores(self, embedding, k):
+            return [(doc, 0.2)]
+
+    monkeypatch.setattr(langchain_rag, "_build_vectorstore", lambda name=None, embeddings=None: FakeVectorStore())
+    monkeypatch.setattr(langchain_rag, "OllamaEmbeddings", lambda **_: CountingEmbeddings())
+    monkeypatch.setattr(langchain_rag, "ChatOllama", lambda **_: FakeListChatModel(responses=["Salinity [1]."] * 3))
+
+    rag = langchain_rag.LangChainRAG(top_k=1)
+    chain = rag.chain
+    answer, hits = asyncio.run(rag.ainvoke("What do buoys measure?"))
+    assert answer == "Salinity [1]."
+    assert [(h.text, h.score) for h in hits] == [("Buoys measure salinity.", pytest.approx(0.8))]
+    assert rag.invoke("What do buoys  measure?")[0] == "Salinity [1]."
+    assert rag.chain is chain
+    assert rag.query_embeddings.inner.calls == ["What do buoys measure?"]
+
+    async def collect():
+        return [event async for event in rag.astream("Streaming?")]
+
+    events = asyncio.run(collect())
+    assert events[0][0] == "contexts" and events[0][1][0].text == "Buoys measure salinity."
+    assert len(events) > 2 and "".join(text for kind, text in events[1:] if kind == "token") == "Salinity [1]."
+
+
+def test_search_by_vector_scores_match_langchain_relevance_scores(tmp_path):
+    import chromadb
+    from chromadb.config import Settings
+    from langchain_chroma import Chroma
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from app.rag.langchain_rag import LangChainRAG
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    client = chromadb.PersistentClient(path=str(tmp_path), settings=Settings(anonymized_telemetry=False))
+    client.get_or_create_collection("catalogue", metadata={"hnsw:space": "cosine"})
+    vectorstore = Chroma(client=client, collection_name="catalogue", embedding_function=embeddings)
+    vectorstore.add_texts(["Buoys measure salinity.", "Gliders profile temperature.", "Seabird colonies."])
+
+    question = "What do buoys measure?"
+    expected = vectorstore.similarity_search_with_relevance_scores(question, k=3)
+    found = LangChainRAG._search_by_vector(vectorstore, embeddings.embed_query(question), 3)
+    assert [doc.page_content for doc, _ in found] == [doc.page_content for doc, _ in expected]
+    assert [score for _, score in found] == pytest.approx([score for _, score in expected])
+
+
+def test_answer_cache_serves_repeats_until_bypassed_or_collection_changes(monkeypatch, tmp_path):
+    import asyncio
+
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from app.index.store import CollectionAlias
+    from app.rag import langchain_rag
+
+    doc = Document(page_content="Buoys measure salinity.", metadata={"title": "Buoys"})
+    searches = []
+
+    class FakeVectorStore:
+        def similarity_search_by_vector_with_relevance_scores(self, embedding, k):
+            searches.append(k)
+            return [(doc, 0.2)]
+
+    monkeypatch.setattr(langchain_rag, "_build_vectorstore", lambda name=None, embeddings=None: FakeVectorStore())
+    monkeypatch.setattr(langchain_rag, "OllamaEmbeddings", lambda **_: CountingEmbeddings())
+    monkeypatch.setattr(
+        langchain_rag, "ChatOllama", lambda **_: FakeListChatModel(responses=["one", "two", "three", "four", "five"])
+    )
+    rag = langchain_rag.LangChainRAG(top_k=2)
+    rag.alias = CollectionAlias("catalogue", root=tmp_path)
+
+    assert rag.invoke("What do buoys measure?")[0] == "one"
+    answer, hits = asyncio.run(rag.ainvoke(" What do buoys  measure?"))
+    assert answer == "one" and hits[0].text == "Buoys measure salinity."
+    assert searches == [2]
+
+    # A different k, or a caller asking to bypass the cache, generates again; the fresh answer is stored.
+    assert rag.invoke("What do buoys measure?", k=3)[0] == "two"
+    assert rag.invoke("What do buoys measure?", use_cache=False)[0] == "three"
+    assert rag.invoke("What do buoys measure?")[0] == "three"
+
+    async def collect():
+        return [event async for event in rag.astream("What do buoys measure?")]
+
+    events = asyncio.run(collect())
+    assert [kind for kind, _ in events] == ["contexts", "token"] and events[1][1] == "three"
+
+    # Ingest writing to the collection makes every cached answer unreachable.
+    before = rag._version_stamp()
+    rag.alias.bump_version()
+    assert rag.invoke("What do buoys measure?")[0] == "four"
+    assert rag.invoke("What do buoys measure?")[0] == "four"
+    assert searches == [2, 3, 2, 2]
+
+    # A request that started before the change finishes late: its answer is not stored, and nothing else is lost.
+    rag.answers.put("What do buoys measure?", 2, before, ("stale", []))
+    assert rag.answers.get("What do buoys measure?", 2, before)[0] == "three"
+    assert rag.invoke("What do buoys measure?")[0] == "four"
+    snap = rag.answers.snapshot()
+    assert snap["stale"] == 1 and snap["entries"] == 3
+
+
+def test_rag_request_flag_bypasses_answer_cache(monkeypatch):
+    calls = []
+
+    class FakeRag:
+        async def ainvoke(self, question: str, k: int | None = None, use_cache: bool = True):
+            calls.append(use_cache)
+            return "ok", []
+
+    monkeypatch.setattr("app.api.main.rag_pipeline", FakeRag())
+    client = TestClient(app)
+    client.post("/rag", json={"query": "Salinity?"})
+    client.post("/rag", json={"query": "Salinity?", "no_cache": True})
+    assert calls == [True, False]
+
+
+class CountingEmbeddings:
+    """Stands in for OllamaEmbeddings, counting the queries that reach it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [float(len(text)), 1.0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+def test_query_embedding_cache_serves_repeats_until_expired_or_evicted():
+    from app.rag.query_cache import QueryEmbeddingCache
+
+    now = [0.0]
+    inner = CountingEmbeddings()
+    cache = QueryEmbeddingCache(inner, "nomic-embed-text", max_entries=2, ttl=60, clock=lambda: now[0])
+
+    first = cache.embed_query("sea  surface temperature")
+    assert cache.embed_query(" sea surface\ttemperature ") == first
+    assert inner.calls == ["sea  surface temperature"]
+
+    cache.embed_query("salinity")
+    cache.embed_query("sea surface temperature")  # most recently used again
+    cache.embed_query("chlorophyll")  # evicts "salinity"
+    cache.embed_query("salinity")
+    assert inner.calls[1:] == ["salinity", "chlorophyll", "salinity"]
+
+    now[0] = 61.0
+    cache.embed_query("salinity")
+    assert len(inner.calls) == 5
+    snap = cache.snapshot()
+    assert (snap["hits"], snap["misses"], snap["expired"], snap["evicted"]) == (2, 5, 1, 2)
+    assert snap["entries"] == 2
+
+    other_model = QueryEmbeddingCache(inner, "mxbai-embed-large", max_entries=0)
+    other_model.embed_query("salinity")
+    other_model.embed_query("salinity")
+    assert len(inner.calls) == 7 and other_model.snapshot()["entries"] == 0
+
+
+def _sse_events(body: str):
+    import json
+
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_rag_stream_sends_contexts_then_tokens_and_records_first_token_latency(monkeypatch):
+    import asyncio
+
+    from app.api import main
+    from app.api.metrics import LatencyStats
+
+    class StreamingRag:
+        async def astream(self, question: str, k: int | None = None, use_cache: bool = True):
+            meta = {"title": "T", "record_id": "1", "label": "report.pdf", "chunk": 0, "page_start": 2, "page_end": 2}
+            yield "contexts", [RagHit(text="ctx", score=0.7, metadata=meta)]
+            for token in ["Buoys ", "measure ", "salinity [1]."]:
+                await asyncio.sleep(0.01)
+                yield "token", token
+
+    monkeypatch.setattr(main, "rag_pipeline", StreamingRag())
+    monkeypatch.setattr(main, "latency", {name: LatencyStats() for name in main.latency})
+
+    resp = TestClient(app).post("/rag/stream", json={"query": "hello", "k": 1})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(resp.text)
+    assert [kind for kind, _ in events] == ["contexts", "token", "token", "token", "done"]
+    assert events[0][1]["contexts"][0]["source"]["page_start"] == 2
+    done = events[-1][1]
+    assert done["answer"] == "Buoys measure salinity [1]."
+    assert 0 < done["time_to_first_token"] <= done["total_time"]
+
+    metrics = TestClient(app).get("/metrics").json()
+    assert metrics["latency_seconds"]["rag_stream_first_token"]["count"] == 1
+    assert metrics["latency_seconds"]["rag_stream_total"]["p50"] >= metrics["latency_seconds"]["rag_stream_first_token"]["p50"]
+    assert metrics["rag_limiter"]["in_flight"] == 0
+
+
+def test_rag_stream_reports_errors_in_band_and_falls_back_to_invoke(monkeypatch):
+    from app.api import main
+
+    class BrokenStream:
+        async def astream(self, question: str, k: int | None = None, use_cache: bool = True):
+            yield "contexts", []
+            raise RuntimeError("ollama went away")
+
+    monkeypatch.setattr(main, "rag_pipeline", BrokenStream())
+    events = _sse_events(TestClient(app).post("/rag/stream", json={"query": "hello"}).text)
+    assert [kind for kind, _ in events] == ["contexts", "error"]
+    assert main.rag_limiter.in_flight == 0
+
+    class InvokeOnly:
+        def invoke(self, question: str, k: int | None = None, use_cache: bool = True):
+            return "whole answer", []
+
+    monkeypatch.setattr(main, "rag_pipeline", InvokeOnly())
+    events = _sse_events(TestClient(app).post("/rag/stream", json={"query": "hello"}).text)
+    assert [kind for kind, _ in events] == ["contexts", "token", "done"]
+    assert events[-1][1]["answer"] == "whole answer"
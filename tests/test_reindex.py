@@ -0,0 +1,100 @@
+import argparse
+import functools
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+import reindex
+from harvest.records import RecordStore
+from index.embed import EmbeddingExecutor
+from index.store import COLLECTION
+from parse.cache import ParsedTextCache, file_sha256
+
+REPORT = " ".join(f"Buoy {i} logged {i * 37 % 101} profiles near station {i % 7} in season {i % 4}." for i in range(40))
+
+
+class FakeCollection:
+    def __init__(self):
+        self.chunks = {}
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        for doc_id, text, vector, meta in zip(ids, documents, embeddings, metadatas):
+            self.chunks[doc_id] = (text, vector, meta)
+
+
+def test_reindex_rebuilds_collection_from_local_records(tmp_path: Path, monkeypatch):
+    raw, parsed_dir = tmp_path / "raw", tmp_path / "parsed"
+    for name, value in {
+        "DATA_DIR": tmp_path,
+        "RAW_DIR": raw,
+        "PARSED_DIR": parsed_dir,
+        "EMBED_CACHE_PATH": tmp_path / "embeddings.sqlite3",
+        "DEDUP_PATH": tmp_path / "dedup.sqlite3",
+    }.items():
+        monkeypatch.setattr(reindex, name, value)
+    embedded = []
+
+    def fake_embed(texts):
+        embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(reindex, "EmbeddingExecutor", functools.partial(EmbeddingExecutor, embed_fn=fake_embed))
+
+    # Record 1's file is gone from disk but its text is in the parsed-text cache.
+    (raw / "r1").mkdir(parents=True)
+    cached = raw / "r1" / "report.txt"
+    cached.write_text(REPORT)
+    ParsedTextCache(parsed_dir).put(ParsedTextCache(parsed_dir).key(cached), [REPORT])
+    cached_sha = file_sha256(cached)
+    cached.unlink()
+    # Record 2's file was never parsed (or was parsed by an older parser) and is parsed from the local copy.
+    (raw / "r2").mkdir()
+    local = raw / "r2" / "notes.txt"
+    local.write_text(REPORT + " Processing notes follow in the appendix.")
+
+    store = RecordStore(tmp_path / "records.sqlite3")
+    store.put("demo", {"oai_identifier": "oai:1", "id": "r1", "title": "One"}, [{"path": "r1/report.txt", "sha256": cached_sha}])
+    store.put("demo", {"oai_identifier": "oai:2", "id": "r2", "title": "Two"}, [{"path": "r2/notes.txt", "sha256": file_sha256(local)}])
+    store.put("demo", {"oai_identifier": "oai:3", "title": "Metadata only"})
+
+    args = argparse.Namespace(
+        collection=COLLECTION,
+        chunk_size=300,
+        chunk_overlap=30,
+        chunk_unit="chars",
+        # One worker per stage keeps records in identifier order, so record 1 holds the canonical chunks.
+        chunk_workers=1,
+        load_workers=1,
+        parse_workers=1,
+        parse_timeout=30.0,
+        embed_workers=2,
+        dedup_threshold=0.9,
+    )
+    coll = FakeCollection()
+    reindex.reindex(args, store, coll)
+
+    by_label = {}
+    for doc_id, (text, _, meta) in coll.chunks.items():
+        assert len(text) <= 300
+        by_label.setdefault(meta["label"], []).append(doc_id)
+    assert sorted(by_label["metadata"]) == ["oai:3:metadata:0", "r1:metadata:0", "r2:metadata:0"]
+    assert len(by_label["report.txt"]) > 3
+    # Record 2's notes repeat record 1's report; only the chunk with the added sentence is stored.
+    (kept,) = by_label["notes.txt"]
+    assert "appendix" in coll.chunks[kept][0]
+    assert sorted(embedded) == sorted(text for text, _, _ in coll.chunks.values())
+    assert (tmp_path / "dedup.sqlite3").exists() and not (tmp_path / "dedup.sqlite3.reindex").exists()
+    # The reparsed file is now in the parsed-text cache.
+    assert ParsedTextCache(parsed_dir).get(ParsedTextCache(parsed_dir).key(local)) is not None
+
+    # Rebuilding with larger chunks re-embeds the new fulltext chunks; metadata vectors come from the cache.
+    embedded.clear()
+    again = FakeCollection()
+    larger = {"chunk_size": 600, "chunk_overlap": 60, "chunk_workers": 2, "load_workers": 2}
+    reindex.reindex(argparse.Namespace(**{**vars(args), **larger}), store, again)
+    assert len(again.chunks) < len(coll.chunks)
+    assert not any(text.startswith("Title:") for text in embedded)
+    assert sorted(embedded) == sorted(text for text, _, meta in again.chunks.values() if meta["label"] != "metadata")
+    store.close()
@@ -0,0 +1,125 @@
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+from index.store import delete_record_chunks
+
+
+def test_delete_record_chunks_matches_oai_identifier_or_record_id():
+    coll = chromadb.EphemeralClient().get_or_create_collection("test-delete")
+    coll.upsert(
+        ids=["doi:metadata:0", "doi:metadata:1", "oai:x:2:metadata:0", "other:metadata:0"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [0.5, 0.5]],
+        documents=["a", "b", "c", "d"],
+        metadatas=[
+            {"record_id": "doi", "oai_identifier": "oai:x:1"},
+            {"record_id": "doi", "oai_identifier": "oai:x:1"},
+            {"record_id": "oai:x:2"},
+            {"record_id": "other", "oai_identifier": "oai:x:3"},
+        ],
+    )
+
+    delete_record_chunks(coll, "oai:x:1")
+    delete_record_chunks(coll, "oai:x:2")
+
+    assert coll.get()["ids"] == ["other:metadata:0"]
+
+
+def test_stored_chunk_hashes_reports_content_hashes_per_record():
+    from index.store import chunk_content_hash, stored_chunk_hashes
+
+    meta = {"record_id": "rec", "title": "T", "chunk": 0}
+    h = chunk_content_hash("text", meta)
+    assert h == chunk_content_hash("text", dict(meta, content_hash="ignored"))
+    assert h != chunk_content_hash("text!", meta)
+    assert h != chunk_content_hash("text", dict(meta, title="New title"))
+
+    coll = chromadb.EphemeralClient().get_or_create_collection("test-hashes")
+    coll.upsert(
+        ids=["rec:metadata:0", "rec:metadata:1", "other:metadata:0"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+        documents=["text", "old", "x"],
+        metadatas=[dict(meta, content_hash=h), {"record_id": "rec"}, {"record_id": "other"}],
+    )
+    assert stored_chunk_hashes(coll, "rec") == {"rec:metadata:0": h, "rec:metadata:1": None}
+    assert stored_chunk_hashes(coll, "missing") == {}
+
+
+def _ingest_through_proxy(coll, prefix):
+    # Runs in a worker process: writes and reads go through the parent's writer.
+    from index.store import delete_record_chunks, stored_chunk_hashes
+
+    coll.upsert(
+        ids=[f"{prefix}:metadata:0", f"{prefix}:metadata:1"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0]],
+        documents=["a", "b"],
+        metadatas=[{"record_id": prefix, "content_hash": "h0"}, {"record_id": prefix, "content_hash": "h1"}],
+    )
+    assert stored_chunk_hashes(coll, prefix) == {f"{prefix}:metadata:0": "h0", f"{prefix}:metadata:1": "h1"}
+    coll.delete(ids=[f"{prefix}:metadata:1"])
+    delete_record_chunks(coll, "gone")
+    try:
+        coll.upsert(ids=["bad"], embeddings=[[1.0, 0.0, 0.0]], documents=["wrong dimension"])
+    except Exception:
+        return
+    raise AssertionError("writer errors should be re-raised in the worker")
+
+
+def test_collection_writer_serves_worker_processes():
+    import multiprocessing
+
+    from index.writer import CollectionWriter
+
+    coll = chromadb.EphemeralClient().get_or_create_collection("test-writer")
+    coll.upsert(ids=["gone:metadata:0"], embeddings=[[0.5, 0.5]], documents=["x"], metadatas=[{"record_id": "gone"}])
+    context = multiprocessing.get_context("spawn")
+    writer = CollectionWriter(coll, context).start()
+    workers = [
+        context.Process(target=_ingest_through_proxy, args=(writer.client(), prefix)) for prefix in ("alpha", "beta")
+    ]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(timeout=60)
+    writer.stop()
+
+    assert [p.exitcode for p in workers] == [0, 0]
+    assert sorted(coll.get()["ids"]) == ["alpha:metadata:0", "beta:metadata:0"]
+    assert writer.stats["upserted"] == 4  # two chunks per worker; the failed upsert is not counted
+
+
+def test_generations_build_off_to_the_side_and_swap_atomically(tmp_path, monkeypatch):
+    from index import store
+
+    monkeypatch.setattr(store, "CHROMA_DIR", tmp_path)
+    alias = "demo"
+    live = store.get_collection(alias)  # a collection from before generations existed
+    live.upsert(ids=["a"], embeddings=[[1.0, 0.0]], documents=["a"], metadatas=[{"record_id": "a"}])
+    reader = store.CollectionAlias(alias)
+    assert reader.current() == alias
+
+    first, coll = store.begin_generation(alias, copy_current=True)
+    assert first == "demo-g0001" and coll.get()["ids"] == ["a"]
+    coll.upsert(ids=["b"], embeddings=[[0.0, 1.0]], documents=["b"], metadatas=[{"record_id": "b"}])
+    # Readers only see the new generation once it is promoted.
+    assert reader.current() == alias and store.CollectionAlias(alias).building() == first
+    assert store.promote_generation(first, alias, keep=2) == []
+    assert reader.current() == first and reader.version() == 1
+    assert sorted(store.get_collection(store.resolve_collection(alias)).get()["ids"]) == ["a", "b"]
+
+    # An interrupted build is continued with resume, or thrown away.
+    second, _ = store.begin_generation(alias)
+    assert store.begin_generation(alias, resume=True)[0] == second
+    store.discard_generation(second, alias)
+    assert reader.building() is None and reader.current() == first
+
+    # Past `keep`, the oldest generations (here the original collection) are dropped.
+    third, coll = store.begin_generation(alias, copy_current=True)
+    assert third == "demo-g0002"
+    assert store.promote_generation(third, alias, keep=2) == [alias]
+    names = {getattr(c, "name", c) for c in store.chroma_client().list_collections()}
+    assert names == {first, third}
+    assert [g["name"] for g in reader.load()["generations"]] == [first, third]
+    # Promotions and in-place ingests both move the version answer caches key on.
+    assert reader.version() == 2
+    assert store.bump_collection_version(alias) == 3 and reader.current() == third